@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+"""
+filestorage.py 扫描引擎基准测试。
+
+在临时目录中生成不同形状的合成目录树，分别测试旧版 "每个子目录单独 os.walk" 的串行实现、
+get_current_level_analysis、单遍/多线程扫描以及各分析模式的耗时、文件/秒、系统调用次数和峰值 RSS。
+每个引擎在独立的子进程中运行，峰值 RSS 互不影响；系统调用次数通过 strace -c 统计 (未安装时显示 "-")。
+
+目录树形状:
+  balanced  均衡树，叶子目录各含 --files-per-dir 个文件
+  wide      少量目录，每个目录包含大量文件
+  deep      多条深度为 200 的目录链，每层若干文件
+  tiny      大量 100 字节的小文件
+  huge      少量 1 GiB 的 (稀疏) 大文件
+  hardlink  一半文件是指向另一半的硬链接
+
+示例:
+  python benchmarks/filestorage_bench.py                              # 所有形状，各 100 万个文件
+  python benchmarks/filestorage_bench.py --files 200000 --shapes wide,deep --workers 1,16
+  python benchmarks/filestorage_bench.py --path /vol1/share           # 直接测试已有目录
+  python benchmarks/filestorage_bench.py --json results.ndjson        # 额外输出机器可读结果，便于对比
+  sudo python benchmarks/filestorage_bench.py --drop-caches           # 每轮前清空页缓存，测冷缓存性能
+  python benchmarks/filestorage_bench.py --check                      # 检查硬链接目录树的 --cli 报告是否每次一致
+"""
+import argparse
+import json
+import os
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "script"))
+import filestorage  # noqa: E402
+
+SHAPES = ("balanced", "wide", "deep", "tiny", "huge", "hardlink")
+
+
+def _create_file(path: str, size: int):
+    fd = os.open(path, os.O_CREAT | os.O_WRONLY, 0o644)
+    try:
+        os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+
+def make_synthetic_tree(root: str, total_files: int, files_per_dir: int = 100, fanout: int = 10,
+                        file_size: int = 4096) -> int:
+    """生成一棵均衡的目录树，叶子目录各含 files_per_dir 个 (稀疏) 文件，返回生成的文件数。"""
+    leaf_count = max(1, -(-total_files // files_per_dir))
+    depth = 1
+    while fanout ** depth < leaf_count:
+        depth += 1
+
+    created = 0
+    for leaf in range(leaf_count):
+        parts = []
+        n = leaf
+        for _ in range(depth):
+            parts.append(f"d{n % fanout}")
+            n //= fanout
+        leaf_dir = os.path.join(root, *reversed(parts))
+        os.makedirs(leaf_dir, exist_ok=True)
+        for i in range(min(files_per_dir, total_files - created)):
+            _create_file(os.path.join(leaf_dir, f"f{i}.dat"), file_size)
+            created += 1
+    return created
+
+
+def make_deep_tree(root: str, total_files: int, depth: int = 200, files_per_level: int = 5) -> int:
+    """生成多条深度为 depth 的目录链，每层 files_per_level 个文件，返回生成的文件数。"""
+    created = 0
+    chain = 0
+    while created < total_files:
+        level_dir = os.path.join(root, f"chain{chain}")
+        for _ in range(depth):
+            os.makedirs(level_dir, exist_ok=True)
+            for i in range(min(files_per_level, total_files - created)):
+                _create_file(os.path.join(level_dir, f"f{i}.dat"), 4096)
+                created += 1
+            if created >= total_files:
+                break
+            level_dir = os.path.join(level_dir, "d")
+        chain += 1
+    return created
+
+
+def make_hardlink_tree(root: str, total_files: int, files_per_dir: int = 100) -> int:
+    """生成均衡树后，在旁边的 links 目录中为其中一半文件创建硬链接，返回目录项总数。"""
+    originals = make_synthetic_tree(os.path.join(root, "data"), total_files - total_files // 2, files_per_dir)
+    links = 0
+    for dirpath, _, filenames in os.walk(os.path.join(root, "data")):
+        link_dir = os.path.join(root, "links", os.path.relpath(dirpath, root))
+        os.makedirs(link_dir, exist_ok=True)
+        for name in filenames:
+            if links >= total_files // 2:
+                return originals + links
+            os.link(os.path.join(dirpath, name), os.path.join(link_dir, name))
+            links += 1
+    return originals + links
+
+
+def make_snapshot_tree(root: str, snapshots: int = 40, files: int = 50, file_size: int = 24400) -> int:
+    """生成备份快照式目录树: orig 中的 files 个文件在 snap1..snapN 中各有一个硬链接，返回目录项总数。"""
+    orig_dir = os.path.join(root, "orig")
+    os.makedirs(orig_dir)
+    for i in range(files):
+        with open(os.path.join(orig_dir, f"f{i}.dat"), "wb") as f:
+            f.write(os.urandom(file_size))
+    for snapshot in range(1, snapshots + 1):
+        snapshot_dir = os.path.join(root, f"snap{snapshot}")
+        os.makedirs(snapshot_dir)
+        for i in range(files):
+            os.link(os.path.join(orig_dir, f"f{i}.dat"), os.path.join(snapshot_dir, f"f{i}.dat"))
+    return files * (snapshots + 1)
+
+
+def make_shape(shape: str, root: str, total_files: int, files_per_dir: int) -> int:
+    """按形状生成合成目录树，返回目录项 (文件) 数。"""
+    if shape == "balanced":
+        return make_synthetic_tree(root, total_files, files_per_dir)
+    if shape == "wide":
+        return make_synthetic_tree(root, total_files, max(files_per_dir, -(-total_files // 10)), fanout=10)
+    if shape == "deep":
+        return make_deep_tree(root, total_files)
+    if shape == "tiny":
+        return make_synthetic_tree(root, total_files, files_per_dir, file_size=100)
+    if shape == "huge":
+        return make_synthetic_tree(root, max(10, total_files // 1000), 10, file_size=1 << 30)
+    if shape == "hardlink":
+        return make_hardlink_tree(root, total_files, files_per_dir)
+    raise ValueError(f"未知的目录树形状: {shape}")
+
+
+def legacy_walk_analysis(base_path: str) -> int:
+    """旧版实现: 对每个直接子目录单独执行一次 os.walk 并逐个 getsize。"""
+    total = 0
+    for entry in os.scandir(base_path):
+        if entry.is_file(follow_symlinks=False):
+            total += entry.stat(follow_symlinks=False).st_size
+        elif entry.is_dir(follow_symlinks=False):
+            for dirpath, _, filenames in os.walk(entry.path, followlinks=True, onerror=lambda e: None):
+                for name in filenames:
+                    try:
+                        total += os.path.getsize(os.path.join(dirpath, name))
+                    except OSError:
+                        pass
+    return total
+
+
+def run_engine(engine: str, target: str) -> int:
+    """
+    运行一个引擎并返回其统计的总大小。engine 取值:
+    legacy, level, tree:<线程数>, largest, types, cold, dupes。
+    """
+    if engine == "legacy":
+        return legacy_walk_analysis(target)
+    if engine == "level":
+        return filestorage.get_current_level_analysis(target)[0]
+    if engine.startswith("tree:"):
+        return filestorage.build_size_tree(target, workers=int(engine[5:])).size
+    if engine == "largest":
+        return filestorage.find_largest(target)[2]
+    if engine == "types":
+        return filestorage.build_size_tree(target, workers=filestorage.DEFAULT_SCAN_WORKERS,
+                                           stats=filestorage.FileTypeStats()).size
+    if engine == "cold":
+        return filestorage.build_size_tree(target, workers=filestorage.DEFAULT_SCAN_WORKERS,
+                                           cold_days=filestorage.COLD_AGE_DAYS).size
+    if engine == "dupes":
+        return sum(size * len(paths) for size, paths in filestorage.find_duplicates(target)[0])
+    raise ValueError(f"未知的引擎: {engine}")
+
+
+def engine_label(engine: str) -> str:
+    labels = {
+        "legacy": "旧版 os.walk (串行)",
+        "level": "get_current_level_analysis",
+        "largest": "最大文件 (流式)",
+        "types": "文件类型统计 (并行)",
+        "cold": "冷数据分析 (并行)",
+        "dupes": "重复文件查找",
+    }
+    if engine.startswith("tree:"):
+        workers = int(engine[5:])
+        return "单遍扫描 (串行)" if workers == 1 else f"并行扫描 ({workers} 线程)"
+    return labels[engine]
+
+
+def check_report_stability(target: str, workers: list, repeat: int) -> bool:
+    """
+    以每种线程数各扫描 target repeat 次并写出 --cli 报告，逐一与第一份报告对比 (diff_size_reports)。
+    目录树未变化时任何目录的大小变化都说明结果依赖扫描顺序，此时返回 False。
+    """
+    with tempfile.TemporaryDirectory(prefix="fnscript_check_") as report_dir:
+        first = None
+        stable = True
+        for worker_count in workers:
+            for run in range(repeat):
+                report = os.path.join(report_dir, f"w{worker_count}_{run}.ndjson")
+                root = filestorage.build_size_tree(target, workers=worker_count)
+                with open(report, "w", encoding="utf-8", errors="surrogateescape") as out:
+                    filestorage.write_size_report(root, out)
+                if first is None:
+                    first = report
+                    continue
+                grew, shrank, added, removed, total_delta = filestorage.diff_size_reports(first, report)
+                if grew or shrank or added or removed or total_delta:
+                    stable = False
+                    print(f"  {worker_count} 线程第 {run + 1} 次: 与第一份报告不同 "
+                          f"(增长 {len(grew)} 项, 减少 {len(shrank)} 项, 总大小变化 {total_delta:+,} 字节)")
+                    for path, delta, _, _ in grew + shrank:
+                        print(f"    {delta:+,}  {path}")
+        return stable
+
+
+def drop_page_cache() -> bool:
+    """清空页缓存与 dentry/inode 缓存 (需要 root)。"""
+    try:
+        os.sync()
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+        return True
+    except OSError:
+        return False
+
+
+def _child_command(engine: str, target: str) -> list:
+    return [sys.executable, os.path.abspath(__file__), "--run-engine", engine, "--path", target]
+
+
+def measure_in_child(engine: str, target: str) -> dict:
+    """在子进程中运行一次引擎，返回 {"elapsed", "total", "maxrss_kb"}。"""
+    output = subprocess.run(_child_command(engine, target), check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def count_syscalls(engine: str, target: str) -> int | None:
+    """用 strace -f -c 统计引擎运行期间的系统调用总数 (包括解释器启动的少量开销)，没有 strace 时返回 None。"""
+    strace = shutil.which("strace")
+    if not strace:
+        return None
+    with tempfile.NamedTemporaryFile("r", suffix=".strace") as summary:
+        result = subprocess.run([strace, "-f", "-c", "-o", summary.name, *_child_command(engine, target)],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            return None
+        match = re.search(r"^100\.00\s+\S+\s+(?:\S+\s+)?(\d+)\s+(?:\d+\s+)?total$", summary.read(), re.MULTILINE)
+    return int(match.group(1)) if match else None
+
+
+def benchmark_target(target: str, file_count: int | None, engines: list, repeat: int, drop_caches: bool,
+                     syscalls: bool, shape: str, json_out) -> None:
+    baseline = None
+    print(f"\n{'引擎':<28}{'耗时(s)':>10}{'文件/秒':>14}{'加速比':>9}{'系统调用':>12}{'峰值RSS':>11}  总大小")
+    for engine in engines:
+        runs = []
+        for _ in range(repeat):
+            if drop_caches:
+                drop_page_cache()
+            runs.append(measure_in_child(engine, target))
+        best = min(runs, key=lambda run: run["elapsed"])
+        elapsed = best["elapsed"]
+        maxrss_kb = max(run["maxrss_kb"] for run in runs)
+        calls = count_syscalls(engine, target) if syscalls else None
+        baseline = baseline or elapsed
+        rate = file_count / elapsed if file_count else None
+        print(f"{engine_label(engine):<28}{elapsed:>10.3f}{f'{rate:,.0f}' if rate else '-':>14}"
+              f"{baseline / elapsed:>8.2f}x{f'{calls:,}' if calls is not None else '-':>12}"
+              f"{maxrss_kb / 1024:>9.1f}MB  {best['total']}")
+        if json_out is not None:
+            json_out.write(json.dumps({
+                "shape": shape, "engine": engine, "files": file_count, "elapsed": elapsed,
+                "files_per_sec": rate, "syscalls": calls, "maxrss_kb": maxrss_kb, "total": best["total"],
+            }) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="filestorage.py 扫描引擎基准测试")
+    parser.add_argument("--files", type=int, default=1_000_000, help="每种合成目录树中的文件数 (默认: 1000000)")
+    parser.add_argument("--files-per-dir", type=int, default=100, help="每个叶子目录中的文件数 (默认: 100)")
+    parser.add_argument("--shapes", default=",".join(SHAPES), help=f"逗号分隔的目录树形状 (默认: {','.join(SHAPES)})")
+    parser.add_argument("--workers", default=f"1,4,{filestorage.DEFAULT_SCAN_WORKERS}",
+                        help="逗号分隔的并行扫描线程数列表")
+    parser.add_argument("--engines", default="legacy,level,tree,largest,types,cold",
+                        help="逗号分隔的引擎列表，tree 按 --workers 展开 (可选: legacy,level,tree,largest,types,cold,dupes)")
+    parser.add_argument("--repeat", type=int, default=3, help="每个引擎运行次数，取最好成绩 (默认: 3)")
+    parser.add_argument("--path", help="直接测试已有目录，不生成合成目录树")
+    parser.add_argument("--drop-caches", action="store_true", help="每轮前清空页缓存 (需要 root)")
+    parser.add_argument("--no-syscalls", action="store_true", help="不用 strace 统计系统调用 (可节省时间)")
+    parser.add_argument("--json", metavar="FILE", help="把每项结果以 NDJSON 追加写入文件，便于对比不同版本")
+    parser.add_argument("--keep", action="store_true", help="测试结束后保留生成的目录树")
+    parser.add_argument("--check", action="store_true",
+                        help="不做基准测试: 按 --workers 多次扫描备份快照式硬链接目录树 (或 --path)，"
+                             "确认 --cli 报告每次完全一致，不一致时退出码为 1")
+    parser.add_argument("--run-engine", help=argparse.SUPPRESS) # 子进程内部使用
+    args = parser.parse_args()
+
+    if args.run_engine:
+        start = time.perf_counter()
+        total = run_engine(args.run_engine, args.path)
+        elapsed = time.perf_counter() - start
+        maxrss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(json.dumps({"elapsed": elapsed, "total": total, "maxrss_kb": maxrss_kb}))
+        return
+
+    if args.check:
+        workers = list(dict.fromkeys(int(w) for w in args.workers.split(",") if w.strip()))
+        tmp_root = None if args.path else tempfile.mkdtemp(prefix="fnscript_check_tree_")
+        try:
+            target = os.path.abspath(args.path) if args.path else tmp_root
+            if tmp_root is not None:
+                make_snapshot_tree(tmp_root)
+            print(f"目录: {target}，线程数: {','.join(map(str, workers))}，每种 {args.repeat} 次")
+            stable = check_report_stability(target, workers, args.repeat)
+        finally:
+            if tmp_root is not None and not args.keep:
+                shutil.rmtree(tmp_root, ignore_errors=True)
+        print("通过: 各次扫描的报告完全一致" if stable else "失败: 同一目录树的扫描结果不一致")
+        sys.exit(0 if stable else 1)
+
+    if args.drop_caches and not drop_page_cache():
+        print("警告: 无法清空页缓存 (需要 root 权限)，将测试热缓存性能。")
+        args.drop_caches = False
+    syscalls = not args.no_syscalls
+    if syscalls and not shutil.which("strace"):
+        print("提示: 未找到 strace，系统调用次数将显示为 \"-\"。")
+        syscalls = False
+
+    engines = []
+    for name in (e.strip() for e in args.engines.split(",") if e.strip()):
+        if name == "tree":
+            engines.extend(f"tree:{w}" for w in dict.fromkeys(int(w) for w in args.workers.split(",") if w.strip()))
+        else:
+            engines.append(name)
+
+    json_out = open(args.json, "a", encoding="utf-8") if args.json else None
+    try:
+        if args.path:
+            target = os.path.abspath(args.path)
+            print(f"目录: {target}")
+            benchmark_target(target, None, engines, args.repeat, args.drop_caches, syscalls, "path", json_out)
+            return
+
+        for shape in (s.strip() for s in args.shapes.split(",") if s.strip()):
+            tmp_root = tempfile.mkdtemp(prefix=f"fnscript_bench_{shape}_")
+            try:
+                print(f"\n=== {shape}: 正在 {tmp_root} 生成 {args.files} 个文件...")
+                start = time.perf_counter()
+                file_count = make_shape(shape, tmp_root, args.files, args.files_per_dir)
+                print(f"生成 {file_count} 个文件，用时 {time.perf_counter() - start:.1f}s")
+                benchmark_target(tmp_root, file_count, engines, args.repeat, args.drop_caches, syscalls,
+                                 shape, json_out)
+            finally:
+                if not args.keep:
+                    shutil.rmtree(tmp_root, ignore_errors=True)
+    finally:
+        if json_out is not None:
+            json_out.close()
+
+
+if __name__ == "__main__":
+    main()
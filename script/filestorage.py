@@ -1,73 +1,1449 @@
 #!/usr/bin/env python
-from textual.app import App, ComposeResult
-from textual.widgets import (
-    Header, Footer, Static, Button, 
-    Label, Input, DataTable, DirectoryTree
-)
-from textual.containers import Container, Horizontal, Vertical, ScrollableContainer, VerticalScroll
-from textual.screen import Screen, ModalScreen
 import os
+import sys
+import csv
+import json
+import mmap
+import platform
+import ctypes
+import select
+import struct
+import heapq
+import hashlib
+import importlib.util
 import asyncio
+import argparse
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from contextlib import contextmanager, nullcontext
 from operator import itemgetter
 import pathlib
-from collections import defaultdict
-from typing import Dict, List, Tuple
-from textual.binding import Binding
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Tuple
+
+# NumPy 可选，仅用于文件大小直方图的向量化分桶
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 检查textual库是否可用。只有启动图形界面时才真正导入 (见 load_tui_app)，命令行模式无需加载它
+HAS_TEXTUAL = importlib.util.find_spec("textual") is not None
+if not HAS_TEXTUAL:
+    # 如果没有textual但尝试无参数运行，我们需要提示用户
+    if len(sys.argv) == 1:
+        print("错误: 未安装textual库，无法启动图形界面。")
+        print("您可以通过命令行参数使用此脚本的核心功能:")
+        print("  列出最大的文件和目录: python filestorage.py --top 100 <目录>")
+        print("  导出目录大小报告:     python filestorage.py --cli <目录> [--format csv] [-o 文件]")
+        print("  对比两份报告:         python filestorage.py --diff <旧报告> <新报告>")
+        print("  文件类型分布:         python filestorage.py --types <目录>")
+        print("  查找重复文件:         python filestorage.py --dupes <目录> [--min-size 字节]")
+        print("  冷数据分析:           python filestorage.py --cold <目录> [--max-depth N]")
+        print("  查看帮助:             python filestorage.py -h")
+        sys.exit(1)
+
+# 目录大小索引的默认保存位置
+INDEX_PATH = os.path.join(os.path.expanduser("~"), ".cache", "fnscript", "filestorage_index.json")
+INDEX_VERSION = 5
+# 并行扫描默认线程数: 目录扫描以 I/O 等待为主，线程数可以明显多于 CPU 核数
+DEFAULT_SCAN_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# 冷数据分析的时间阈值 (天)，按从小到大排列
+COLD_AGE_DAYS = (30, 90, 365)
+DAY_NS = 86400 * 10**9
+# "最大文件" 模式默认列出的条目数
+DEFAULT_TOP_N = 100
+
+class ScanCancelled(Exception):
+    """扫描在完成前被取消 (例如用户已导航到其它目录)。"""
+
+def _allocated_size(st: os.stat_result) -> int:
+    """文件实际占用的磁盘空间 (st_blocks 以 512 字节为单位)，不支持时退回表观大小。"""
+    blocks = getattr(st, "st_blocks", None)
+    return blocks * 512 if blocks is not None else st.st_size
+
+class InodeSet:
+    """
+    紧凑的 (st_dev, st_ino) 集合，用于硬链接去重和目录环检测。
+    采用线性探测的开放寻址哈希表，键保存在两个 array('Q') 中，每个槽位 16 字节，
+    远小于 set[tuple] 每项上百字节的开销，千万级文件的目录树也能保持内存可控。
+    """
+    _EMPTY = 0xFFFFFFFFFFFFFFFF
+
+    def __init__(self, capacity: int = 1024):
+        size = 16
+        while size < capacity * 2:
+            size <<= 1
+        self._lock = threading.Lock()
+        self._allocate(size)
+
+    def _allocate(self, size: int):
+        self._mask = size - 1
+        self._devs = array('Q', [0]) * size
+        self._inos = array('Q', [self._EMPTY]) * size
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, dev: int, ino: int) -> bool:
+        """加入一个键，返回 True 表示此前未出现过。"""
+        with self._lock:
+            if (self._count + 1) * 2 > len(self._inos): # 负载因子保持在 0.5 以下
+                old_devs, old_inos = self._devs, self._inos
+                self._allocate(len(old_inos) * 2)
+                for old_dev, old_ino in zip(old_devs, old_inos):
+                    if old_ino != self._EMPTY:
+                        self._insert(old_dev, old_ino)
+            return self._insert(dev, ino)
+
+    def _insert(self, dev: int, ino: int) -> bool:
+        devs, inos, mask = self._devs, self._inos, self._mask
+        i = ((ino * 0x9E3779B97F4A7C15) ^ dev) & mask
+        while True:
+            slot_ino = inos[i]
+            if slot_ino == self._EMPTY:
+                devs[i] = dev
+                inos[i] = ino
+                self._count += 1
+                return True
+            if slot_ino == ino and devs[i] == dev:
+                return False
+            i = (i + 1) & mask
+
+class DirSizeIndex:
+    """
+    持久化、增量更新的目录大小索引。
+    每个目录记录为 [st_dev, st_ino, st_mtime_ns, 单链接文件总大小, 子目录名列表,
+    单链接文件总占用, 多链接文件列表 [[dev, ino, 大小, 占用, 文件名, 最后使用日], ...], 单链接文件数,
+    单链接文件的类型摘要与最后使用日分布 (见 DirNode.types/ages，扫描时未记录则为 None)]，
+    只有 inode 或 mtime 发生变化的目录才会重新 scandir，其余目录直接复用记录。
+    多链接文件单独保存，复用记录时仍能参与硬链接去重。
+    注意: 仅修改已有文件的内容或读取文件 (atime) 不会改变目录的 mtime，这类变化需要强制刷新才能反映。
+    """
+
+    def __init__(self, index_path: str | None = INDEX_PATH):
+        self.index_path = index_path  # 为 None 时仅在内存中使用，不落盘
+        self.records: Dict[str, list] = {}
+        self.dirty = False
+        self.lock = threading.Lock() # 扫描与保存时持有，避免并发修改记录
+        self._update_lock = threading.Lock() # 并行扫描时保护单条记录的写入
+        self.load()
+
+    def load(self):
+        """从磁盘加载索引，文件不存在、损坏或版本不符时从空索引开始。"""
+        if not self.index_path:
+            return
+        try:
+            # 路径可能包含非 UTF-8 字节 (os 以代理字符表示)，读写时用 surrogateescape 原样往返
+            with open(self.index_path, 'r', encoding='utf-8', errors='surrogateescape') as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self.records = data.get("dirs", {})
+        except (OSError, ValueError, AttributeError):
+            self.records = {}
+
+    def save(self):
+        """将索引写回磁盘 (先写临时文件再替换，避免中途退出损坏索引)。"""
+        if not self.index_path or not self.dirty:
+            return
+        with self.lock:
+            tmp_path = self.index_path + ".tmp"
+            try:
+                os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+                with open(tmp_path, 'w', encoding='utf-8', errors='surrogateescape') as f:
+                    json.dump({"version": INDEX_VERSION, "dirs": self.records}, f, ensure_ascii=False, separators=(',', ':'))
+                os.replace(tmp_path, self.index_path)
+                self.dirty = False
+            except (OSError, ValueError):
+                # 索引只是缓存，写入失败不影响分析结果，但不要留下残缺的临时文件
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+
+    def _drop_subtree(self, dir_path: str):
+        """删除某个已不存在目录及其所有子目录的记录。"""
+        prefix = dir_path + os.sep
+        for key in [k for k in self.records if k == dir_path or k.startswith(prefix)]:
+            del self.records[key]
+
+    def lookup(self, dir_path: str, st: os.stat_result) -> list | None:
+        """目录的 inode 和 mtime 均未变化时返回已有记录，否则返回 None。"""
+        record = self.records.get(dir_path)
+        if (record is not None and record[0] == st.st_dev
+                and record[1] == st.st_ino and record[2] == st.st_mtime_ns):
+            return record
+        return None
+
+    def update(self, dir_path: str, st: os.stat_result, files_size: int, files_alloc: int,
+               files_count: int, subdirs: List[str], links: List[list], types: list | None = None,
+               ages: list | None = None):
+        """写入目录的最新扫描结果，并清理已被删除的子目录记录。"""
+        with self._update_lock:
+            old_record = self.records.get(dir_path)
+            if old_record is not None:
+                for removed_name in set(old_record[4]) - set(subdirs):
+                    self._drop_subtree(os.path.join(dir_path, removed_name))
+            self.records[dir_path] = [st.st_dev, st.st_ino, st.st_mtime_ns, files_size, subdirs, files_alloc, links,
+                                      files_count, types, ages]
+            self.dirty = True
+
+# 扩展名所属的文件类别，用于容量规划时按大类汇总
+FILE_CATEGORIES = {
+    "视频": ("mp4", "mkv", "avi", "mov", "wmv", "flv", "webm", "m4v", "ts", "m2ts", "mts", "rmvb", "mpg", "mpeg"),
+    "图片": ("jpg", "jpeg", "png", "gif", "bmp", "webp", "heic", "heif", "tif", "tiff", "svg",
+             "raw", "cr2", "cr3", "nef", "arw", "dng"),
+    "音频": ("mp3", "flac", "wav", "aac", "m4a", "ogg", "opus", "ape", "wma"),
+    "虚拟机磁盘/镜像": ("qcow2", "qcow", "vmdk", "vdi", "vhd", "vhdx", "img", "iso"),
+    "压缩包": ("zip", "rar", "7z", "tar", "gz", "tgz", "bz2", "xz", "zst", "lz4"),
+    "文档": ("pdf", "doc", "docx", "xls", "xlsx", "ppt", "pptx", "txt", "md", "epub", "csv"),
+}
+EXTENSION_CATEGORY = {ext: category for category, exts in FILE_CATEGORIES.items() for ext in exts}
+# 文件大小直方图的桶上界 (字节)，最后一个桶没有上界
+SIZE_BUCKET_BOUNDS = (4 << 10, 64 << 10, 1 << 20, 16 << 20, 128 << 20, 1 << 30, 4 << 30, 16 << 30)
+SIZE_BUCKET_LABELS = ("< 4 KB", "4-64 KB", "64 KB-1 MB", "1-16 MB", "16-128 MB",
+                      "128 MB-1 GB", "1-4 GB", "4-16 GB", ">= 16 GB")
+
+# 目录中文件数达到该值时用 NumPy 向量化分桶，更少时逐个 bisect 更快
+NUMPY_BUCKET_MIN = 256
+
+def _file_extension(name: str) -> str:
+    """小写扩展名，与 os.path.splitext 一致，".bashrc" 没有扩展名。"""
+    dot = name.rfind(".")
+    return name[dot + 1:].lower() if dot > 0 else ""
+
+def _bucket_file_sizes(sizes: array) -> Tuple[List[int], List[int]]:
+    """
+    把一个目录的文件大小 (array('q')) 分桶，返回 (各桶文件数, 各桶总大小)。
+    文件较多时用 NumPy searchsorted 向量化分桶，总大小用 int64 的 np.add.at 累加，不经过浮点。
+    """
+    bucket_count = len(SIZE_BUCKET_LABELS)
+    if np is not None and len(sizes) >= NUMPY_BUCKET_MIN:
+        values = np.frombuffer(sizes, dtype=np.int64)
+        buckets = np.searchsorted(np.array(SIZE_BUCKET_BOUNDS, dtype=np.int64), values, side="right")
+        counts = np.bincount(buckets, minlength=bucket_count)
+        totals = np.zeros(bucket_count, dtype=np.int64)
+        np.add.at(totals, buckets, values)
+        return counts.tolist(), totals.tolist()
+    counts = [0] * bucket_count
+    totals = [0] * bucket_count
+    for size in sizes:
+        i = bisect_right(SIZE_BUCKET_BOUNDS, size)
+        counts[i] += 1
+        totals[i] += size
+    return counts, totals
+
+def _add_file_type(types: list, name: str, size: int, alloc: int):
+    """把单个文件计入类型摘要 [{扩展名: [文件数, 大小, 占用]}, 各桶文件数, 各桶总大小]。"""
+    totals = types[0].setdefault(_file_extension(name), [0, 0, 0])
+    totals[0] += 1
+    totals[1] += size
+    totals[2] += alloc
+    i = bisect_right(SIZE_BUCKET_BOUNDS, size)
+    types[1][i] += 1
+    types[2][i] += size
+
+def _copy_types(types: list) -> list:
+    return [{ext: totals[:] for ext, totals in types[0].items()}, types[1][:], types[2][:]]
+
+class FileTypeStats:
+    """
+    文件类型分布: 每个扩展名的文件数/大小/占用，以及按大小分桶的直方图。
+    不单独遍历磁盘，而是合并扫描时记录在每个 DirNode 上的类型摘要 (见 DirNode.types)，
+    因此同一棵目录树 (包括从索引复用的目录) 可以随时为任意子树汇总。
+    """
 
-def get_current_level_analysis(base_path: str) -> Tuple[int, List[Tuple[str, int]], List[Tuple[str, int]]]:
-    direct_files: List[Tuple[str, int]] = []
-    direct_subdirs_info: List[Tuple[str, int]] = []
-    grand_total_size: int = 0
+    def __init__(self):
+        self.by_ext: Dict[str, List[int]] = {} # 扩展名 -> [文件数, 大小, 占用]
+        self.bucket_counts = array('Q', bytes(8 * len(SIZE_BUCKET_LABELS)))
+        self.bucket_sizes = array('Q', bytes(8 * len(SIZE_BUCKET_LABELS)))
+        self._lock = threading.Lock()
+
+    def add_summary(self, types: list):
+        """累计一个目录的类型摘要。"""
+        ext_totals, counts, sizes = types
+        with self._lock:
+            by_ext = self.by_ext
+            for ext, (count, size, alloc) in ext_totals.items():
+                totals = by_ext.get(ext)
+                if totals is None:
+                    totals = by_ext[ext] = [0, 0, 0]
+                totals[0] += count
+                totals[1] += size
+                totals[2] += alloc
+            for i, (count, size) in enumerate(zip(counts, sizes)):
+                self.bucket_counts[i] += count
+                self.bucket_sizes[i] += size
+
+    def add_tree(self, root: "DirNode"):
+        """累计以 root 为根的子树中所有目录的类型摘要 (需以 summaries=True 扫描)。"""
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if node.types is not None:
+                self.add_summary(node.types)
+            stack.extend(list(node.children.values())) # 先复制，监视线程可能同时增删子目录
+
+    def summary(self) -> Tuple[List[Tuple[str, int, int, int]], List[Tuple[str, int, int, int]],
+                               List[Tuple[str, int, int]]]:
+        """
+        返回 (按扩展名, 按类别, 大小直方图)。前两项为按大小降序的 [(名称, 文件数, 大小, 占用), ...]，
+        直方图为 [(桶标签, 文件数, 大小), ...]。
+        """
+        with self._lock:
+            by_category: Dict[str, List[int]] = {}
+            for ext, (count, size, alloc) in self.by_ext.items():
+                totals = by_category.setdefault(EXTENSION_CATEGORY.get(ext, "其它"), [0, 0, 0])
+                totals[0] += count
+                totals[1] += size
+                totals[2] += alloc
+            by_ext = sorted(((ext or "(无扩展名)", *totals) for ext, totals in self.by_ext.items()),
+                            key=itemgetter(2), reverse=True)
+            categories = sorted(((name, *totals) for name, totals in by_category.items()),
+                                key=itemgetter(2), reverse=True)
+            histogram = list(zip(SIZE_BUCKET_LABELS, self.bucket_counts, self.bucket_sizes))
+        return by_ext, categories, histogram
+
+# ioprio_set/ioprio_get 的系统调用号 (见各架构的 unistd.h)
+_IOPRIO_SYSCALLS = {
+    "x86_64": (251, 252), "aarch64": (30, 31), "riscv64": (30, 31),
+    "i386": (289, 290), "i686": (289, 290), "armv7l": (314, 315), "ppc64le": (273, 274),
+}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+# 低影响模式默认每秒允许的系统调用数
+DEFAULT_MAX_IOPS = 2000
+
+class IOThrottle:
+    """
+    低影响扫描模式: 扫描线程使用 idle I/O 优先级 (只在磁盘空闲时获得服务，需要 BFQ 等支持
+    I/O 优先级的调度器)，并用令牌桶限制每秒系统调用数。每扫描完一个目录按其条目数批量扣除令牌，
+    同时按每次调用的平均耗时做 AIMD 自适应: 延迟升到基线的 latency_factor 倍以上时速率减半，
+    恢复正常后每秒加回 max_rate 的 10%，直到回到 max_rate。
+    """
 
-    try:
-        for entry in os.scandir(base_path):
-            entry_path = entry.path # Define here for broader scope in except block
+    def __init__(self, max_rate: int = DEFAULT_MAX_IOPS, idle_priority: bool = True,
+                 latency_factor: float = 3.0, min_rate: int = 50):
+        self.max_rate = max(1, max_rate)
+        self.min_rate = min(min_rate, self.max_rate)
+        self.rate = float(self.max_rate)
+        self.idle_priority = idle_priority
+        self.latency_factor = latency_factor
+        self.baseline_latency: float | None = None # 观察到的最低平均调用延迟 (秒)
+        self.latency = 0.0 # 平均调用延迟的指数移动平均
+        self._tokens = float(self.max_rate)
+        self._last_refill = time.monotonic()
+        self._last_backoff = 0.0
+        self._lock = threading.Lock()
+
+    def charge(self, calls: int, elapsed: float):
+        """记录一批耗时 elapsed 秒的 calls 次系统调用，令牌不足时阻塞到补足为止。"""
+        calls = max(1, calls)
+        with self._lock:
+            now = time.monotonic()
+            self._adapt(elapsed / calls, now)
+            self._tokens = min(self.rate, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            self._tokens -= calls
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+    def _adapt(self, per_call: float, now: float):
+        if self.baseline_latency is None or per_call < self.baseline_latency:
+            self.baseline_latency = per_call
+        self.latency = per_call if self.latency == 0.0 else self.latency * 0.8 + per_call * 0.2
+        congested = self.latency > self.baseline_latency * self.latency_factor and self.latency > 0.0005
+        if congested:
+            if now - self._last_backoff >= 1.0: # 每秒最多减半一次，避免一次抖动把速率压到底
+                self.rate = max(self.min_rate, self.rate / 2)
+                self._last_backoff = now
+        elif self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.1 * (now - self._last_refill))
+
+    @contextmanager
+    def io_priority(self):
+        """在当前线程内临时切换到 idle I/O 优先级 (Linux 的 I/O 优先级按线程生效)，退出时恢复。"""
+        if not self.idle_priority:
+            yield
+            return
+        previous = _ioprio_get()
+        changed = _ioprio_set(IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT)
+        try:
+            yield
+        finally:
+            if changed and previous is not None:
+                _ioprio_set(previous)
+
+def _ioprio_syscall(index: int, *args: int) -> int:
+    numbers = _IOPRIO_SYSCALLS.get(platform.machine())
+    if numbers is None:
+        return -1
+    libc = ctypes.CDLL(None, use_errno=True)
+    return libc.syscall(ctypes.c_long(numbers[index]), *(ctypes.c_int(arg) for arg in args))
+
+def _ioprio_get() -> int | None:
+    value = _ioprio_syscall(1, IOPRIO_WHO_PROCESS, 0)
+    return value if value >= 0 else None
+
+def _ioprio_set(value: int) -> bool:
+    """设置当前线程的 I/O 优先级，不支持的平台或失败时返回 False。"""
+    return _ioprio_syscall(0, IOPRIO_WHO_PROCESS, 0, value) == 0
+
+class ScanContext:
+    """一次扫描中共享的状态: 索引、是否强制刷新、是否记录目录摘要、节流器，以及文件/目录的 inode 去重集合。"""
+
+    def __init__(self, index: DirSizeIndex | None = None, force: bool = False, summaries: bool = False,
+                 throttle: IOThrottle | None = None, hard_links: Dict[Tuple[int, int], str] | None = None):
+        self.index = index
+        self.force = force
+        self.summaries = summaries # 为每个目录记录类型摘要和最后使用日分布 (DirNode.types/ages)
+        self.throttle = throttle
+        self.file_inodes = InodeSet() # 只记录 st_nlink > 1 的文件，同一 inode 只计一次 (stream_tree 使用)
+        # 已计入的多链接文件 {(dev, ino): 文件路径}，由 _assign_hard_links 在扫描结束后填充
+        self.hard_links: Dict[Tuple[int, int], str] = {} if hard_links is None else hard_links
+        self.dir_inodes = InodeSet() # 已进入过的目录，防止绑定挂载等形成的目录环
+
+class DirNode:
+    """目录树中的一个节点，保存该目录的表观大小、实际占用、直接文件以及子目录节点。"""
+    __slots__ = ("name", "path", "parent", "size", "alloc", "count", "files_size", "files_alloc",
+                 "files_count", "mtime", "cold", "types", "ages", "files", "links", "children", "error")
+
+    def __init__(self, name: str, path: str, parent: "DirNode | None" = None):
+        self.name = name
+        self.path = path
+        self.parent = parent
+        self.size = 0 # 含所有子目录的表观大小 (硬链接只计一次), -1 表示无权限
+        self.alloc = 0 # 含所有子目录的实际占用空间 (st_blocks)
+        self.count = 0 # 含所有子目录的文件数 (硬链接只计一次)
+        self.files_size = 0 # 仅直接文件
+        self.files_alloc = 0
+        self.files_count = 0
+        self.mtime = 0 # 目录自身的 st_mtime_ns
+        self.cold: List[int] | None = None # compute_cold 计算的含子目录的各时间阈值下的冷数据大小
+        # 直接文件 (硬链接只计一次) 的类型摘要 [{扩展名: [文件数, 大小, 占用]}, 各桶文件数, 各桶总大小]，
+        # 未以 summaries=True 扫描时为 None。同一摘要可能与索引记录共享，只能整体替换，不能原地修改
+        self.types: list | None = None
+        # 直接文件按最后使用日 (max(atime, mtime) 所在的 UTC 日序号) 汇总的大小 [[日序号, 大小], ...]，规则同 types
+        self.ages: list | None = None
+        self.files: List[Tuple[str, int, int]] | None = [] # (文件名, 大小, 占用)，None 表示尚未加载
+        # 计入本目录的多链接文件 [[dev, ino, 大小, 占用, 文件名, 最后使用日], ...]；扫描过程中暂存本目录的全部多链接文件
+        self.links: List[list] = []
+        self.children: Dict[str, "DirNode"] = {}
+        self.error = False
+
+    def find(self, path: str) -> "DirNode | None":
+        """在以本节点为根的树中查找指定路径对应的节点。"""
+        path = os.path.abspath(path)
+        if path == self.path:
+            return self
+        rel_path = os.path.relpath(path, self.path)
+        if rel_path == os.pardir or rel_path.startswith(os.pardir + os.sep):
+            return None
+        node = self
+        for part in rel_path.split(os.sep):
+            node = node.children.get(part)
+            if node is None:
+                return None
+        return node
+
+    def load_files(self):
+        """重新列出本目录的直接文件 (只读取这一层，不递归)。"""
+        files: List[Tuple[str, int, int]] = []
+        try:
+            with os.scandir(self.path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_file(follow_symlinks=False):
+                            st = entry.stat(follow_symlinks=False)
+                            files.append((entry.name, st.st_size, _allocated_size(st)))
+                    except OSError:
+                        files.append((entry.name, -1, -1))
+        except OSError:
+            self.error = True
+        self.files = files
+
+    def level_analysis(self) -> Tuple[int, int, List[Tuple[str, int, int]], List[Tuple[str, int, int]]]:
+        """返回本层结果: (总大小, 总占用, 直接文件, 子目录)，文件和子目录均按大小降序。"""
+        direct_files = sorted(self.files or [], key=itemgetter(1), reverse=True)
+        direct_subdirs = sorted(((name, child.size, child.alloc) for name, child in self.children.items()),
+                                key=itemgetter(1), reverse=True)
+        return self.size, self.alloc, direct_files, direct_subdirs
+
+def _scan_dir_entries(node: DirNode, summaries: bool = False) -> Tuple[List[str], int, int, int, List[list]]:
+    """
+    列出一个目录并填充 node.files。出错时向上抛出 OSError。
+    返回 (子目录名, 单链接文件总大小, 单链接文件总占用, 单链接文件数,
+    多链接文件 [[dev, ino, 大小, 占用, 文件名, 最后使用日], ...])。
+    summaries 为 True 时把单链接文件的类型摘要写入 node.types，并用同一次 stat 的 atime/mtime
+    把它们按最后使用日汇总到 node.ages (冷数据分析由 compute_cold 据此计算，无需再次遍历)。
+    """
+    files: List[Tuple[str, int, int]] = []
+    subdirs: List[str] = []
+    links: List[list] = []
+    ext_totals: Dict[str, List[int]] | None = {} if summaries else None
+    day_sizes: Dict[int, int] = {}
+    single_sizes = array('q')
+    files_size = 0
+    files_alloc = 0
+    files_count = 0
+    with os.scandir(node.path) as it:
+        for entry in it:
             try:
-                if entry.is_file(follow_symlinks=False):
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                elif entry.is_file(follow_symlinks=False):
                     try:
-                        size = entry.stat(follow_symlinks=False).st_size
-                        direct_files.append((entry.name, size))
-                        grand_total_size += size
-                    except (PermissionError, OSError) as e_stat_file:
-                        direct_files.append((entry.name, -1))
-                elif entry.is_dir(follow_symlinks=False):
-                    subdir_total_size = 0
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        files.append((entry.name, -1, -1))
+                        continue
+                    size, alloc = st.st_size, _allocated_size(st)
+                    files.append((entry.name, size, alloc))
+                    if st.st_nlink > 1:
+                        links.append([st.st_dev, st.st_ino, size, alloc, entry.name,
+                                      max(st.st_atime_ns, st.st_mtime_ns) // DAY_NS])
+                    else:
+                        files_size += size
+                        files_alloc += alloc
+                        files_count += 1
+                        if ext_totals is not None:
+                            ext = _file_extension(entry.name)
+                            totals = ext_totals.get(ext)
+                            if totals is None:
+                                totals = ext_totals[ext] = [0, 0, 0]
+                            totals[0] += 1
+                            totals[1] += size
+                            totals[2] += alloc
+                            single_sizes.append(size)
+                            day = max(st.st_atime_ns, st.st_mtime_ns) // DAY_NS
+                            day_sizes[day] = day_sizes.get(day, 0) + size
+            except OSError:
+                files.append((entry.name, -2, -2)) # 无法判断类型的条目
+    node.files = files
+    if ext_totals is not None:
+        node.types = [ext_totals, *_bucket_file_sizes(single_sizes)]
+        node.ages = [[day, size] for day, size in day_sizes.items()]
+    return subdirs, files_size, files_alloc, files_count, links
+
+def _expand_node(node: DirNode, ctx: ScanContext, is_root: bool = False) -> List[DirNode]:
+    """
+    扫描 (或从索引恢复) 单个目录，并为其子目录创建节点。
+    根目录无法访问时抛出 OSError，其它目录的错误记录在节点上。
+    """
+    try:
+        st = os.stat(node.path, follow_symlinks=False)
+        if not ctx.dir_inodes.add(st.st_dev, st.st_ino):
+            return [] # 已经扫描过的目录 (例如绑定挂载形成的环)，不再重复计算
+        node.mtime = st.st_mtime_ns
+        reuse = not (ctx.force or ctx.index is None or is_root)
+        record = ctx.index.lookup(node.path, st) if reuse else None
+        if record is not None and ctx.summaries and record[8] is None:
+            record = None # 记录中没有目录摘要 (由不需要摘要的扫描写入)，重新列出一次以补全
+        if record is not None:
+            node.files = None
+            files_size, subdirs, files_alloc, links, files_count = record[3], record[4], record[5], record[6], record[7]
+            if ctx.summaries:
+                node.types, node.ages = record[8], record[9]
+        else:
+            started = time.perf_counter()
+            subdirs, files_size, files_alloc, files_count, links = _scan_dir_entries(node, ctx.summaries)
+            if ctx.throttle is not None: # 按本目录的条目数 (约等于 stat 次数) 扣除令牌
+                ctx.throttle.charge(len(node.files) + len(subdirs) + 2, time.perf_counter() - started)
+            if ctx.index is not None:
+                ctx.index.update(node.path, st, files_size, files_alloc, files_count, subdirs, links,
+                                 node.types, node.ages)
+    except OSError:
+        if is_root:
+            raise # Re-raise to be handled by the calling screen
+        node.error = True
+        node.size = node.alloc = -1
+        return []
+
+    # 多链接文件先暂存，扫描结束后由 _assign_hard_links 按与扫描顺序无关的规则计入
+    node.links = links
+    node.files_size = files_size
+    node.files_alloc = files_alloc
+    node.files_count = files_count
+
+    children = []
+    for name in subdirs:
+        child = DirNode(name, os.path.join(node.path, name), node)
+        node.children[name] = child
+        children.append(child)
+    return children
+
+def _add_links(node: DirNode, links: List[list]):
+    """把多链接文件加到目录的直接文件统计和目录摘要上。"""
+    if node.types is not None and links: # 摘要可能与索引记录共享，先复制再修改
+        node.types = _copy_types(node.types)
+        node.ages = list(node.ages)
+    for _, _, size, alloc, name, day in links:
+        node.files_size += size
+        node.files_alloc += alloc
+        node.files_count += 1
+        if node.types is not None:
+            _add_file_type(node.types, name, size, alloc)
+            node.ages.append([day, size])
+
+def _assign_hard_links(nodes: List[DirNode], hard_links: Dict[Tuple[int, int], str]):
+    """
+    把扫描中暂存的多链接文件计入目录: 同一 (dev, ino) 只计入路径按字典序最小的那个链接所在的目录，
+    结果与扫描顺序和线程数无关，同一棵树每次扫描得到的各目录大小都相同。
+    hard_links 中已有的 inode 视为已由树中其它位置计入而跳过，本次计入的以 {(dev, ino): 文件路径} 加入其中。
+    完成后 node.links 只保留计入该目录的链接。
+    """
+    best: Dict[Tuple[int, int], tuple] = {}
+    for node in nodes:
+        for link in node.links:
+            key = (link[0], link[1])
+            if key in hard_links:
+                continue
+            path = os.path.join(node.path, link[4])
+            current = best.get(key)
+            if current is None or path < current[0]:
+                best[key] = (path, node, link)
+        node.links = []
+    for key, (path, node, link) in best.items():
+        hard_links[key] = path
+        node.links.append(link)
+    for node in nodes:
+        _add_links(node, node.links)
+
+def _hard_link_owners(root: DirNode, skip: DirNode | None = None) -> Dict[Tuple[int, int], str]:
+    """收集 root 树中已计入的多链接文件 {(dev, ino): 文件路径}，不含 skip 子树。只读取内存中的树。"""
+    hard_links: Dict[Tuple[int, int], str] = {}
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node is skip:
+            continue
+        for link in node.links:
+            hard_links[(link[0], link[1])] = os.path.join(node.path, link[4])
+        stack.extend(list(node.children.values())) # 先复制，监视线程可能同时增删子目录
+    return hard_links
+
+def _aggregate_sizes(root: DirNode, hard_links: Dict[Tuple[int, int], str]):
+    """
+    计入多链接文件 (见 _assign_hard_links) 后自底向上累加目录大小。
+    先序列表的逆序即为后序，子目录总是先于父目录完成。
+    """
+    order: List[DirNode] = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node.error:
+            continue
+        order.append(node)
+        stack.extend(node.children.values())
+    _assign_hard_links(order, hard_links)
+    for node in reversed(order):
+        node.size += node.files_size
+        node.alloc += node.files_alloc
+        node.count += node.files_count
+        if node.parent is not None:
+            node.parent.size += node.size
+            node.parent.alloc += node.alloc
+            node.parent.count += node.count
+
+def compute_cold(root: DirNode, cold_days: Tuple[int, ...] = COLD_AGE_DAYS):
+    """
+    根据扫描时记录的最后使用日分布 (DirNode.ages) 为 root 子树中的每个节点计算 node.cold:
+    含子目录的、最后访问和修改时间都早于各阈值天数的文件大小。只读取内存中的树，不访问磁盘。
+    按整日比较，阈值当天使用过的文件不计为冷数据。未记录摘要或无权限的目录 cold 为 None。
+    """
+    now_ns = time.time_ns()
+    cutoffs = [(now_ns - days * DAY_NS) // DAY_NS for days in cold_days] # 由近到远
+    order: List[DirNode] = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        stack.extend(list(node.children.values())) # 先复制，监视线程可能同时增删子目录
+    for node in reversed(order): # 后序: 子目录先于父目录完成
+        if node.error or node.ages is None:
+            node.cold = None
+            continue
+        cold = [0] * len(cutoffs)
+        for day, size in node.ages:
+            for i, cutoff in enumerate(cutoffs):
+                if day >= cutoff: # 阈值由近到远排列，不满足时后面的也不会满足
+                    break
+                cold[i] += size
+        for child in list(node.children.values()):
+            if child.cold is not None:
+                for i, cold_size in enumerate(child.cold):
+                    cold[i] += cold_size
+        node.cold = cold
+
+class ScanProgress:
+    """
+    扫描进度汇总器: 把每个已扫描目录的直接文件大小累加到其所属的顶层子目录上。
+    扫描线程在每个目录处理完后调用本对象，按 interval 节流后通过 publish 推送快照，
+    快照格式与 DirNode.level_analysis 相同 (总大小, 总占用, 直接文件, 子目录累计大小)。
+    多链接文件在扫描结束后才计入 (见 _assign_hard_links)，不包含在进度快照中。
+    """
+
+    def __init__(self, publish: Callable[[int, int, list, list], None], interval: float = 0.5):
+        self.publish = publish
+        self.interval = interval
+        self.grand_total = 0
+        self.grand_alloc = 0
+        self.root_files: List[Tuple[str, int, int]] = []
+        self.subdir_totals: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+        self._last_publish = 0.0
+
+    def __call__(self, node: DirNode):
+        top = node
+        while top.parent is not None and top.parent.parent is not None:
+            top = top.parent
+        with self._lock:
+            self.grand_total += node.files_size
+            self.grand_alloc += node.files_alloc
+            if top.parent is None: # 根目录本身: 先列出所有子目录，大小从 0 开始累计
+                self.root_files = sorted(node.files or [], key=itemgetter(1), reverse=True)
+                for name in node.children:
+                    self.subdir_totals.setdefault(name, [0, 0])
+            else:
+                totals = self.subdir_totals.setdefault(top.name, [0, 0])
+                totals[0] += node.files_size
+                totals[1] += node.files_alloc
+            now = time.monotonic()
+            if now - self._last_publish < self.interval:
+                return
+            self._last_publish = now
+            subdirs = sorted(((name, size, alloc) for name, (size, alloc) in self.subdir_totals.items()),
+                             key=itemgetter(1), reverse=True)
+            snapshot = (self.grand_total, self.grand_alloc, self.root_files, subdirs)
+        self.publish(*snapshot)
+
+class ParallelTreeScanner:
+    """
+    多线程工作窃取式目录扫描器。
+    每个工作线程从自己队列的尾部取目录 (深度优先，局部性好)，自己的队列为空时
+    从其它线程队列的头部窃取 (通常是较浅、子树较大的目录)。scandir/stat 会释放 GIL，
+    因此在 RAID 和网络挂载等单次 stat 延迟较高的存储上可以让 I/O 队列保持饱满。
+    """
+
+    def __init__(self, workers: int = DEFAULT_SCAN_WORKERS, index: DirSizeIndex | None = None, force: bool = False,
+                 progress: Callable[[DirNode], None] | None = None, cancel_event: threading.Event | None = None,
+                 summaries: bool = False, throttle: IOThrottle | None = None,
+                 hard_links: Dict[Tuple[int, int], str] | None = None):
+        self.workers = max(1, workers)
+        self.ctx = ScanContext(index, force, summaries, throttle, hard_links)
+        self.progress = progress
+        self.cancel_event = cancel_event
+        self._queues: List[deque] = []
+        self._cond = threading.Condition()
+        self._pending = 0 # 已入队但尚未处理完的目录数
+        self._idle = 0
+        self._error: BaseException | None = None
+
+    def scan(self, root_path: str) -> DirNode:
+        """扫描 root_path 并返回与 build_size_tree 相同结构的目录树。"""
+        root_path = os.path.abspath(root_path)
+        root = DirNode(os.path.basename(root_path) or root_path, root_path)
+        children = _expand_node(root, self.ctx, is_root=True)
+        if self.progress:
+            self.progress(root)
+
+        self._queues = [deque() for _ in range(self.workers)]
+        for i, child in enumerate(children):
+            self._queues[i % self.workers].append(child)
+        self._pending = len(children)
+        self._error = None
+
+        threads = [threading.Thread(target=self._worker, args=(i,), daemon=True) for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self._error is not None:
+            raise self._error
+
+        _aggregate_sizes(root, self.ctx.hard_links)
+        return root
+
+    def _next_task(self, worker_id: int) -> DirNode | None:
+        try:
+            return self._queues[worker_id].pop()
+        except IndexError:
+            pass
+        for offset in range(1, self.workers):
+            try:
+                return self._queues[(worker_id + offset) % self.workers].popleft()
+            except IndexError:
+                continue
+        return None
+
+    def _worker(self, worker_id: int):
+        if self.ctx.throttle is not None:
+            with self.ctx.throttle.io_priority():
+                self._work(worker_id)
+        else:
+            self._work(worker_id)
+
+    def _work(self, worker_id: int):
+        own_queue = self._queues[worker_id]
+        while True:
+            node = self._next_task(worker_id)
+            if node is None:
+                with self._cond:
+                    if self._pending == 0 or self._error is not None:
+                        return
+                    self._idle += 1
+                    self._cond.wait(0.05)
+                    self._idle -= 1
+                continue
+
+            try:
+                if self.cancel_event is not None and self.cancel_event.is_set():
+                    raise ScanCancelled(node.path)
+                children = _expand_node(node, self.ctx)
+                if self.progress:
+                    self.progress(node)
+            except BaseException as e:
+                with self._cond:
+                    self._error = e
+                    self._cond.notify_all()
+                return
+
+            with self._cond:
+                # 先计数再入队，避免子目录被窃取并完成后计数提前归零
+                self._pending += len(children) - 1
+                own_queue.extend(children)
+                if self._pending == 0 or (children and self._idle):
+                    self._cond.notify_all()
+
+def build_size_tree(root_path: str, index: DirSizeIndex | None = None, force: bool = False,
+                    workers: int = 1, progress: Callable[[DirNode], None] | None = None,
+                    cancel_event: threading.Event | None = None, stats: FileTypeStats | None = None,
+                    cold_days: Tuple[int, ...] | None = None, throttle: IOThrottle | None = None,
+                    summaries: bool = False, hard_links: Dict[Tuple[int, int], str] | None = None) -> DirNode:
+    """
+    以一次遍历计算 root_path 下每个目录的大小，并返回内存中的目录树。
+    不跟随符号链接；硬链接文件按 (st_dev, st_ino) 去重，只计入路径按字典序最小的链接所在的目录，
+    与扫描顺序无关。提供 hard_links ({(dev, ino): 文件路径}，例如重新扫描子树时树中其它位置已计入的硬链接) 时
+    跳过其中已有的 inode，并把本次计入的加入其中。
+    提供 index 时，inode/mtime 未变化的目录直接复用索引记录而不重新列出
+    (其文件列表在需要时由 DirNode.load_files 按需加载)。
+    workers 大于 1 时使用 ParallelTreeScanner 多线程扫描。
+    progress (例如 ScanProgress) 会在每个目录处理完后被调用一次。
+    每处理一个目录前检查 cancel_event，被设置时抛出 ScanCancelled。
+    summaries 为 True 时在同一遍扫描中为每个目录记录类型摘要和最后使用日分布 (node.types/ages)，
+    之后可用 FileTypeStats.add_tree 汇总文件类型分布、用 compute_cold 计算冷数据，均不再访问磁盘。
+    目录摘要同样保存在索引中，复用记录的目录无需重新列出。
+    提供 stats 时隐含 summaries，并在扫描完成后把整棵树累计到 stats 中；提供 cold_days
+    (例如 COLD_AGE_DAYS) 时同样隐含 summaries，并在扫描完成后调用 compute_cold 填充 node.cold。
+    提供 throttle (IOThrottle) 时以低影响模式扫描: idle I/O 优先级并限制每秒系统调用数。
+    根目录本身无法访问时抛出 OSError。
+    """
+    summaries = summaries or stats is not None or cold_days is not None
+    if workers > 1:
+        root = ParallelTreeScanner(workers, index, force, progress, cancel_event, summaries,
+                                   throttle, hard_links).scan(root_path)
+    else:
+        with throttle.io_priority() if throttle is not None else nullcontext():
+            root = _build_size_tree_serial(root_path, ScanContext(index, force, summaries, throttle, hard_links),
+                                           progress, cancel_event)
+    if stats is not None:
+        stats.add_tree(root)
+    if cold_days is not None:
+        compute_cold(root, cold_days)
+    return root
+
+def _build_size_tree_serial(root_path: str, ctx: ScanContext, progress: Callable[[DirNode], None] | None,
+                            cancel_event: threading.Event | None) -> DirNode:
+    root_path = os.path.abspath(root_path)
+    root = DirNode(os.path.basename(root_path) or root_path, root_path)
+    stack = _expand_node(root, ctx, is_root=True)
+    if progress:
+        progress(root)
+    while stack:
+        if cancel_event is not None and cancel_event.is_set():
+            raise ScanCancelled(root_path)
+        node = stack.pop()
+        stack.extend(_expand_node(node, ctx))
+        if progress:
+            progress(node)
+    _aggregate_sizes(root, ctx.hard_links)
+    return root
+
+def get_current_level_analysis(base_path: str, index: DirSizeIndex | None = None, force: bool = False,
+                               workers: int = 1, cancel_event: threading.Event | None = None,
+                               stats: FileTypeStats | None = None, throttle: IOThrottle | None = None
+                               ) -> Tuple[int, List[Tuple[str, int]], List[Tuple[str, int]]]:
+    if index is None:
+        root = build_size_tree(base_path, force=force, workers=workers, cancel_event=cancel_event, stats=stats,
+                               throttle=throttle)
+    else:
+        with index.lock:
+            root = build_size_tree(base_path, index, force, workers, cancel_event=cancel_event, stats=stats,
+                                   throttle=throttle)
+    grand_total_size, _, direct_files, direct_subdirs = root.level_analysis()
+    return (grand_total_size, [(name, size) for name, size, _ in direct_files],
+            [(name, size) for name, size, _ in direct_subdirs])
+
+# inotify 常量 (见 <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW)
+_INOTIFY_EVENT = struct.Struct("iIII") # wd, mask, cookie, len，其后是 len 字节的文件名
+
+class TreeWatcher:
+    """
+    通过 inotify (ctypes 调用 libc) 监视一棵已扫描目录树，把变化增量地应用到树上而不重新扫描。
+    inotify 不递归，每个目录一个 watch；超过 fs.inotify.max_user_watches 时只监视
+    先遍历到的目录并设置 truncated。用法 (通常在后台线程中):
+    changed, overflow = wait_changes(...) -> updates = collect_updates(changed) -> apply_dir_updates(root, updates)。
+    前两步只读取树并做 I/O，最后一步才修改树，可以放在界面线程中执行。
+    """
+
+    def __init__(self, root: DirNode):
+        self.root = root
+        self.truncated = False
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1 失败: {os.strerror(errno)}")
+        self._paths: Dict[int, str] = {} # wd -> 目录路径
+        self._wds: Dict[str, int] = {}
+        # 树中已计入的多链接文件 {(dev, ino): 文件路径}，重新列出的目录和新子树按它去重，与扫描一致
+        self.hard_links = _hard_link_owners(root)
+        self.watch_tree(root)
+
+    @property
+    def watch_count(self) -> int:
+        return len(self._paths)
+
+    def watch_tree(self, node: DirNode):
+        """为 node 及其所有可访问的子目录添加 watch。"""
+        stack = [node]
+        while stack and not self.truncated:
+            node = stack.pop()
+            if node.error:
+                continue
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(node.path), WATCH_MASK)
+            if wd < 0:
+                if ctypes.get_errno() == 28: # ENOSPC: 达到 max_user_watches 上限
+                    self.truncated = True
+                continue
+            self._paths[wd] = node.path
+            self._wds[node.path] = wd
+            stack.extend(node.children.values())
+
+    def unwatch_tree(self, dir_path: str):
+        """移除 dir_path 及其子目录的 watch (目录被移出监视范围时内核不会自动移除)。"""
+        prefix = dir_path + os.sep
+        for path in [p for p in self._wds if p == dir_path or p.startswith(prefix)]:
+            wd = self._wds.pop(path)
+            self._paths.pop(wd, None)
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def wait_changes(self, stop_event: threading.Event, debounce: float = 0.5) -> Tuple[set, bool]:
+        """
+        阻塞直到有事件 (或 stop_event 被设置)，再继续收集 debounce 秒内的事件以合并频繁的写入。
+        返回 (需要重新列出的目录路径集合, 事件队列是否溢出)。
+        """
+        changed: set = set()
+        overflow = False
+        deadline = None
+        while not stop_event.is_set():
+            timeout = 0.5 if deadline is None else max(0.0, deadline - time.monotonic())
+            readable, _, _ = select.select([self._fd], [], [], timeout)
+            if readable:
+                try:
+                    data = os.read(self._fd, 65536)
+                except BlockingIOError:
+                    data = b""
+                offset = 0
+                while offset < len(data):
+                    wd, mask, _, name_len = _INOTIFY_EVENT.unpack_from(data, offset)
+                    offset += _INOTIFY_EVENT.size + name_len
+                    if mask & IN_Q_OVERFLOW:
+                        overflow = True
+                    elif mask & IN_IGNORED: # watch 已被内核移除 (目录被删除)
+                        path = self._paths.pop(wd, None)
+                        if path is not None and self._wds.get(path) == wd:
+                            del self._wds[path]
+                    elif not mask & IN_DELETE_SELF and wd in self._paths:
+                        changed.add(self._paths[wd])
+                if deadline is None and (changed or overflow):
+                    deadline = time.monotonic() + debounce
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        return changed, overflow
+
+    def collect_updates(self, changed: set) -> List[tuple]:
+        """
+        重新列出发生变化的目录 (只列出这一层)，新出现的子目录扫描其子树并添加 watch，
+        消失的子目录移除 watch。返回供 apply_dir_updates 使用的
+        [(路径, 文件列表, 文件大小, 文件占用, 文件数, 类型摘要, 最后使用日分布, 计入的多链接文件,
+          {新子目录名: 子树}, [消失的子目录名]), ...]。
+        多链接文件按 self.hard_links 去重: 已由树中其它目录计入的 inode 不再计入本目录，
+        本目录计入的链接消失或所在子树被移除时从中删除，之后由下一个重新列出的包含它的目录计入。
+        """
+        updates = []
+        for dir_path in sorted(changed):
+            node = self.root.find(dir_path)
+            if node is None or node.error:
+                continue
+            probe = DirNode(node.name, dir_path)
+            summaries = node.types is not None
+            try:
+                subdirs, files_size, files_alloc, files_count, links = _scan_dir_entries(probe, summaries)
+            except OSError:
+                continue # 目录本身已被删除，父目录的事件会处理它
+            probe.files_size, probe.files_alloc, probe.files_count = files_size, files_alloc, files_count
+            current = set()
+            credited = set()
+            for link in links:
+                key = (link[0], link[1])
+                path = os.path.join(dir_path, link[4])
+                current.add(path)
+                owner = self.hard_links.get(key)
+                if key not in credited and (owner is None or os.path.dirname(owner) == dir_path):
+                    credited.add(key)
+                    self.hard_links[key] = path
+                    probe.links.append(link)
+            for link in node.links: # 本目录此前计入、现已消失的链接
+                path = os.path.join(dir_path, link[4])
+                if path not in current and self.hard_links.get((link[0], link[1])) == path:
+                    del self.hard_links[(link[0], link[1])]
+            _add_links(probe, probe.links)
+            old_names = set(node.children)
+            added = {}
+            for name in subdirs:
+                if name not in old_names:
                     try:
-                        # onerror to handle errors during os.walk, e.g. permission denied on a sub-directory
-                        # Corrected the lambda for onerror f-string compatibility
-                        for dirpath_walk, _, filenames_walk in os.walk(entry_path, followlinks=True, onerror=lambda e: None):
-                            for f_name_walk in filenames_walk:
-                                f_path_walk = os.path.join(dirpath_walk, f_name_walk)
-                                try:
-                                    file_size_walk = os.path.getsize(f_path_walk)
-                                    subdir_total_size += file_size_walk
-                                except (PermissionError, FileNotFoundError, OSError):
-                                    pass # Skip files in subdir that can't be accessed
-                        direct_subdirs_info.append((entry.name, subdir_total_size))
-                        grand_total_size += subdir_total_size
-                    except (PermissionError, OSError) as e_walk_top:
-                        direct_subdirs_info.append((entry.name, -1))
-            except (PermissionError, OSError) as e_type_check:
-                # Fallback for entries that error on is_file/is_dir or initial stat
+                        subtree = build_size_tree(os.path.join(dir_path, name), summaries=summaries,
+                                                  hard_links=self.hard_links)
+                    except OSError:
+                        continue
+                    added[name] = subtree
+                    self.watch_tree(subtree)
+            removed = sorted(old_names - set(subdirs))
+            for name in removed:
+                self.unwatch_tree(os.path.join(dir_path, name))
+                child = node.children.get(name)
+                if child is not None:
+                    self._forget_links(child)
+            updates.append((dir_path, probe.files, probe.files_size, probe.files_alloc, probe.files_count,
+                            probe.types, probe.ages, probe.links, added, removed))
+        return updates
+
+    def _forget_links(self, subtree: DirNode):
+        """从 hard_links 中删除 subtree 中各目录计入的多链接文件。"""
+        stack = [subtree]
+        while stack:
+            node = stack.pop()
+            for link in node.links:
+                key = (link[0], link[1])
+                if self.hard_links.get(key) == os.path.join(node.path, link[4]):
+                    del self.hard_links[key]
+            stack.extend(list(node.children.values()))
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+def apply_dir_updates(root: DirNode, updates: List[tuple]) -> set:
+    """
+    把 TreeWatcher.collect_updates 的结果应用到树上: 替换目录的直接文件统计，挂上新子树、
+    摘除消失的子树，并把大小/占用/文件数的变化量沿祖先链向上传递。返回被修改的目录路径集合。
+    """
+    touched = set()
+    for dir_path, files, files_size, files_alloc, files_count, types, ages, links, added, removed in updates:
+        node = root.find(dir_path)
+        if node is None or node.error:
+            continue
+        size_delta = files_size - node.files_size
+        alloc_delta = files_alloc - node.files_alloc
+        count_delta = files_count - node.files_count
+        node.files, node.files_size, node.files_alloc, node.files_count = files, files_size, files_alloc, files_count
+        node.types, node.ages, node.links = types, ages, links
+        for name in removed:
+            child = node.children.pop(name, None)
+            if child is not None:
+                size_delta -= max(child.size, 0)
+                alloc_delta -= max(child.alloc, 0)
+                count_delta -= child.count
+        for name, subtree in added.items():
+            subtree.name = name
+            subtree.parent = node
+            node.children[name] = subtree
+            size_delta += max(subtree.size, 0)
+            alloc_delta += max(subtree.alloc, 0)
+            count_delta += subtree.count
+        ancestor = node
+        while ancestor is not None:
+            ancestor.size += size_delta
+            ancestor.alloc += alloc_delta
+            ancestor.count += count_delta
+            touched.add(ancestor.path)
+            ancestor = ancestor.parent
+    return touched
+
+class TopN:
+    """有界最小堆: 只保留大小最大的 n 项，内存占用与扫描的条目总数无关。"""
+    __slots__ = ("n", "heap")
+
+    def __init__(self, n: int):
+        self.n = max(0, n)
+        self.heap: List[tuple] = [] # (大小, 路径, 附加值)，堆顶为当前第 n 大
+
+    def push(self, path: str, size: int, extra=None):
+        heap = self.heap
+        if len(heap) < self.n:
+            heapq.heappush(heap, (size, path, extra))
+        elif heap and size > heap[0][0]: # 绝大多数条目在这里被直接丢弃，不分配元组
+            heapq.heapreplace(heap, (size, path, extra))
+
+    def largest(self) -> List[tuple]:
+        """按大小降序返回 [(路径, 大小, 附加值), ...]，同一路径只应推入一次。"""
+        return [(path, size, extra) for size, path, extra in sorted(self.heap, reverse=True)]
+
+def stream_tree(root_path: str, on_file: Callable[[str, os.stat_result], None] | None = None,
+                on_dir: Callable[[str, int, int], None] | None = None,
+                cancel_event: threading.Event | None = None, throttle: IOThrottle | None = None) -> Tuple[int, int, int]:
+    """
+    单线程流式遍历 root_path: 不构建目录树，也不保留文件列表，
+    内存只与目录深度和单个目录的子目录数有关 (另加 inode 去重集合)。
+    每个文件调用一次 on_file(路径, stat) (硬链接只调用一次)；每个目录在其子树全部完成后
+    调用 on_dir(路径, 大小, 占用) (后序，包括根目录)。不跟随符号链接。
+    无法访问的条目被跳过并计入错误数。根目录无法访问时抛出 OSError。
+    提供 throttle 时以低影响模式遍历。返回 (总大小, 总占用, 错误数)。
+    """
+    with throttle.io_priority() if throttle is not None else nullcontext():
+        return _stream_tree(root_path, on_file, on_dir, cancel_event, throttle)
+
+def _stream_tree(root_path: str, on_file: Callable[[str, os.stat_result], None] | None,
+                 on_dir: Callable[[str, int, int], None] | None, cancel_event: threading.Event | None,
+                 throttle: IOThrottle | None) -> Tuple[int, int, int]:
+    ctx = ScanContext()
+    errors = 0
+
+    def enter(dir_path: str) -> list:
+        nonlocal errors
+        subdirs: List[str] = []
+        size = alloc = 0
+        entries = 0
+        started = time.perf_counter()
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                entries += 1
                 try:
-                    if os.path.exists(entry_path): # Check existence before trying to determine type
-                        if os.path.isfile(entry_path):
-                            direct_files.append((entry.name, -2))
-                        elif os.path.isdir(entry_path):
-                            direct_subdirs_info.append((entry.name, -2))
-                        else:
-                            direct_files.append((entry.name, -2)) # Default if type is still unknown
-                    else:
-                        pass # Skip this entry entirely if its basic properties can't be read even in fallback
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        if st.st_nlink > 1 and not ctx.file_inodes.add(st.st_dev, st.st_ino):
+                            continue
+                        size += st.st_size
+                        alloc += _allocated_size(st)
+                        if on_file:
+                            on_file(entry.path, st)
                 except OSError:
-                    pass # Skip this entry entirely if its basic properties can't be read even in fallback
+                    errors += 1
+        if throttle is not None:
+            throttle.charge(entries + 2, time.perf_counter() - started)
+        return [dir_path, subdirs, size, alloc] # 栈帧: 目录, 待进入的子目录, 累计大小, 累计占用
+
+    root_path = os.path.abspath(root_path)
+    st = os.stat(root_path)
+    ctx.dir_inodes.add(st.st_dev, st.st_ino)
+    stack = [enter(root_path)]
+    while True:
+        frame = stack[-1]
+        if frame[1]:
+            if cancel_event is not None and cancel_event.is_set():
+                raise ScanCancelled(root_path)
+            dir_path = os.path.join(frame[0], frame[1].pop())
+            try:
+                st = os.stat(dir_path, follow_symlinks=False)
+                if ctx.dir_inodes.add(st.st_dev, st.st_ino):
+                    stack.append(enter(dir_path))
+            except OSError:
+                errors += 1
+            continue
+        stack.pop()
+        if on_dir:
+            on_dir(frame[0], frame[2], frame[3])
+        if not stack:
+            return frame[2], frame[3], errors
+        stack[-1][2] += frame[2]
+        stack[-1][3] += frame[3]
+
+def find_largest(root_path: str, n: int = 100, cancel_event: threading.Event | None = None,
+                 throttle: IOThrottle | None = None) -> Tuple[List[Tuple[str, int, int]], List[Tuple[str, int, int]], int, int, int]:
+    """
+    一次流式遍历找出 root_path 下最大的 n 个文件和 n 个目录 (按表观大小，目录不含根目录本身)。
+    返回 (最大文件, 最大目录, 总大小, 总占用, 错误数)，前两项均为按大小降序的 [(路径, 大小, 占用), ...]。
+    """
+    root_path = os.path.abspath(root_path)
+    top_files = TopN(n)
+    top_dirs = TopN(n)
+
+    def on_file(path: str, st: os.stat_result):
+        top_files.push(path, st.st_size, _allocated_size(st))
+
+    def on_dir(path: str, size: int, alloc: int):
+        if path != root_path:
+            top_dirs.push(path, size, alloc)
+
+    total, total_alloc, errors = stream_tree(root_path, on_file, on_dir, cancel_event, throttle)
+    return top_files.largest(), top_dirs.largest(), total, total_alloc, errors
+
+# 重复文件查找: 头尾各读取的字节数、完整哈希时每次送入哈希的块大小，以及哈希线程数
+DUPLICATE_PARTIAL_BYTES = 64 << 10
+DUPLICATE_HASH_CHUNK = 8 << 20
+DEFAULT_HASH_WORKERS = min(8, (os.cpu_count() or 1) * 2)
 
-    except (PermissionError, OSError) as e_scan_base:
-        raise e_scan_base # Re-raise to be handled by the calling screen
+def _hash_file(path: str, size: int, partial: bool) -> bytes:
+    """
+    计算文件哈希。partial 为 True 时只读取头尾各 DUPLICATE_PARTIAL_BYTES 字节，
+    否则通过 mmap 整个读取 (不经过用户态缓冲区复制)。hashlib 在处理大块数据时会释放 GIL。
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        if partial:
+            digest.update(f.read(DUPLICATE_PARTIAL_BYTES))
+            if size > DUPLICATE_PARTIAL_BYTES:
+                f.seek(max(DUPLICATE_PARTIAL_BYTES, size - DUPLICATE_PARTIAL_BYTES))
+                digest.update(f.read(DUPLICATE_PARTIAL_BYTES))
+            return digest.digest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mapped, "madvise"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            with memoryview(mapped) as view:
+                for offset in range(0, len(view), DUPLICATE_HASH_CHUNK):
+                    digest.update(view[offset:offset + DUPLICATE_HASH_CHUNK])
+                    if hasattr(mapped, "madvise"): # 已哈希的部分移出本进程的映射，RSS 不随文件大小增长
+                        mapped.madvise(mmap.MADV_DONTNEED, offset, min(DUPLICATE_HASH_CHUNK, len(view) - offset))
+    return digest.digest()
+
+def _regroup_by_hash(groups: List[Tuple[int, List[str]]], partial: bool, workers: int,
+                     cancel_event: threading.Event | None) -> Tuple[List[Tuple[int, List[str]]], int]:
+    """
+    用线程池对每组候选文件计算哈希，按 (大小, 哈希) 重新分组，只保留仍有多个成员的组。
+    读取失败的文件被剔除并计入返回的错误数。
+    """
+    jobs = [(size, path) for size, paths in groups for path in paths]
+    regrouped: Dict[Tuple[int, bytes], List[str]] = defaultdict(list)
+    errors = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(_hash_file, path, size, partial): (size, path) for size, path in jobs}
+        for future in as_completed(futures):
+            if cancel_event is not None and cancel_event.is_set():
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise ScanCancelled()
+            size, path = futures[future]
+            try:
+                regrouped[(size, future.result())].append(path)
+            except (OSError, ValueError):
+                errors += 1
+    return [(size, sorted(paths)) for (size, _), paths in regrouped.items() if len(paths) > 1], errors
+
+def find_duplicates(root_path: str, min_size: int = 1, workers: int = DEFAULT_HASH_WORKERS,
+                    cancel_event: threading.Event | None = None,
+                    progress: Callable[[str], None] | None = None,
+                    throttle: IOThrottle | None = None) -> Tuple[List[Tuple[int, List[str]]], int, int]:
+    """
+    分阶段查找重复文件: 先按大小分组 (一次流式遍历，只看 stat)，再对大小相同的文件
+    比较头尾 64 KiB 的哈希，仍然相同的才完整哈希。小于等于 128 KiB 的文件在第二阶段已被完整读取，
+    不再重复哈希。硬链接已由遍历去重，不会被当作重复文件。
+    返回 (重复组, 扫描的文件数, 错误数)，重复组为 [(单个文件大小, [路径, ...]), ...]，
+    按可回收空间 (大小 x (份数 - 1)) 降序。progress 接收阶段说明文字。
+    throttle 只作用于遍历阶段，哈希阶段的读取量可用 workers 控制。
+    """
+    first_by_size: Dict[int, str] = {} # 大多数大小只出现一次，第二次出现时才建列表
+    same_size: Dict[int, List[str]] = {}
+    scanned = 0
+
+    def on_file(path: str, st: os.stat_result):
+        nonlocal scanned
+        scanned += 1
+        size = st.st_size
+        if size < min_size:
+            return
+        first = first_by_size.setdefault(size, path)
+        if first is not path:
+            paths = same_size.get(size)
+            if paths is None:
+                same_size[size] = [first, path]
+            else:
+                paths.append(path)
+
+    if progress:
+        progress("按大小分组中...")
+    _, _, errors = stream_tree(root_path, on_file, cancel_event=cancel_event, throttle=throttle)
+    first_by_size.clear()
+    candidates = list(same_size.items())
+    same_size.clear()
+
+    if progress:
+        progress(f"比较头尾数据: {sum(len(paths) for _, paths in candidates)} 个候选文件...")
+    candidates, hash_errors = _regroup_by_hash(candidates, True, workers, cancel_event)
+    errors += hash_errors
+
+    small = [group for group in candidates if group[0] <= 2 * DUPLICATE_PARTIAL_BYTES] # 头尾已覆盖整个文件
+    large = [group for group in candidates if group[0] > 2 * DUPLICATE_PARTIAL_BYTES]
+    if progress:
+        progress(f"完整哈希: {sum(len(paths) for _, paths in large)} 个文件...")
+    large, hash_errors = _regroup_by_hash(large, False, workers, cancel_event)
+    errors += hash_errors
+
+    duplicates = small + large
+    duplicates.sort(key=lambda group: (group[0] * (len(group[1]) - 1), group[0]), reverse=True)
+    return duplicates, scanned, errors
+
+# 导出报告 (--cli) 中每个目录记录的字段
+REPORT_FIELDS = ("path", "apparent_size", "allocated_size", "file_count", "mtime")
+
+def iter_tree_records(root: DirNode, max_depth: int | None = None):
+    """
+    逐个产出目录记录 (路径, 表观大小, 实际占用, 文件数, mtime 秒)，字段顺序同 REPORT_FIELDS。
+    先序遍历且同级目录按名称排序，因此输出按路径分量元组 (path.split(os.sep)) 有序，
+    快照对比依赖这一顺序做归并。无权限的目录大小为 -1。
+    max_depth 限制输出的目录深度 (根目录为 0)，大小仍包含更深的子目录。
+    """
+    stack = [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        yield node.path, node.size, node.alloc, node.count, node.mtime // 1_000_000_000
+        if max_depth is None or depth < max_depth:
+            stack.extend((node.children[name], depth + 1) for name in sorted(node.children, reverse=True))
+
+def write_size_report(root: DirNode, out, fmt: str = "ndjson", max_depth: int | None = None) -> int:
+    """
+    把目录树以 NDJSON (每行一个 JSON 对象) 或 CSV (带表头) 流式写入 out，返回写出的记录数。
+    路径中的非 UTF-8 字节以代理字符表示，out 需使用 errors='surrogateescape' 才能原样写出。
+    """
+    records = iter_tree_records(root, max_depth)
+    written = 0
+    if fmt == "csv":
+        writer = csv.writer(out)
+        writer.writerow(REPORT_FIELDS)
+        for record in records:
+            writer.writerow(record)
+            written += 1
+    elif fmt == "ndjson":
+        for record in records:
+            out.write(json.dumps(dict(zip(REPORT_FIELDS, record)), ensure_ascii=False))
+            out.write("\n")
+            written += 1
+    else:
+        raise ValueError(f"不支持的报告格式: {fmt}")
+    return written
+
+def iter_size_report(report_path: str):
+    """
+    逐条读取 --cli 生成的 NDJSON 或 CSV 报告 (按首字符判断格式)，产出 (路径分量, 记录)，
+    记录字段顺序同 REPORT_FIELDS。同时校验报告按路径分量有序，否则抛出 ValueError。
+    """
+    get_fields = itemgetter(*REPORT_FIELDS)
+    last_key = None
+    with open(report_path, 'r', encoding='utf-8', errors='surrogateescape', newline='') as f:
+        is_ndjson = f.read(1) == "{"
+        f.seek(0)
+        if is_ndjson:
+            records = (get_fields(json.loads(line)) for line in f if line.strip())
+        else:
+            records = ((row[0], *map(int, row[1:])) for row in map(get_fields, csv.DictReader(f)))
+        for record in records:
+            key = record[0].split(os.sep)
+            if last_key is not None and key <= last_key:
+                raise ValueError(f"{report_path}: 报告未按路径排序 (位于 {record[0]})")
+            last_key = key
+            yield key, record
+
+def iter_report_diff(old_report: str, new_report: str):
+    """
+    归并连接两份有序报告，按路径顺序产出 (路径, 旧大小, 新大小)，只在一侧存在的目录另一侧为 None。
+    两份报告都只顺序读一遍，内存占用与记录数无关。
+    """
+    old_iter = iter_size_report(old_report)
+    new_iter = iter_size_report(new_report)
+    old = next(old_iter, None)
+    new = next(new_iter, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old[0] < new[0]):
+            yield old[1][0], old[1][1], None
+            old = next(old_iter, None)
+        elif old is None or new[0] < old[0]:
+            yield new[1][0], None, new[1][1]
+            new = next(new_iter, None)
+        else:
+            yield new[1][0], old[1][1], new[1][1]
+            old = next(old_iter, None)
+            new = next(new_iter, None)
 
-    direct_files.sort(key=itemgetter(1), reverse=True)
-    direct_subdirs_info.sort(key=itemgetter(1), reverse=True)
-    return grand_total_size, direct_files, direct_subdirs_info
+def diff_size_reports(old_report: str, new_report: str, n: int = DEFAULT_TOP_N
+                      ) -> Tuple[List[Tuple[str, int, int | None, int | None]],
+                                 List[Tuple[str, int, int | None, int | None]], int, int, int]:
+    """
+    对比两份大小快照。返回 (增长最多, 减少最多, 新增目录数, 消失目录数, 总大小变化)，
+    前两项为按变化量绝对值降序的 [(路径, 变化量, 旧大小, 新大小), ...]，不存在的一侧为 None。
+    无权限 (-1) 和不存在的目录大小都按 0 计算变化量。
+    """
+    grew = TopN(n)
+    shrank = TopN(n)
+    added = removed = 0
+    old_total = new_total = None
+    for path, old_size, new_size in iter_report_diff(old_report, new_report):
+        if old_size is None:
+            added += 1
+        elif old_total is None:
+            old_total = old_size # 先序报告中的第一条记录即根目录
+        if new_size is None:
+            removed += 1
+        elif new_total is None:
+            new_total = new_size
+        delta = max(new_size or 0, 0) - max(old_size or 0, 0)
+        if delta > 0:
+            grew.push(path, delta, (old_size, new_size))
+        elif delta < 0:
+            shrank.push(path, -delta, (old_size, new_size))
+    total_delta = max(new_total or 0, 0) - max(old_total or 0, 0)
+    return ([(path, delta, *sizes) for path, delta, sizes in grew.largest()],
+            [(path, -delta, *sizes) for path, delta, sizes in shrank.largest()],
+            added, removed, total_delta)
+
+def cold_data_rows(root: DirNode, max_depth: int = 1) -> List[DirNode]:
+    """
+    返回已由 compute_cold 计算过的树中深度不超过 max_depth 的目录节点: 根目录在最前，
+    其余按最长阈值下的冷数据量降序 (最适合优先迁移到冷存储的目录在前)。
+    """
+    nodes: List[DirNode] = []
+    stack = [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if node is not root and node.cold is not None:
+            nodes.append(node)
+        if depth < max_depth:
+            stack.extend((child, depth + 1) for child in node.children.values())
+    nodes.sort(key=lambda node: (node.cold[-1], node.size), reverse=True)
+    return [root] + nodes
 
 def format_size(size_in_bytes):
     """将字节数转换为可读格式"""
@@ -81,6 +1457,16 @@ def format_size(size_in_bytes):
         size_in_bytes /= 1024
     return f"{size_in_bytes:.2f} TB" # 处理非常大的情况
 
+def format_size_delta(delta: int) -> str:
+    """带符号的大小变化量。"""
+    return f"+{format_size(delta)}" if delta >= 0 else f"-{format_size(-delta)}"
+
+def format_cold(cold_size: int, total_size: int) -> str:
+    """冷数据大小及其占总大小的百分比。"""
+    if total_size <= 0:
+        return format_size(cold_size)
+    return f"{format_size(cold_size)} ({cold_size * 100 / total_size:.0f}%)"
+
 def get_root_directory():
     """获取系统根目录"""
     if os.name == 'nt':  # Windows
@@ -88,563 +1474,1448 @@ def get_root_directory():
     else:  # Linux/Unix/Mac
         return '/' # pathlib.Path('/')
 
-# 错误对话框
-class ErrorDialog(ModalScreen):
-    """错误提示对话框"""
+def load_tui_app():
+    """导入textual并定义界面相关的类，返回应用类 FileStorageAnalyzerApp。"""
+    from textual.app import App, ComposeResult
+    from textual.widgets import (
+        Header, Footer, Static, Button, 
+        Label, Input, DataTable, DirectoryTree
+    )
+    from textual.containers import Container, Horizontal, Vertical, ScrollableContainer, VerticalScroll
+    from textual.screen import Screen, ModalScreen
+    from textual.binding import Binding
+
+    # 错误对话框
+    class ErrorDialog(ModalScreen):
+        """错误提示对话框"""
     
-    def __init__(self, message: str):
-        super().__init__()
-        self.message = message
+        def __init__(self, message: str):
+            super().__init__()
+            self.message = message
     
-    def compose(self) -> ComposeResult:
-        with Container(id="dialog-container"):
-            yield Label(f"[red]{self.message}[/red]", id="dialog-title")
-            with Horizontal(id="dialog-buttons"):
-                yield Button("确定", id="ok", variant="primary")
+        def compose(self) -> ComposeResult:
+            with Container(id="dialog-container"):
+                yield Label(f"[red]{self.message}[/red]", id="dialog-title")
+                with Horizontal(id="dialog-buttons"):
+                    yield Button("确定", id="ok", variant="primary")
     
-    def on_button_pressed(self, event: Button.Pressed) -> None:
-        if event.button.id == "ok":
-            self.dismiss()
+        def on_button_pressed(self, event: Button.Pressed) -> None:
+            if event.button.id == "ok":
+                self.dismiss()
 
-# 目录选择屏幕
-class DirectoryBrowserScreen(Screen):
-    """目录浏览选择屏幕"""
+    # 目录选择屏幕
+    class DirectoryBrowserScreen(Screen):
+        """目录浏览选择屏幕"""
     
-    BINDINGS = [
-        Binding("escape", "app.pop_screen", "返回", show=True),
-        Binding("backspace", "go_parent", "上级目录", show=True),
-        Binding("/", "go_root", "根目录", show=True)
-    ]
+        BINDINGS = [
+            Binding("escape", "app.pop_screen", "返回", show=True),
+            Binding("backspace", "go_parent", "上级目录", show=True),
+            Binding("/", "go_root", "根目录", show=True)
+        ]
     
-    def __init__(self, callback, current_path="."):
-        super().__init__()
-        self.current_path = os.path.abspath(current_path)
-        self.callback = callback
+        def __init__(self, callback, current_path="."):
+            super().__init__()
+            self.current_path = os.path.abspath(current_path)
+            self.callback = callback
     
-    def compose(self) -> ComposeResult:
-        yield Header(show_clock=True)
-        yield Footer()
+        def compose(self) -> ComposeResult:
+            yield Header(show_clock=True)
+            yield Footer()
         
-        with Container(id="browser-container"):
-            yield Label("[b]请选择目录[/b]", id="browser-title")
-            yield Label(f"当前路径: [blue]{self.current_path}[/blue]", id="current-path-display") # Renamed ID
+            with Container(id="browser-container"):
+                yield Label("[b]请选择目录[/b]", id="browser-title")
+                yield Label(f"当前路径: [blue]{self.current_path}[/blue]", id="current-path-display") # Renamed ID
             
-            with Horizontal(id="nav-buttons"):
-                yield Button("根目录", id="root-dir", variant="primary")
-                yield Button("上级目录", id="parent-dir", variant="warning")
+                with Horizontal(id="nav-buttons"):
+                    yield Button("根目录", id="root-dir", variant="primary")
+                    yield Button("上级目录", id="parent-dir", variant="warning")
             
-            yield Label("操作指南: Backspace=上级目录, /=根目录, Escape=返回", id="browser-help")
+                yield Label("操作指南: Backspace=上级目录, /=根目录, Escape=返回", id="browser-help")
             
-            with ScrollableContainer(id="tree-container"):
-                yield DirectoryTree(self.current_path, id="directory-browser")
+                with ScrollableContainer(id="tree-container"):
+                    yield DirectoryTree(self.current_path, id="directory-browser")
     
-    def on_button_pressed(self, event: Button.Pressed) -> None:
-        if event.button.id == "parent-dir":
-            self.action_go_parent()
-        elif event.button.id == "root-dir":
-            self.action_go_root()
+        def on_button_pressed(self, event: Button.Pressed) -> None:
+            if event.button.id == "parent-dir":
+                self.action_go_parent()
+            elif event.button.id == "root-dir":
+                self.action_go_root()
     
-    def action_go_parent(self) -> None:
-        parent_dir = os.path.dirname(self.current_path)
-        if parent_dir and parent_dir != self.current_path:
-            self.refresh_directory_tree(parent_dir)
+        def action_go_parent(self) -> None:
+            parent_dir = os.path.dirname(self.current_path)
+            if parent_dir and parent_dir != self.current_path:
+                self.refresh_directory_tree(parent_dir)
     
-    def action_go_root(self) -> None:
-        root_dir = get_root_directory()
-        self.refresh_directory_tree(root_dir)
+        def action_go_root(self) -> None:
+            root_dir = get_root_directory()
+            self.refresh_directory_tree(root_dir)
     
-    def refresh_directory_tree(self, new_path):
-        if not os.path.isdir(new_path):
-            self.app.push_screen(ErrorDialog(f"无效路径: {new_path}"))
-            return
+        def refresh_directory_tree(self, new_path):
+            if not os.path.isdir(new_path):
+                self.app.push_screen(ErrorDialog(f"无效路径: {new_path}"))
+                return
         
-        try:
-            self.current_path = new_path
-            self.query_one("#current-path-display").update(f"当前路径: [blue]{self.current_path}[/blue]") # Updated ID
+            try:
+                self.current_path = new_path
+                self.query_one("#current-path-display").update(f"当前路径: [blue]{self.current_path}[/blue]") # Updated ID
             
-            tree_container = self.query_one("#tree-container")
-            tree_container.remove_children()
-            tree_container.mount(DirectoryTree(new_path, id="directory-browser"))
-        except Exception as e:
-            self.app.push_screen(ErrorDialog(f"无法导航到目录: {str(e)}"))
+                tree_container = self.query_one("#tree-container")
+                tree_container.remove_children()
+                tree_container.mount(DirectoryTree(new_path, id="directory-browser"))
+            except Exception as e:
+                self.app.push_screen(ErrorDialog(f"无法导航到目录: {str(e)}"))
     
-    def on_directory_tree_directory_selected(self, event: DirectoryTree.DirectorySelected): # Corrected event type
-        selected_path = str(event.path)
-        self.callback(selected_path)
-        self.app.pop_screen()
-
-# 文件分析结果屏幕
-class FileAnalysisResultScreen(Screen):
-    BINDINGS = [
-        Binding("escape", "custom_pop_screen", "返回上层/主界面", show=True, priority=True),
-        Binding("u", "go_up", "上级目录 (分析内)", show=True),
-    ]
-
-    NUM_BUTTONS_PER_ROW = 2 # Define how many buttons per horizontal row
-
-    def __init__(self, initial_folder_path: str, app_status_callback):
-        super().__init__()
-        self.initial_folder_path = os.path.abspath(initial_folder_path)
-        self.current_analyzed_path = self.initial_folder_path
-        self.path_history: List[str] = [self.initial_folder_path]
-        self.app_status_callback = app_status_callback
-
-        self.current_path_label: Label | None = None
-        self.total_size_label: Label | None = None
-        self.files_table: DataTable | None = None
-        self.subdirs_container: ScrollableContainer | None = None # This will hold Horizontal rows
-        self.go_up_button: Button | None = None
-
-    def compose(self) -> ComposeResult:
-        yield Header(show_clock=True)
+        def on_directory_tree_directory_selected(self, event: DirectoryTree.DirectorySelected): # Corrected event type
+            selected_path = str(event.path)
+            self.callback(selected_path)
+            self.app.pop_screen()
+
+    # 文件分析结果屏幕
+    class FileAnalysisResultScreen(Screen):
+        BINDINGS = [
+            Binding("escape", "custom_pop_screen", "返回上层/主界面", show=True, priority=True),
+            Binding("u", "go_up", "上级目录 (分析内)", show=True),
+            Binding("r", "refresh", "强制重新扫描", show=True),
+            Binding("t", "largest", "最大文件", show=True),
+            Binding("y", "file_types", "文件类型", show=True),
+            Binding("d", "duplicates", "重复文件", show=True),
+            Binding("a", "cold_data", "冷数据", show=True),
+            Binding("w", "toggle_watch", "实时监视", show=True),
+            Binding("left_square_bracket", "prev_page", "上一页", show=True),
+            Binding("right_square_bracket", "next_page", "下一页", show=True),
+        ]
+
+        PAGE_SIZE = 200 # 每个表格一次只构建一页的行，渲染开销与目录条目总数无关
+
+        def __init__(self, initial_folder_path: str, app_status_callback, size_index: DirSizeIndex | None = None):
+            super().__init__()
+            self.initial_folder_path = os.path.abspath(initial_folder_path)
+            self.current_analyzed_path = self.initial_folder_path
+            self.path_history: List[str] = [self.initial_folder_path]
+            self.app_status_callback = app_status_callback
+            self.size_index = size_index if size_index is not None else DirSizeIndex()
+            self.size_tree: DirNode | None = None # 一次扫描得到的整棵目录树，上下导航都在其中查找
+
+            self.current_path_label: Label | None = None
+            self.total_size_label: Label | None = None
+            self.files_title_label: Label | None = None
+            self.subdirs_title_label: Label | None = None
+            self.files_table: DataTable | None = None
+            self.subdirs_table: DataTable | None = None
+            self.go_up_button: Button | None = None
+
+            # 当前显示层的完整数据，表格只渲染其中的一页
+            self.level_files: List[Tuple[str, int, int]] = []
+            self.level_subdirs: List[Tuple[str, int, int]] = []
+            self.level_partial = False
+            self.files_page = 0
+            self.subdirs_page = 0
+            self.subdirs_columns: list = []
+            self.subdirs_page_names: set = set() # 当前页中有行的子目录名
+
+            # 实时监视 (inotify): 停止事件及其所监视的树
+            self.watch_stop: threading.Event | None = None
+            self.watch_root: DirNode | None = None
+
+        def compose(self) -> ComposeResult:
+            yield Header(show_clock=True)
         
-        with Vertical(id="result-top-bar"):
-            self.current_path_label = Label(f"当前分析路径: {self.current_analyzed_path}", id="current-analyzed-path-label")
-            yield self.current_path_label
-            self.total_size_label = Label("总大小: N/A", id="current-total-size-label")
-            yield self.total_size_label
-            self.go_up_button = Button("返回上级 (U)", id="go-up-button", variant="default")
-            yield self.go_up_button
+            with Vertical(id="result-top-bar"):
+                self.current_path_label = Label(f"当前分析路径: {self.current_analyzed_path}", id="current-analyzed-path-label")
+                yield self.current_path_label
+                self.total_size_label = Label("总大小: N/A", id="current-total-size-label")
+                yield self.total_size_label
+                self.go_up_button = Button("返回上级 (U)", id="go-up-button", variant="default")
+                yield self.go_up_button
         
-        yield Label("[b]当前目录文件:[/b]", classes="section-title")
-        with ScrollableContainer(id="files-in-current-dir-container", classes="data-container"):
-            self.files_table = DataTable(id="files-in-current-dir-table")
-            self.files_table.add_columns("文件名", "大小")
+            self.files_title_label = Label("[b]当前目录文件:[/b]", classes="section-title")
+            yield self.files_title_label
+            self.files_table = DataTable(id="files-in-current-dir-table", classes="data-container", cursor_type="row")
+            self.files_table.add_columns("文件名", "大小", "占用空间")
             yield self.files_table
-            
-        yield Label("[b]子目录:[/b]", classes="section-title")
-        # ScrollableContainer will now contain multiple Horizontal widgets, each acting as a row.
-        self.subdirs_container = ScrollableContainer(id="subdirs-list-container", classes="data-container")
-        yield self.subdirs_container # Children (Horizontal rows) will be added in _load_and_display_path_data
-        
-        yield Footer()
 
-    async def on_mount(self) -> None:
-        """加载初始路径的数据。"""
-        await self._load_and_display_path_data(self.initial_folder_path)
-        self._update_go_up_button_state()
-
-    def _update_go_up_button_state(self):
-        """根据历史记录启用/禁用"返回上级"按钮。"""
-        if self.go_up_button:
-            self.go_up_button.disabled = len(self.path_history) <= 1
-
-    async def _load_and_display_path_data(self, path_to_analyze: str):
-        self.current_analyzed_path = os.path.abspath(path_to_analyze)
+            self.subdirs_title_label = Label("[b]子目录:[/b]", classes="section-title")
+            yield self.subdirs_title_label
+            # 子目录放在同一个 DataTable 中 (选中行即进入该目录)，不再为每个子目录挂载一个按钮
+            self.subdirs_table = DataTable(id="subdirs-table", classes="data-container", cursor_type="row")
+            self.subdirs_columns = self.subdirs_table.add_columns("子目录", "大小", "占用空间")
+            yield self.subdirs_table
         
-        # Update the path label here
-        if self.current_path_label:
-            self.current_path_label.update(f"当前分析路径: {self.current_analyzed_path}")
-            self.current_path_label.refresh()
+            yield Footer()
+
+        def on_mount(self) -> None:
+            """加载初始路径的数据。"""
+            if self.subdirs_table:
+                self.subdirs_table.focus()
+            self._start_analysis(self.initial_folder_path)
+            self._update_go_up_button_state()
+
+        def _start_analysis(self, path: str, force: bool = False):
+            """
+            在 Textual worker 中分析 path。同组 worker 互斥，启动新的分析会取消仍在进行的上一次分析，
+            快速连续导航时不会堆积多个并发的全树扫描。
+            """
+            self.run_worker(self._load_and_display_path_data(path, force),
+                            group="analysis", exclusive=True, exit_on_error=False)
+
+        def _update_go_up_button_state(self):
+            """根据历史记录启用/禁用"返回上级"按钮。"""
+            if self.go_up_button:
+                self.go_up_button.disabled = len(self.path_history) <= 1
+
+        def _resolve_node(self, path: str, force: bool, progress: ScanProgress | None = None,
+                          cancel_event: threading.Event | None = None) -> DirNode:
+            """
+            在工作线程中取得 path 对应的目录节点。
+            已扫描过的树直接复用，不再访问磁盘；强制刷新时只重建该子树，并把大小差值传回祖先节点。
+            重建子树时，树中其它位置已计入的硬链接不再计入该子树。
+            """
+            node = self.size_tree.find(path) if self.size_tree is not None else None
+            if node is not None and not force:
+                if node.files is None:
+                    node.load_files()
+                return node
+
+            hard_links = None
+            if node is not None and node.parent is not None:
+                hard_links = _hard_link_owners(self.size_tree, skip=node)
+            with self.size_index.lock: # 被取消的上一次扫描退出后才会开始新的扫描
+                new_node = build_size_tree(path, self.size_index, force, workers=DEFAULT_SCAN_WORKERS,
+                                           progress=progress, cancel_event=cancel_event,
+                                           throttle=self.app.io_throttle, summaries=True, hard_links=hard_links)
+            self.size_index.save()
+            if node is None or node.parent is None:
+                self.size_tree = new_node
+                return new_node
+
+            parent = node.parent
+            new_node.parent = parent
+            parent.children[node.name] = new_node
+            size_delta = max(new_node.size, 0) - max(node.size, 0)
+            alloc_delta = max(new_node.alloc, 0) - max(node.alloc, 0)
+            count_delta = new_node.count - node.count
+            while parent is not None:
+                parent.size += size_delta
+                parent.alloc += alloc_delta
+                parent.count += count_delta
+                parent = parent.parent
+            return new_node
+
+        @staticmethod
+        def _page_count(total_rows: int) -> int:
+            return max(1, -(-total_rows // FileAnalysisResultScreen.PAGE_SIZE))
+
+        def _render_files_page(self):
+            """只为当前页的文件构建表格行。"""
+            if not self.files_table:
+                return
+            pages = self._page_count(len(self.level_files))
+            self.files_page = min(self.files_page, pages - 1)
+            start = self.files_page * self.PAGE_SIZE
+            if self.files_title_label:
+                self.files_title_label.update(
+                    f"[b]当前目录文件:[/b] 共 {len(self.level_files)} 个，第 {self.files_page + 1}/{pages} 页"
+                )
+            self.files_table.clear()
+            if not self.level_files:
+                self.files_table.add_row("此目录中没有文件。", "", "")
+                return
+            for file_name, file_size, file_alloc in self.level_files[start:start + self.PAGE_SIZE]:
+                self.files_table.add_row(file_name, format_size(file_size), format_size(file_alloc))
 
-        self.app_status_callback(f"分析中: {self.current_analyzed_path}...")
-        self.query(".subdir-button").remove() # Clear previous buttons
+        def _render_subdirs_page(self):
+            """只为当前页的子目录构建表格行，行键为子目录名。"""
+            if not self.subdirs_table:
+                return
+            pages = self._page_count(len(self.level_subdirs))
+            self.subdirs_page = min(self.subdirs_page, pages - 1)
+            start = self.subdirs_page * self.PAGE_SIZE
+            if self.subdirs_title_label:
+                self.subdirs_title_label.update(
+                    f"[b]子目录:[/b] 共 {len(self.level_subdirs)} 个，第 {self.subdirs_page + 1}/{pages} 页 (回车进入)"
+                )
+            cursor_row = self.subdirs_table.cursor_row
+            self.subdirs_table.clear()
+            self.subdirs_page_names = set()
+            if not self.level_subdirs:
+                if not self.level_partial:
+                    self.subdirs_table.add_row("没有子目录或无法访问。", "", "")
+                return
+            for subdir_name, subdir_size, subdir_alloc in self.level_subdirs[start:start + self.PAGE_SIZE]:
+                if self.level_partial:
+                    size_text, alloc_text = f"{format_size(subdir_size)}+", "计算中..."
+                else:
+                    size_text, alloc_text = format_size(subdir_size), format_size(subdir_alloc)
+                self.subdirs_table.add_row(subdir_name, size_text, alloc_text, key=subdir_name)
+                self.subdirs_page_names.add(subdir_name)
+            # 扫描过程中表格会反复刷新，尽量保持用户的光标位置
+            self.subdirs_table.move_cursor(row=min(cursor_row, self.subdirs_table.row_count - 1))
+
+        def _render_level(self, grand_total_size: int, grand_total_alloc: int,
+                          direct_files: List[Tuple[str, int, int]], direct_subdirs: List[Tuple[str, int, int]],
+                          partial: bool = False):
+            """显示一层目录的分析结果，partial 为 True 时表示扫描仍在进行中。"""
+            if self.total_size_label:
+                if partial:
+                    self.total_size_label.update(f"总大小: 计算中... (已统计 {format_size(grand_total_size)})")
+                else:
+                    self.total_size_label.update(
+                        f"总大小: {format_size(grand_total_size)}  占用空间: {format_size(grand_total_alloc)}"
+                    )
+
+            files_changed = direct_files is not self.level_files
+            self.level_files = direct_files
+            self.level_subdirs = direct_subdirs
+            self.level_partial = partial
+            if files_changed: # 扫描过程中的快照共用同一个根目录文件列表，无需重复渲染
+                self._render_files_page()
+            self._render_subdirs_page()
+
+        async def _load_and_display_path_data(self, path_to_analyze: str, force: bool = False):
+            self.current_analyzed_path = os.path.abspath(path_to_analyze)
         
-        if self.total_size_label:
-            self.total_size_label.update("总大小: 计算中...")
+            # Update the path label here
+            if self.current_path_label:
+                self.current_path_label.update(f"当前分析路径: {self.current_analyzed_path}")
+                self.current_path_label.refresh()
 
-        if self.files_table:
-            self.files_table.clear()
+            self.app_status_callback(f"分析中: {self.current_analyzed_path}...")
         
-        # Clear previous Horizontal rows from the subdirs_container
-        if self.subdirs_container:
-            await self.subdirs_container.remove_children()
-
-        try:
-            grand_total_size, direct_files, direct_subdirs = await asyncio.to_thread(
-                get_current_level_analysis, self.current_analyzed_path
-            )
-
             if self.total_size_label:
-                self.total_size_label.update(f"总大小: {format_size(grand_total_size)}")
+                self.total_size_label.update("总大小: 计算中...")
 
+            self.files_page = self.subdirs_page = 0
+            self.level_files, self.level_subdirs = [], []
             if self.files_table:
-                if not direct_files:
-                    self.files_table.add_row(Static("此目录中没有文件。"))
-                else:
-                    for file_name, file_size in direct_files:
-                        self.files_table.add_row(file_name, format_size(file_size))
-            
-            if self.subdirs_container: # Check if container exists
-                if not direct_subdirs:
-                    # If no subdirs, we might want to mount a message directly to subdirs_container
-                    await self.subdirs_container.mount(Static("  没有子目录或无法访问。"))
-                else:
-                    current_row_horizontal: Horizontal | None = None
-                    buttons_in_current_row = 0
-
-                    for i, (subdir_name, subdir_size) in enumerate(direct_subdirs):
-                        # Create a new Horizontal row if needed
-                        if buttons_in_current_row == 0 or not current_row_horizontal:
-                            current_row_horizontal = Horizontal(classes="subdir-row")
-                            await self.subdirs_container.mount(current_row_horizontal)
-                            buttons_in_current_row = 0 # Reset for the new row
-                        
-                        button_label = f"{subdir_name} ({format_size(subdir_size)})"
-                        safe_id_name = "".join(c if c.isalnum() else "_" for c in subdir_name)
-                        subdir_button = Button(
-                            button_label,
-                            id=f"subdir_{safe_id_name}_{hash(subdir_name)}", 
-                            variant="primary", 
-                            classes="subdir-button"
-                        )
-                        subdir_button.full_path = os.path.join(self.current_analyzed_path, subdir_name)
-                        
-                        try:
-                            if current_row_horizontal:
-                                await current_row_horizontal.mount(subdir_button)
-                                buttons_in_current_row += 1
-                        except Exception as e_mount:
-                            # Optionally, inform the user about this specific button mount error
-                            self.app_status_callback(f"[yellow]挂载按钮 '{subdir_name}' 出错[/yellow]")
-
-                        # If row is full, reset for next iteration to create a new row
-                        if buttons_in_current_row >= self.NUM_BUTTONS_PER_ROW:
-                            buttons_in_current_row = 0
-                            current_row_horizontal = None # Signal to create a new row next time
-            
-            self.app_status_callback(f"[green]分析完成: {self.current_analyzed_path}[/green]")
+                self.files_table.clear()
+            if self.subdirs_table:
+                self.subdirs_table.clear()
 
-        except Exception as e:
-            error_message = f"分析 {self.current_analyzed_path} 出错: {str(e)}"
-            self.app_status_callback(f"[red]{error_message}[/red]")
-            if self.total_size_label:
-                self.total_size_label.update("总大小: [red]错误[/red]")
-            # If error, we might still want to mount the error to subdirs_container
-            if self.subdirs_container:
-                 await self.subdirs_container.mount(Static(f"[red]分析时发生错误: {str(e)}[/red]"))
-
-        self._update_go_up_button_state()
-
-    async def on_button_pressed(self, event: Button.Pressed) -> None:
-        button_id = event.button.id
-        if button_id == "go-up-button":
-            await self.action_go_up()
-        elif hasattr(event.button, 'full_path'): 
-            clicked_subdir_path = event.button.full_path
+            try:
+                # 扫描线程通过 ScanProgress 节流推送部分结果，这里边等待边刷新界面
+                loop = asyncio.get_running_loop()
+                snapshots: asyncio.Queue = asyncio.Queue()
+                progress = ScanProgress(lambda *snapshot: loop.call_soon_threadsafe(snapshots.put_nowait, snapshot))
+                cancel_event = threading.Event()
+                scan_task = asyncio.create_task(
+                    asyncio.to_thread(self._resolve_node, self.current_analyzed_path, force, progress, cancel_event)
+                )
+                try:
+                    while not scan_task.done():
+                        next_snapshot = asyncio.create_task(snapshots.get())
+                        try:
+                            await asyncio.wait({scan_task, next_snapshot}, return_when=asyncio.FIRST_COMPLETED)
+                        finally:
+                            got_snapshot = next_snapshot.done()
+                            if not got_snapshot:
+                                next_snapshot.cancel()
+                        if not got_snapshot:
+                            break
+                        snapshot = next_snapshot.result()
+                        while not snapshots.empty(): # 只显示最新的快照
+                            snapshot = snapshots.get_nowait()
+                        self._render_level(*snapshot, partial=True)
+                except asyncio.CancelledError:
+                    # Worker 被取消 (导航到了其它目录): 通知扫描线程在下一个目录处停止
+                    cancel_event.set()
+                    scan_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+                    raise
+
+                # 扫描完成后用完整结果做最终校正 (包括无权限目录等标记)
+                node = await scan_task
+                self._render_level(*node.level_analysis())
+                self.app_status_callback(f"[green]分析完成: {self.current_analyzed_path}[/green]")
+                if self.watch_stop is not None and (force or self.watch_root is not self.size_tree):
+                    self._start_watch() # 树被重建或刷新过，重新为其中的目录添加 watch
+
+            except Exception as e:
+                error_message = f"分析 {self.current_analyzed_path} 出错: {str(e)}"
+                self.app_status_callback(f"[red]{error_message}[/red]")
+                if self.total_size_label:
+                    self.total_size_label.update("总大小: [red]错误[/red]")
+                if self.subdirs_table:
+                    self.subdirs_table.clear()
+                    self.subdirs_table.add_row(f"[red]分析时发生错误: {str(e)}[/red]", "", "")
+
+            self._update_go_up_button_state()
+
+        async def on_button_pressed(self, event: Button.Pressed) -> None:
+            button_id = event.button.id
+            if button_id == "go-up-button":
+                await self.action_go_up()
+
+        def on_data_table_row_selected(self, event: DataTable.RowSelected) -> None:
+            """选中子目录表格中的一行时进入该目录。"""
+            if event.data_table is not self.subdirs_table or event.row_key.value is None:
+                return
+            clicked_subdir_path = os.path.join(self.current_analyzed_path, event.row_key.value)
             if not os.path.isdir(clicked_subdir_path):
                 self.app.push_screen(ErrorDialog(f"无法访问目录: {clicked_subdir_path}"))
                 return
 
             if self.path_history[-1] != clicked_subdir_path:
                  self.path_history.append(clicked_subdir_path)
-            await self._load_and_display_path_data(clicked_subdir_path)
-
-    async def action_go_up(self) -> None:
-        """在分析历史记录中导航到父目录。"""
-        if len(self.path_history) > 1:
-            self.path_history.pop() 
-            parent_path = self.path_history[-1] 
-            await self._load_and_display_path_data(parent_path)
-        self._update_go_up_button_state()
-
-    async def action_custom_pop_screen(self) -> None: 
-        """自定义弹出屏幕以处理历史记录或退出。"""
-        if len(self.path_history) > 1:
-            await self.action_go_up()
-        else:
-            self.app.pop_screen()
+            self._start_analysis(clicked_subdir_path)
+
+        def action_toggle_watch(self) -> None:
+            """开启/关闭实时监视: 用 inotify 把文件变化增量应用到已扫描的树上，不重新扫描。"""
+            if self.watch_stop is not None:
+                self._stop_watch()
+                self.app_status_callback("已停止实时监视")
+            elif self.size_tree is None or self.level_partial:
+                self.app_status_callback("[yellow]请等待扫描完成后再开启实时监视[/yellow]")
+            else:
+                self._start_watch()
+
+        def _start_watch(self):
+            self._stop_watch()
+            stop_event = self.watch_stop = threading.Event()
+            root = self.watch_root = self.size_tree
+            self.app_status_callback("正在为目录添加监视...")
+            self.run_worker(lambda: self._watch_loop(root, stop_event), thread=True, group="watch",
+                            exit_on_error=False)
+
+        def _stop_watch(self):
+            if self.watch_stop is not None:
+                self.watch_stop.set()
+            self.watch_stop = None
+            self.watch_root = None
+
+        def _watch_loop(self, root: DirNode, stop_event: threading.Event):
+            """在线程中等待 inotify 事件，重新列出变化的目录后交给界面线程应用到树上。"""
+            try:
+                watcher = TreeWatcher(root)
+            except OSError as e:
+                if not stop_event.is_set():
+                    self.app.call_from_thread(self.app_status_callback, f"[red]无法开启实时监视: {str(e)}[/red]")
+                    self.app.call_from_thread(self._stop_watch)
+                return
+            try:
+                note = "，已达到 inotify 监视数量上限，部分目录未被监视" if watcher.truncated else ""
+                if not stop_event.is_set():
+                    self.app.call_from_thread(self.app_status_callback,
+                                              f"[green]实时监视中: {watcher.watch_count} 个目录{note}[/green]")
+                while not stop_event.is_set():
+                    changed, overflow = watcher.wait_changes(stop_event)
+                    if stop_event.is_set():
+                        break
+                    if overflow:
+                        self.app.call_from_thread(self.app_status_callback,
+                                                  "[yellow]变化过多，部分变化可能未反映，可按 R 重新扫描[/yellow]")
+                    if changed:
+                        updates = watcher.collect_updates(changed)
+                        if not stop_event.is_set():
+                            self.app.call_from_thread(self._apply_watch_updates, root, updates)
+            finally:
+                watcher.close()
+
+        def _apply_watch_updates(self, root: DirNode, updates: List[tuple]):
+            """把监视到的变化应用到树上，并只刷新当前显示层中受影响的行。"""
+            if root is not self.size_tree:
+                return # 树已被新的扫描替换
+            touched = apply_dir_updates(root, updates)
+            current = self.current_analyzed_path
+            node = root.find(current)
+            if node is None or current not in touched or self.level_partial:
+                return # 变化不在当前显示的目录下
+            if any(path == current and (added or removed) for path, *_, added, removed in updates):
+                self._render_level(*node.level_analysis()) # 子目录增减，整层重新渲染
+                return
+
+            if self.total_size_label:
+                self.total_size_label.update(f"总大小: {format_size(node.size)}  占用空间: {format_size(node.alloc)}")
+            if any(path == current for path, *_ in updates):
+                self.level_files = sorted(node.files or [], key=itemgetter(1), reverse=True)
+                self._render_files_page()
+            level_subdirs = []
+            for name, size, alloc in self.level_subdirs:
+                child = node.children.get(name)
+                if child is not None and child.path in touched:
+                    size, alloc = child.size, child.alloc
+                    if self.subdirs_table and name in self.subdirs_page_names:
+                        self.subdirs_table.update_cell(name, self.subdirs_columns[1], format_size(size))
+                        self.subdirs_table.update_cell(name, self.subdirs_columns[2], format_size(alloc))
+                level_subdirs.append((name, size, alloc))
+            self.level_subdirs = level_subdirs
+
+        def on_unmount(self) -> None:
+            self._stop_watch()
+
+        def _change_page(self, step: int):
+            """翻页作用于当前获得焦点的表格 (默认为子目录表格)。"""
+            if self.focused is self.files_table:
+                pages = self._page_count(len(self.level_files))
+                self.files_page = max(0, min(pages - 1, self.files_page + step))
+                self._render_files_page()
+            else:
+                pages = self._page_count(len(self.level_subdirs))
+                self.subdirs_page = max(0, min(pages - 1, self.subdirs_page + step))
+                self._render_subdirs_page()
+
+        def action_prev_page(self) -> None:
+            self._change_page(-1)
+
+        def action_next_page(self) -> None:
+            self._change_page(1)
+
+        async def action_go_up(self) -> None:
+            """在分析历史记录中导航到父目录。"""
+            if len(self.path_history) > 1:
+                self.path_history.pop() 
+                parent_path = self.path_history[-1] 
+                self._start_analysis(parent_path)
+            self._update_go_up_button_state()
+
+        async def action_refresh(self) -> None:
+            """忽略索引，强制重新扫描当前目录。"""
+            self._start_analysis(self.current_analyzed_path, force=True)
+
+        def action_largest(self) -> None:
+            """列出当前目录下最大的文件和目录。"""
+            self.app.push_screen(LargestItemsScreen(self.current_analyzed_path, self.app_status_callback))
+
+        def action_file_types(self) -> None:
+            """统计当前目录下的文件类型分布。"""
+            self.app.push_screen(FileTypeStatsScreen(self.current_analyzed_path, self.app_status_callback,
+                                                     self._resolve_node))
+
+        def action_duplicates(self) -> None:
+            """查找当前目录下的重复文件。"""
+            self.app.push_screen(DuplicateFilesScreen(self.current_analyzed_path, self.app_status_callback))
+
+        def action_cold_data(self) -> None:
+            """分析当前目录下长期未使用的数据。"""
+            self.app.push_screen(ColdDataScreen(self.current_analyzed_path, self.app_status_callback,
+                                                self._resolve_node))
+
+        async def action_custom_pop_screen(self) -> None: 
+            """自定义弹出屏幕以处理历史记录或退出。"""
+            if len(self.path_history) > 1:
+                await self.action_go_up()
+            else:
+                self.app.pop_screen()
+
+    class LargestItemsScreen(Screen):
+        """显示目录下最大的 N 个文件和 N 个目录 (一次流式遍历，内存占用固定)。"""
+        BINDINGS = [
+            Binding("escape", "app.pop_screen", "返回", show=True, priority=True),
+            Binding("r", "refresh", "重新扫描", show=True),
+        ]
+
+        def __init__(self, folder_path: str, app_status_callback, top_n: int = DEFAULT_TOP_N):
+            super().__init__()
+            self.folder_path = os.path.abspath(folder_path)
+            self.app_status_callback = app_status_callback
+            self.top_n = top_n
+            self.summary_label: Label | None = None
+            self.files_table: DataTable | None = None
+            self.dirs_table: DataTable | None = None
+
+        def compose(self) -> ComposeResult:
+            yield Header(show_clock=True)
+            yield Label(f"最大的文件和目录: {self.folder_path}", id="largest-path-label")
+            self.summary_label = Label("扫描中...", id="largest-summary-label")
+            yield self.summary_label
+            yield Label(f"[b]最大的 {self.top_n} 个文件:[/b]", classes="section-title")
+            self.files_table = DataTable(id="largest-files-table", classes="data-container", cursor_type="row")
+            self.files_table.add_columns("大小", "占用空间", "路径")
+            yield self.files_table
+            yield Label(f"[b]最大的 {self.top_n} 个目录:[/b]", classes="section-title")
+            self.dirs_table = DataTable(id="largest-dirs-table", classes="data-container", cursor_type="row")
+            self.dirs_table.add_columns("大小", "占用空间", "路径")
+            yield self.dirs_table
+            yield Footer()
+
+        def on_mount(self) -> None:
+            self.action_refresh()
+
+        def action_refresh(self) -> None:
+            self.run_worker(self._scan(), group="largest", exclusive=True, exit_on_error=False)
+
+        async def _scan(self):
+            self.app_status_callback(f"查找最大文件中: {self.folder_path}...")
+            if self.summary_label:
+                self.summary_label.update("扫描中...")
+            cancel_event = threading.Event()
+            try:
+                top_files, top_dirs, total, total_alloc, errors = await asyncio.to_thread(
+                    find_largest, self.folder_path, self.top_n, cancel_event, self.app.io_throttle
+                )
+            except asyncio.CancelledError:
+                cancel_event.set() # 屏幕关闭或重新扫描时让扫描线程尽快退出
+                raise
+            except Exception as e:
+                self.app_status_callback(f"[red]查找最大文件出错: {str(e)}[/red]")
+                if self.summary_label:
+                    self.summary_label.update(f"[red]错误: {str(e)}[/red]")
+                return
+
+            for table, rows in ((self.files_table, top_files), (self.dirs_table, top_dirs)):
+                if not table:
+                    continue
+                table.clear()
+                for path, size, alloc in rows:
+                    table.add_row(format_size(size), format_size(alloc), path)
+            if self.summary_label:
+                error_note = f"，{errors} 个条目无法访问" if errors else ""
+                self.summary_label.update(
+                    f"总大小: {format_size(total)}  占用空间: {format_size(total_alloc)}{error_note}"
+                )
+            self.app_status_callback(f"[green]最大文件查找完成: {self.folder_path}[/green]")
+
+    class FileTypeStatsScreen(Screen):
+        """显示目录下按类别、扩展名和文件大小区间的容量分布。"""
+        BINDINGS = [
+            Binding("escape", "app.pop_screen", "返回", show=True, priority=True),
+            Binding("r", "refresh", "重新扫描", show=True),
+        ]
+
+        def __init__(self, folder_path: str, app_status_callback, resolve_node: Callable[..., DirNode]):
+            """resolve_node 为 FileAnalysisResultScreen._resolve_node: 从已扫描的树中取得节点，强制刷新时重新扫描子树。"""
+            super().__init__()
+            self.folder_path = os.path.abspath(folder_path)
+            self.app_status_callback = app_status_callback
+            self.resolve_node = resolve_node
+            self.summary_label: Label | None = None
+            self.categories_table: DataTable | None = None
+            self.extensions_table: DataTable | None = None
+            self.histogram_table: DataTable | None = None
+
+        def compose(self) -> ComposeResult:
+            yield Header(show_clock=True)
+            yield Label(f"文件类型分布: {self.folder_path}", id="types-path-label")
+            self.summary_label = Label("扫描中...", id="types-summary-label")
+            yield self.summary_label
+            with Horizontal(id="types-top-row"):
+                with Vertical():
+                    yield Label("[b]按类别:[/b]", classes="section-title")
+                    self.categories_table = DataTable(id="types-categories-table", classes="data-container",
+                                                      cursor_type="row")
+                    self.categories_table.add_columns("类别", "文件数", "大小", "占用空间")
+                    yield self.categories_table
+                with Vertical():
+                    yield Label("[b]按文件大小:[/b]", classes="section-title")
+                    self.histogram_table = DataTable(id="types-histogram-table", classes="data-container",
+                                                     cursor_type="row")
+                    self.histogram_table.add_columns("大小区间", "文件数", "大小")
+                    yield self.histogram_table
+            yield Label("[b]按扩展名:[/b]", classes="section-title")
+            self.extensions_table = DataTable(id="types-extensions-table", classes="data-container", cursor_type="row")
+            self.extensions_table.add_columns("扩展名", "文件数", "大小", "占用空间")
+            yield self.extensions_table
+            yield Footer()
+
+        def on_mount(self) -> None:
+            self.run_worker(self._scan(False), group="types", exclusive=True, exit_on_error=False)
+
+        def action_refresh(self) -> None:
+            self.run_worker(self._scan(True), group="types", exclusive=True, exit_on_error=False)
+
+        def _summarize(self, force: bool, cancel_event: threading.Event):
+            root = self.resolve_node(self.folder_path, force, cancel_event=cancel_event)
+            stats = FileTypeStats()
+            stats.add_tree(root)
+            return root, stats.summary()
+
+        async def _scan(self, force: bool):
+            """从分析界面已扫描的树汇总类型分布，只有按 R 强制刷新时才重新扫描磁盘。"""
+            self.app_status_callback(f"统计文件类型中: {self.folder_path}...")
+            if self.summary_label:
+                self.summary_label.update("扫描中..." if force else "汇总中...")
+            cancel_event = threading.Event()
+            try:
+                root, (by_ext, categories, histogram) = await asyncio.to_thread(self._summarize, force, cancel_event)
+            except asyncio.CancelledError:
+                cancel_event.set()
+                raise
+            except Exception as e:
+                self.app_status_callback(f"[red]统计文件类型出错: {str(e)}[/red]")
+                if self.summary_label:
+                    self.summary_label.update(f"[red]错误: {str(e)}[/red]")
+                return
 
-# 文件分析应用
-class FileStorageAnalyzerApp(App):
-    """文件分析应用"""
+            for table, rows in ((self.categories_table, categories), (self.extensions_table, by_ext)):
+                if not table:
+                    continue
+                table.clear()
+                for name, count, size, alloc in rows[:FileAnalysisResultScreen.PAGE_SIZE]:
+                    table.add_row(name, f"{count:,}", format_size(size), format_size(alloc))
+            if self.histogram_table:
+                self.histogram_table.clear()
+                for label, count, size in histogram:
+                    self.histogram_table.add_row(label, f"{count:,}", format_size(size))
+            if self.summary_label:
+                self.summary_label.update(
+                    f"总大小: {format_size(root.size)}  占用空间: {format_size(root.alloc)}  "
+                    f"文件数: {root.count:,}  扩展名: {len(by_ext)} 种"
+                )
+            self.app_status_callback(f"[green]文件类型统计完成: {self.folder_path}[/green]")
+
+    class DuplicateFilesScreen(Screen):
+        """列出目录下内容完全相同的文件组，按可回收空间排序；选中一组时在下方显示其所有路径。"""
+        BINDINGS = [
+            Binding("escape", "app.pop_screen", "返回", show=True, priority=True),
+            Binding("r", "refresh", "重新扫描", show=True),
+        ]
+
+        def __init__(self, folder_path: str, app_status_callback):
+            super().__init__()
+            self.folder_path = os.path.abspath(folder_path)
+            self.app_status_callback = app_status_callback
+            self.duplicates: List[Tuple[int, List[str]]] = []
+            self.summary_label: Label | None = None
+            self.groups_table: DataTable | None = None
+            self.paths_table: DataTable | None = None
+
+        def compose(self) -> ComposeResult:
+            yield Header(show_clock=True)
+            yield Label(f"重复文件: {self.folder_path}", id="dupes-path-label")
+            self.summary_label = Label("扫描中...", id="dupes-summary-label")
+            yield self.summary_label
+            yield Label("[b]重复文件组 (按可回收空间排序):[/b]", classes="section-title")
+            self.groups_table = DataTable(id="dupes-groups-table", classes="data-container", cursor_type="row")
+            self.groups_table.add_columns("可回收空间", "单个大小", "份数", "首个路径")
+            yield self.groups_table
+            yield Label("[b]该组的所有文件:[/b]", classes="section-title")
+            self.paths_table = DataTable(id="dupes-paths-table", classes="data-container", cursor_type="row")
+            self.paths_table.add_columns("路径")
+            yield self.paths_table
+            yield Footer()
+
+        def on_mount(self) -> None:
+            self.action_refresh()
+
+        def action_refresh(self) -> None:
+            self.run_worker(self._scan(), group="duplicates", exclusive=True, exit_on_error=False)
+
+        async def _scan(self):
+            self.app_status_callback(f"查找重复文件中: {self.folder_path}...")
+            loop = asyncio.get_running_loop()
+
+            def show_stage(message: str):
+                if self.summary_label:
+                    loop.call_soon_threadsafe(self.summary_label.update, message)
+
+            cancel_event = threading.Event()
+            try:
+                duplicates, scanned, errors = await asyncio.to_thread(
+                    find_duplicates, self.folder_path, 1, DEFAULT_HASH_WORKERS, cancel_event, show_stage,
+                    self.app.io_throttle
+                )
+            except asyncio.CancelledError:
+                cancel_event.set()
+                raise
+            except Exception as e:
+                self.app_status_callback(f"[red]查找重复文件出错: {str(e)}[/red]")
+                if self.summary_label:
+                    self.summary_label.update(f"[red]错误: {str(e)}[/red]")
+                return
+
+            self.duplicates = duplicates
+            reclaimable = sum(size * (len(paths) - 1) for size, paths in duplicates)
+            if self.groups_table:
+                self.groups_table.clear()
+                for i, (size, paths) in enumerate(duplicates[:FileAnalysisResultScreen.PAGE_SIZE]):
+                    self.groups_table.add_row(format_size(size * (len(paths) - 1)), format_size(size),
+                                              str(len(paths)), paths[0], key=str(i))
+            if self.paths_table:
+                self.paths_table.clear()
+            if self.summary_label:
+                error_note = f"，{errors} 个文件无法读取" if errors else ""
+                self.summary_label.update(
+                    f"扫描 {scanned:,} 个文件，{len(duplicates):,} 组重复，可回收 {format_size(reclaimable)}{error_note}"
+                )
+            self.app_status_callback(f"[green]重复文件查找完成: {self.folder_path}[/green]")
+
+        def on_data_table_row_highlighted(self, event: DataTable.RowHighlighted) -> None:
+            if event.data_table is not self.groups_table or event.row_key.value is None or not self.paths_table:
+                return
+            self.paths_table.clear()
+            for path in self.duplicates[int(event.row_key.value)][1]:
+                self.paths_table.add_row(path)
+
+    class ColdDataScreen(Screen):
+        """显示当前目录及其子目录中长期未访问/修改的数据量。"""
+        BINDINGS = [
+            Binding("escape", "app.pop_screen", "返回", show=True, priority=True),
+            Binding("r", "refresh", "重新扫描", show=True),
+        ]
+
+        def __init__(self, folder_path: str, app_status_callback, resolve_node: Callable[..., DirNode]):
+            """resolve_node 同 FileTypeStatsScreen。"""
+            super().__init__()
+            self.folder_path = os.path.abspath(folder_path)
+            self.app_status_callback = app_status_callback
+            self.resolve_node = resolve_node
+            self.summary_label: Label | None = None
+            self.cold_table: DataTable | None = None
+
+        def compose(self) -> ComposeResult:
+            yield Header(show_clock=True)
+            yield Label(f"冷数据分析: {self.folder_path}", id="cold-path-label")
+            self.summary_label = Label("扫描中...", id="cold-summary-label")
+            yield self.summary_label
+            yield Label(f"[b]子目录 (按 {COLD_AGE_DAYS[-1]} 天以上未使用的数据量排序):[/b]", classes="section-title")
+            self.cold_table = DataTable(id="cold-table", classes="data-container", cursor_type="row")
+            self.cold_table.add_columns("子目录", "大小", *(f"{days} 天以上" for days in COLD_AGE_DAYS))
+            yield self.cold_table
+            yield Footer()
+
+        def on_mount(self) -> None:
+            self.run_worker(self._scan(False), group="cold", exclusive=True, exit_on_error=False)
+
+        def action_refresh(self) -> None:
+            self.run_worker(self._scan(True), group="cold", exclusive=True, exit_on_error=False)
+
+        def _compute(self, force: bool, cancel_event: threading.Event) -> DirNode:
+            root = self.resolve_node(self.folder_path, force, cancel_event=cancel_event)
+            compute_cold(root, COLD_AGE_DAYS)
+            return root
+
+        async def _scan(self, force: bool):
+            """从分析界面已扫描的树计算冷数据，只有按 R 强制刷新时才重新扫描磁盘。"""
+            self.app_status_callback(f"分析冷数据中: {self.folder_path}...")
+            if self.summary_label:
+                self.summary_label.update("扫描中..." if force else "汇总中...")
+            cancel_event = threading.Event()
+            try:
+                root = await asyncio.to_thread(self._compute, force, cancel_event)
+            except asyncio.CancelledError:
+                cancel_event.set()
+                raise
+            except Exception as e:
+                self.app_status_callback(f"[red]分析冷数据出错: {str(e)}[/red]")
+                if self.summary_label:
+                    self.summary_label.update(f"[red]错误: {str(e)}[/red]")
+                return
+
+            if self.cold_table:
+                self.cold_table.clear()
+                for node in cold_data_rows(root, max_depth=1)[1:FileAnalysisResultScreen.PAGE_SIZE + 1]:
+                    self.cold_table.add_row(node.name, format_size(node.size),
+                                            *(format_cold(cold_size, node.size) for cold_size in node.cold or ()))
+            if self.summary_label:
+                self.summary_label.update(f"总大小: {format_size(root.size)}  " + "  ".join(
+                    f"{days} 天以上未使用: {format_cold(cold_size, root.size)}"
+                    for days, cold_size in zip(COLD_AGE_DAYS, root.cold)
+                ))
+            self.app_status_callback(f"[green]冷数据分析完成: {self.folder_path}[/green]")
+
+    class SnapshotDiffDialog(ModalScreen):
+        """输入两份 --cli 报告路径的对话框，确认后打开快照对比屏幕。"""
+
+        def __init__(self, app_status_callback):
+            super().__init__()
+            self.app_status_callback = app_status_callback
+
+        def compose(self) -> ComposeResult:
+            with Container(id="dialog-container"):
+                yield Label("对比两份目录大小报告 (由 --cli 生成):", id="dialog-title")
+                yield Input(placeholder="旧报告路径", id="old-report-input")
+                yield Input(placeholder="新报告路径", id="new-report-input")
+                with Horizontal(id="dialog-buttons"):
+                    yield Button("对比", id="compare", variant="primary")
+                    yield Button("取消", id="cancel", variant="default")
+
+        def on_button_pressed(self, event: Button.Pressed) -> None:
+            if event.button.id == "cancel":
+                self.dismiss()
+            elif event.button.id == "compare":
+                old_report = self.query_one("#old-report-input", Input).value.strip()
+                new_report = self.query_one("#new-report-input", Input).value.strip()
+                for report in (old_report, new_report):
+                    if not os.path.isfile(report):
+                        self.app.push_screen(ErrorDialog(f"报告文件不存在: {report}" if report else "请输入两份报告的路径！"))
+                        return
+                self.dismiss()
+                self.app.push_screen(SnapshotDiffScreen(old_report, new_report, self.app_status_callback))
+
+    class SnapshotDiffScreen(Screen):
+        """显示两份大小快照之间增长和减少最多的目录。"""
+        BINDINGS = [
+            Binding("escape", "app.pop_screen", "返回", show=True, priority=True),
+        ]
+
+        def __init__(self, old_report: str, new_report: str, app_status_callback, top_n: int = DEFAULT_TOP_N):
+            super().__init__()
+            self.old_report = old_report
+            self.new_report = new_report
+            self.app_status_callback = app_status_callback
+            self.top_n = top_n
+            self.summary_label: Label | None = None
+            self.grew_table: DataTable | None = None
+            self.shrank_table: DataTable | None = None
+
+        def compose(self) -> ComposeResult:
+            yield Header(show_clock=True)
+            yield Label(f"快照对比: {self.old_report} -> {self.new_report}", id="diff-path-label")
+            self.summary_label = Label("对比中...", id="diff-summary-label")
+            yield self.summary_label
+            yield Label("[b]增长最多的目录:[/b]", classes="section-title")
+            self.grew_table = DataTable(id="diff-grew-table", classes="data-container", cursor_type="row")
+            self.grew_table.add_columns("变化", "旧大小", "新大小", "路径")
+            yield self.grew_table
+            yield Label("[b]减少最多的目录:[/b]", classes="section-title")
+            self.shrank_table = DataTable(id="diff-shrank-table", classes="data-container", cursor_type="row")
+            self.shrank_table.add_columns("变化", "旧大小", "新大小", "路径")
+            yield self.shrank_table
+            yield Footer()
+
+        def on_mount(self) -> None:
+            self.run_worker(self._compare(), exit_on_error=False)
+
+        async def _compare(self):
+            self.app_status_callback("对比快照中...")
+            try:
+                grew, shrank, added, removed, total_delta = await asyncio.to_thread(
+                    diff_size_reports, self.old_report, self.new_report, self.top_n
+                )
+            except (OSError, ValueError, KeyError) as e:
+                self.app_status_callback(f"[red]对比快照出错: {str(e)}[/red]")
+                if self.summary_label:
+                    self.summary_label.update(f"[red]错误: {str(e)}[/red]")
+                return
+
+            for table, rows in ((self.grew_table, grew), (self.shrank_table, shrank)):
+                if not table:
+                    continue
+                table.clear()
+                for path, delta, old_size, new_size in rows:
+                    table.add_row(format_size_delta(delta),
+                                  "-" if old_size is None else format_size(old_size),
+                                  "-" if new_size is None else format_size(new_size), path)
+            if self.summary_label:
+                self.summary_label.update(
+                    f"总大小变化: {format_size_delta(total_delta)}  新增目录: {added}  消失目录: {removed}"
+                )
+            self.app_status_callback("[green]快照对比完成[/green]")
+
+    # 文件分析应用
+    class FileStorageAnalyzerApp(App):
+        """文件分析应用"""
     
-    CSS = """
-    /* CSS - Main changes will be to .subdir-row and .subdir-button */
-
-    Screen {
-        background: $surface;
-    }
-
-    #title, #browser-title {
-        dock: top;
-        width: 100%;
-        text-align: center;
-        text-style: bold;
-        background: $accent;
-        color: $text;
-        padding: 1;
-        margin-bottom: 1;
-    }
-
-    #browser-help, #nav-label {
-        text-align: center;
-        color: $text-muted;
-        margin: 1 0;
-    }
-
-    #current-path-display {
-        text-align: center;
-        margin-bottom: 1;
-        background: $primary-darken-2;
-        padding: 1;
-    }
-
-    #nav-buttons {
-        width: 100%;
-        height: auto;
-        align: center middle;
-        margin: 1 0;
-    }
-
-    #nav-buttons Button {
-        min-width: 10;
-        margin: 0 1;
-        padding: 0 1;
-    }
-
-    #tree-container {
-        width: 100%;
-        height: 25;
-        border: solid $accent;
-        margin: 1 0;
-    }
-
-    #main-container, #browser-container, #result-container {
-        width: 100%;
-        height: 100%;
-        padding: 1;
-    }
-
-    #input-area {
-        width: 100%;
-        height: auto;
-        margin: 1;
-        padding: 1;
-        border: round $primary;
-    }
-
-    #path-input-label {
-        margin-bottom: 1;
-    }
-
-    #path-input-field {
-        width: 100%;
-        margin-bottom: 1;
-    }
-
-    #action-buttons {
-        width: 100%;
-        margin: 1 0;
-        align: center middle;
-    }
-
-    #action-buttons Button {
-        margin: 0 1;
-    }
-
-    #status-display {
-        height: auto;
-        min-height: 3;
-        width: 100%;
-        margin: 1;
-        padding: 1;
-        border: solid $accent;
-        background: $surface-darken-1;
-        text-align: center;
-    }
-
-    #directory-browser {
-        width: 100%;
-        min-height: 20;
-    }
-
-    #dialog-container {
-        width: 60%;
-        height: auto;
-        padding: 2;
-        background: $surface;
-        border: thick $error;
-        margin: 1 0;
-        align: center middle;
-    }
-
-    #dialog-title {
-        text-align: center;
-        width: 100%;
-        margin-bottom: 2;
-    }
-
-    #dialog-buttons {
-        align: center middle;
-        width: 100%;
-    }
-
-    /* Styles for FileAnalysisResultScreen */
-    #result-top-bar {
-        width: 100%;
-        padding: 1;
-        background: $primary-background;
-        border: round $primary;
-        margin-bottom:1;
-        height: 7; /* 设置一个合适的高度，足够显示所有内容 */
-    }
-
-    #current-analyzed-path-label {
-        width: 100%;
-        text-align: center;
-        text-style: bold;
-        margin-bottom: 1;
-    }
-    #current-total-size-label {
-        width: 100%;
-        text-align: center;
-        color: $secondary;
-         margin-bottom: 1;
-    }
-
-    #go-up-button {
-        width: 100%;
-        margin-top: 1;
-    }
-
-    .section-title {
-        width: 100%;
-        padding: 1;
-        background: $secondary-background;
-        text-style: bold;
-        text-align: center;
-        margin-top: 1;
-    }
-
-    .data-container {
-        width: 100%;
-        border: round $primary;
-        margin-top: 1;
-    }
+        CSS = """
+        /* CSS */
+
+        Screen {
+            background: $surface;
+        }
+
+        #title, #browser-title {
+            dock: top;
+            width: 100%;
+            text-align: center;
+            text-style: bold;
+            background: $accent;
+            color: $text;
+            padding: 1;
+            margin-bottom: 1;
+        }
+
+        #browser-help, #nav-label {
+            text-align: center;
+            color: $text-muted;
+            margin: 1 0;
+        }
+
+        #current-path-display {
+            text-align: center;
+            margin-bottom: 1;
+            background: $primary-darken-2;
+            padding: 1;
+        }
+
+        #nav-buttons {
+            width: 100%;
+            height: auto;
+            align: center middle;
+            margin: 1 0;
+        }
+
+        #nav-buttons Button {
+            min-width: 10;
+            margin: 0 1;
+            padding: 0 1;
+        }
+
+        #tree-container {
+            width: 100%;
+            height: 25;
+            border: solid $accent;
+            margin: 1 0;
+        }
+
+        #main-container, #browser-container, #result-container {
+            width: 100%;
+            height: 100%;
+            padding: 1;
+        }
+
+        #input-area {
+            width: 100%;
+            height: auto;
+            margin: 1;
+            padding: 1;
+            border: round $primary;
+        }
+
+        #path-input-label {
+            margin-bottom: 1;
+        }
+
+        #path-input-field {
+            width: 100%;
+            margin-bottom: 1;
+        }
+
+        #action-buttons {
+            width: 100%;
+            margin: 1 0;
+            align: center middle;
+        }
+
+        #action-buttons Button {
+            margin: 0 1;
+        }
+
+        #status-display {
+            height: auto;
+            min-height: 3;
+            width: 100%;
+            margin: 1;
+            padding: 1;
+            border: solid $accent;
+            background: $surface-darken-1;
+            text-align: center;
+        }
+
+        #directory-browser {
+            width: 100%;
+            min-height: 20;
+        }
+
+        #dialog-container {
+            width: 60%;
+            height: auto;
+            padding: 2;
+            background: $surface;
+            border: thick $error;
+            margin: 1 0;
+            align: center middle;
+        }
+
+        #dialog-title {
+            text-align: center;
+            width: 100%;
+            margin-bottom: 2;
+        }
+
+        #dialog-buttons {
+            align: center middle;
+            width: 100%;
+        }
+
+        /* Styles for FileAnalysisResultScreen */
+        #result-top-bar {
+            width: 100%;
+            padding: 1;
+            background: $primary-background;
+            border: round $primary;
+            margin-bottom:1;
+            height: 7; /* 设置一个合适的高度，足够显示所有内容 */
+        }
+
+        #current-analyzed-path-label {
+            width: 100%;
+            text-align: center;
+            text-style: bold;
+            margin-bottom: 1;
+        }
+        #current-total-size-label {
+            width: 100%;
+            text-align: center;
+            color: $secondary;
+             margin-bottom: 1;
+        }
+
+        #go-up-button {
+            width: 100%;
+            margin-top: 1;
+        }
+
+        .section-title {
+            width: 100%;
+            padding: 1;
+            background: $secondary-background;
+            text-style: bold;
+            text-align: center;
+            margin-top: 1;
+        }
+
+        .data-container {
+            width: 100%;
+            border: round $primary;
+            margin-top: 1;
+        }
     
-    #files-in-current-dir-container {
-        height: 10;
-    }
-
-    #files-in-current-dir-table {
-        width: 100%;
-    }
-
-    #subdirs-list-container {
-        height: 20; /* Height for the scrollable area of rows */
-    }
-
-    /* Styles for the new Horizontal rows and buttons within them */
-    .subdir-row {
-        width: 100%;
-        height: auto; /* Row height will be determined by button height + padding/margin */
-        align: left middle; /* Corrected: Horizontal align left, Vertical align middle */
-        /* Optionally, add some vertical margin between rows if Horizontal doesn't have it */
-        margin-bottom: 1;
-    }
-
-    .subdir-row .subdir-button {
-        width: 1fr; /* Distribute space equally among buttons in a row */
-        height: 3;
-        margin-right: 1; /* Space between buttons in a row */
-        /* To ensure the last button in a row doesn't have extra margin: */
-        /* &:last-child { margin-right: 0; } */ /* This is advanced CSS, might not work in Textual basic CSS */
-        
-        border: round $secondary; 
-        background: $secondary-background; 
-        text-align: center; 
-    }
-    """
-
-    BINDINGS = [
-        Binding("q", "quit", "退出", show=True),
-        Binding("escape", "handle_escape", "退出/返回", show=True)
-    ]
+        #files-in-current-dir-table {
+            height: 12;
+        }
+
+        #subdirs-table {
+            height: 20;
+        }
+
+        #old-report-input, #new-report-input {
+            margin-bottom: 1;
+        }
+
+        #types-top-row {
+            height: 16;
+        }
+
+        #types-categories-table, #types-histogram-table {
+            height: 1fr;
+        }
+
+        #dupes-paths-table {
+            height: 10;
+        }
+
+        #largest-files-table, #largest-dirs-table, #diff-grew-table, #diff-shrank-table, #types-extensions-table,
+        #dupes-groups-table, #cold-table {
+            height: 1fr;
+        }
+        """
+
+        BINDINGS = [
+            Binding("q", "quit", "退出", show=True),
+            Binding("escape", "handle_escape", "退出/返回", show=True)
+        ]
     
-    def __init__(self):
-        super().__init__()
-        self.path_input: Input | None = None
-        self.status_label: Static | None = None 
-
-    def compose(self) -> ComposeResult:
-        """创建应用界面"""
-        yield Header(show_clock=True)
-        yield Footer()
+        def __init__(self, initial_path: str | None = None, io_throttle: IOThrottle | None = None):
+            super().__init__()
+            self.initial_path = initial_path
+            self.io_throttle = io_throttle # 低影响模式 (--nice) 下所有扫描共享的节流器
+            self.path_input: Input | None = None
+            self.status_label: Static | None = None 
+            self.size_index = DirSizeIndex() # 在多次分析之间共享的持久化目录大小索引
+
+        def compose(self) -> ComposeResult:
+            """创建应用界面"""
+            yield Header(show_clock=True)
+            yield Footer()
         
-        with Container(id="main-container"):
-            yield Label("[b]文件夹分析工具[/b]", id="title")
+            with Container(id="main-container"):
+                yield Label("[b]文件夹分析工具[/b]", id="title")
             
-            with Vertical(id="input-area"):
-                yield Label("请输入要分析的目录路径:", id="path-input-label") 
-                self.path_input = Input(placeholder="例如: /home/user/documents", id="path-input-field") 
-                yield self.path_input
+                with Vertical(id="input-area"):
+                    yield Label("请输入要分析的目录路径:", id="path-input-label") 
+                    self.path_input = Input(value=self.initial_path or "", placeholder="例如: /home/user/documents", id="path-input-field") 
+                    yield self.path_input
                 
-                with Horizontal(id="action-buttons"):
-                    yield Button("分析", id="analyze", variant="primary")
-                    yield Button("浏览...", id="browse", variant="default")
+                    with Horizontal(id="action-buttons"):
+                        yield Button("分析", id="analyze", variant="primary")
+                        yield Button("浏览...", id="browse", variant="default")
+                        yield Button("最大文件", id="largest", variant="default")
+                        yield Button("对比快照", id="diff", variant="default")
             
-            self.status_label = Static("请输入目录路径并点击分析按钮。", id="status-display") 
-            yield self.status_label
+                self.status_label = Static("请输入目录路径并点击分析按钮。", id="status-display") 
+                yield self.status_label
     
-    def on_mount(self):
-        """应用加载完成后执行"""
-        # self.path_input 和 self.status_label 已在 compose 中赋值
-        if self.path_input: # 设置初始焦点
-             self.path_input.focus()
-
-    def update_status(self, message: str):
-        """回调函数，用于从其他屏幕更新状态标签。"""
-        if self.status_label:
-            self.status_label.update(message)
-
-    async def on_button_pressed(self, event: Button.Pressed) -> None:
-        """处理按钮点击事件"""
-        if event.button.id == "analyze":
-            await self.action_analyze_directory() 
-        elif event.button.id == "browse":
-            self.action_browse_directory() 
+        def on_mount(self):
+            """应用加载完成后执行"""
+            # self.path_input 和 self.status_label 已在 compose 中赋值
+            if self.path_input: # 设置初始焦点
+                 self.path_input.focus()
+
+        def update_status(self, message: str):
+            """回调函数，用于从其他屏幕更新状态标签。"""
+            if self.status_label:
+                self.status_label.update(message)
+
+        async def on_button_pressed(self, event: Button.Pressed) -> None:
+            """处理按钮点击事件"""
+            if event.button.id == "analyze":
+                await self.action_analyze_directory() 
+            elif event.button.id == "browse":
+                self.action_browse_directory() 
+            elif event.button.id == "largest":
+                self.action_find_largest()
+            elif event.button.id == "diff":
+                self.push_screen(SnapshotDiffDialog(self.update_status))
     
-    def action_browse_directory(self):
-        self.update_status("[blue]正在浏览目录...[/blue]")
-        current_path = "."
-        if self.path_input and self.path_input.value and os.path.isdir(self.path_input.value):
-            current_path = self.path_input.value
-        self.push_screen(DirectoryBrowserScreen(self.on_directory_selected, current_path))
-
-    def on_directory_selected(self, selected_path: str):
-        """处理目录选择的回调函数"""
-        if self.path_input:
-            self.path_input.value = selected_path
-        self.update_status(f"[green]已选择目录: {selected_path}[/green]")
+        def action_browse_directory(self):
+            self.update_status("[blue]正在浏览目录...[/blue]")
+            current_path = "."
+            if self.path_input and self.path_input.value and os.path.isdir(self.path_input.value):
+                current_path = self.path_input.value
+            self.push_screen(DirectoryBrowserScreen(self.on_directory_selected, current_path))
+
+        def on_directory_selected(self, selected_path: str):
+            """处理目录选择的回调函数"""
+            if self.path_input:
+                self.path_input.value = selected_path
+            self.update_status(f"[green]已选择目录: {selected_path}[/green]")
     
-    async def action_analyze_directory(self): 
-        if not self.path_input: return
+        async def action_analyze_directory(self): 
+            if not self.path_input: return
 
-        directory = self.path_input.value.strip()
+            directory = self.path_input.value.strip()
         
-        if not directory:
-            self.push_screen(ErrorDialog("请输入有效的目录路径！"))
-            return
+            if not directory:
+                self.push_screen(ErrorDialog("请输入有效的目录路径！"))
+                return
         
-        if not os.path.isdir(directory):
-            self.push_screen(ErrorDialog(f"\'{directory}\' 不是有效目录。"))
-            return
+            if not os.path.isdir(directory):
+                self.push_screen(ErrorDialog(f"\'{directory}\' 不是有效目录。"))
+                return
         
-        analyze_button = self.query_one("#analyze", Button)
-        analyze_button.disabled = True
+            analyze_button = self.query_one("#analyze", Button)
+            analyze_button.disabled = True
         
-        try:
-            self.push_screen(FileAnalysisResultScreen(directory, self.update_status))
-        except Exception as e:
-            self.update_status(f"[red]启动分析界面时出错: {str(e)}[/red]")
-        finally:
-            analyze_button.disabled = False
-
-    def action_handle_escape(self):
-        """处理全局Escape键。"""
-        # This action is now less likely to conflict with screen-specific Escape
-        # because the app's Escape binding no longer has priority=True.
-        if len(self.screen_stack) == 1: # 主屏幕
-            self.exit() # Corrected from self.app.quit()
-        else:
-            # If a screen is active, its own Escape binding (if any) should have taken precedence.
-            # If it didn't (e.g., no Escape binding on the active screen),
-            # Textual's default behavior is to pop the screen. This app-level handler
-            # might be called after a screen pop or if the screen didn't handle Escape.
-            pass
+            try:
+                self.push_screen(FileAnalysisResultScreen(directory, self.update_status, self.size_index))
+            except Exception as e:
+                self.update_status(f"[red]启动分析界面时出错: {str(e)}[/red]")
+            finally:
+                analyze_button.disabled = False
+
+        def action_find_largest(self):
+            """列出输入目录下最大的文件和目录。"""
+            if not self.path_input: return
+
+            directory = self.path_input.value.strip()
+            if not directory or not os.path.isdir(directory):
+                self.push_screen(ErrorDialog(f"\'{directory}\' 不是有效目录。" if directory else "请输入有效的目录路径！"))
+                return
+            self.push_screen(LargestItemsScreen(directory, self.update_status))
+
+        def action_handle_escape(self):
+            """处理全局Escape键。"""
+            # This action is now less likely to conflict with screen-specific Escape
+            # because the app's Escape binding no longer has priority=True.
+            if len(self.screen_stack) == 1: # 主屏幕
+                self.exit() # Corrected from self.app.quit()
+            else:
+                # If a screen is active, its own Escape binding (if any) should have taken precedence.
+                # If it didn't (e.g., no Escape binding on the active screen),
+                # Textual's default behavior is to pop the screen. This app-level handler
+                # might be called after a screen pop or if the screen didn't handle Escape.
+                pass
+
+    return FileStorageAnalyzerApp
+
+
+def print_largest(root_path: str, top_files: List[Tuple[str, int, int]], top_dirs: List[Tuple[str, int, int]],
+                  total: int, total_alloc: int, errors: int):
+    """以文本表格输出 find_largest 的结果。"""
+    print(f"目录: {os.path.abspath(root_path)}")
+    print(f"总大小: {format_size(total)}  占用空间: {format_size(total_alloc)}")
+    if errors:
+        print(f"警告: {errors} 个条目无法访问，未计入统计")
+    for title, rows in (("最大的文件", top_files), ("最大的目录", top_dirs)):
+        print(f"\n{title} ({len(rows)}):")
+        for path, size, alloc in rows:
+            print(f"  {format_size(size):>12}  {format_size(alloc):>12}  {path}")
+
+def print_type_stats(root_path: str, root: DirNode, stats: FileTypeStats, limit: int = DEFAULT_TOP_N):
+    """以文本表格输出文件类型分布 (扩展名只列出最大的 limit 个)。"""
+    by_ext, categories, histogram = stats.summary()
+    print(f"目录: {os.path.abspath(root_path)}")
+    print(f"总大小: {format_size(root.size)}  占用空间: {format_size(root.alloc)}  文件数: {root.count:,}")
+    print("\n按类别:")
+    for name, count, size, alloc in categories:
+        print(f"  {name:<16} {count:>12,}  {format_size(size):>12}  {format_size(alloc):>12}")
+    print("\n按文件大小:")
+    for label, count, size in histogram:
+        print(f"  {label:<16} {count:>12,}  {format_size(size):>12}")
+    print(f"\n按扩展名 (前 {min(limit, len(by_ext))} / {len(by_ext)}):")
+    for name, count, size, alloc in by_ext[:limit]:
+        print(f"  {name:<16} {count:>12,}  {format_size(size):>12}  {format_size(alloc):>12}")
+
+def print_duplicates(root_path: str, duplicates: List[Tuple[int, List[str]]], scanned: int, errors: int,
+                     limit: int = DEFAULT_TOP_N):
+    """以文本形式输出 find_duplicates 的结果 (只列出可回收空间最大的 limit 组)。"""
+    reclaimable = sum(size * (len(paths) - 1) for size, paths in duplicates)
+    print(f"目录: {os.path.abspath(root_path)}")
+    print(f"扫描 {scanned:,} 个文件，{len(duplicates):,} 组重复，可回收 {format_size(reclaimable)}")
+    if errors:
+        print(f"警告: {errors} 个条目无法读取，未参与比较")
+    for size, paths in duplicates[:limit]:
+        print(f"\n{format_size(size)} x {len(paths)} (可回收 {format_size(size * (len(paths) - 1))}):")
+        for path in paths:
+            print(f"  {path}")
+
+def print_cold_data(root_path: str, root: DirNode, max_depth: int = 1, limit: int = DEFAULT_TOP_N):
+    """以文本表格输出冷数据分析结果。"""
+    print(f"目录: {os.path.abspath(root_path)}")
+    print(f"冷数据: 最后访问和修改时间都早于 {'/'.join(map(str, COLD_AGE_DAYS))} 天的文件")
+    header = "".join(f"{f'{days} 天以上':>22}" for days in COLD_AGE_DAYS)
+    print(f"\n  {'大小':>10}{header}  路径")
+    for node in cold_data_rows(root, max_depth)[:limit + 1]:
+        columns = "".join(f"{format_cold(cold_size, node.size):>24}" for cold_size in node.cold)
+        print(f"  {format_size(node.size):>12}{columns}  {node.path}")
+
+def print_report_diff(old_report: str, new_report: str, grew: list, shrank: list,
+                      added: int, removed: int, total_delta: int):
+    """以文本表格输出 diff_size_reports 的结果。"""
+    print(f"旧快照: {old_report}")
+    print(f"新快照: {new_report}")
+    print(f"总大小变化: {format_size_delta(total_delta)}  新增目录: {added}  消失目录: {removed}")
+    for title, rows in (("增长最多的目录", grew), ("减少最多的目录", shrank)):
+        print(f"\n{title} ({len(rows)}):")
+        for path, delta, old_size, new_size in rows:
+            old_text = "-" if old_size is None else format_size(old_size)
+            new_text = "-" if new_size is None else format_size(new_size)
+            print(f"  {format_size_delta(delta):>13}  {old_text:>12} -> {new_text:<12}  {path}")
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='文件夹大小分析工具')
+    parser.add_argument('path', nargs='?',
+                        help='要分析的目录 (命令行模式必填，界面模式下作为初始路径)')
+    parser.add_argument('--top', type=int, metavar='N',
+                        help=f'不启动界面，流式扫描并输出最大的 N 个文件和 N 个目录 (例如 {DEFAULT_TOP_N})')
+    parser.add_argument('--cli', action='store_true',
+                        help='不启动界面，扫描目录并输出每个目录的大小报告 (按路径排序)')
+    parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson',
+                        help='--cli 报告格式 (默认: ndjson)')
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help='--cli 报告输出文件 (默认: 标准输出)')
+    parser.add_argument('--max-depth', type=int, metavar='N',
+                        help='--cli 报告只列出前 N 层目录 (大小仍包含更深的目录)')
+    parser.add_argument('--types', action='store_true',
+                        help='不启动界面，统计目录下按类别/扩展名/文件大小区间的容量分布 (扩展名条目数由 --top 指定)')
+    parser.add_argument('--dupes', action='store_true',
+                        help='不启动界面，查找内容相同的重复文件 (输出组数由 --top 指定)')
+    parser.add_argument('--min-size', type=int, default=1, metavar='BYTES',
+                        help='--dupes 忽略小于该大小的文件 (默认: 1，即跳过空文件)')
+    parser.add_argument('--cold', action='store_true',
+                        help=f'不启动界面，统计各目录中 {"/".join(map(str, COLD_AGE_DAYS))} 天以上未访问/修改的数据量 '
+                             '(目录深度由 --max-depth 指定，默认 1)')
+    parser.add_argument('--diff', nargs=2, metavar=('OLD', 'NEW'),
+                        help='对比两份 --cli 报告，列出增长/减少最多的目录 (条目数由 --top 指定)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_SCAN_WORKERS,
+                        help=f'扫描线程数 (默认: {DEFAULT_SCAN_WORKERS})')
+    parser.add_argument('--nice', action='store_true',
+                        help='低影响模式: idle I/O 优先级、限制每秒系统调用数，并在存储延迟升高时自动降速')
+    parser.add_argument('--max-iops', type=int, default=DEFAULT_MAX_IOPS, metavar='N',
+                        help=f'--nice 模式下每秒最多的系统调用数 (默认: {DEFAULT_MAX_IOPS})')
+    parser.add_argument('--force', action='store_true',
+                        help='忽略目录大小索引，重新扫描所有目录')
+    parser.add_argument('--no-index', action='store_true',
+                        help='不读取也不更新目录大小索引')
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    app = FileStorageAnalyzerApp()
-    app.run() 
\ No newline at end of file
+    args = parse_arguments()
+    throttle = IOThrottle(args.max_iops) if args.nice else None
+
+    if args.diff:
+        old_report, new_report = args.diff
+        try:
+            result = diff_size_reports(old_report, new_report, args.top or DEFAULT_TOP_N)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"错误: 无法对比快照: {e}")
+            sys.exit(1)
+        print_report_diff(old_report, new_report, *result)
+        sys.exit(0)
+
+    if args.types:
+        if not args.path:
+            print("错误: --types 需要指定要扫描的目录")
+            sys.exit(1)
+        stats = FileTypeStats()
+        try:
+            root = build_size_tree(args.path, workers=args.workers, stats=stats, throttle=throttle)
+        except OSError as e:
+            print(f"错误: 无法扫描 {args.path}: {e}")
+            sys.exit(1)
+        except KeyboardInterrupt:
+            sys.exit(130)
+        print_type_stats(args.path, root, stats, args.top or DEFAULT_TOP_N)
+        sys.exit(0)
+
+    if args.cold:
+        if not args.path:
+            print("错误: --cold 需要指定要扫描的目录")
+            sys.exit(1)
+        try:
+            root = build_size_tree(args.path, workers=args.workers, cold_days=COLD_AGE_DAYS, throttle=throttle)
+        except OSError as e:
+            print(f"错误: 无法扫描 {args.path}: {e}")
+            sys.exit(1)
+        except KeyboardInterrupt:
+            sys.exit(130)
+        print_cold_data(args.path, root, 1 if args.max_depth is None else args.max_depth, args.top or DEFAULT_TOP_N)
+        sys.exit(0)
+
+    if args.dupes:
+        if not args.path:
+            print("错误: --dupes 需要指定要扫描的目录")
+            sys.exit(1)
+        try:
+            duplicates, scanned, errors = find_duplicates(args.path, max(1, args.min_size),
+                                                          progress=lambda message: print(message, file=sys.stderr),
+                                                          throttle=throttle)
+        except OSError as e:
+            print(f"错误: 无法扫描 {args.path}: {e}")
+            sys.exit(1)
+        except KeyboardInterrupt:
+            sys.exit(130)
+        print_duplicates(args.path, duplicates, scanned, errors, args.top or DEFAULT_TOP_N)
+        sys.exit(0)
+
+    if args.top is not None:
+        if not args.path:
+            print("错误: --top 需要指定要扫描的目录")
+            sys.exit(1)
+        if args.top <= 0:
+            print("错误: N 必须大于0")
+            sys.exit(1)
+        try:
+            top_files, top_dirs, total, total_alloc, errors = find_largest(args.path, args.top, throttle=throttle)
+        except OSError as e:
+            print(f"错误: 无法扫描 {args.path}: {e}")
+            sys.exit(1)
+        except KeyboardInterrupt:
+            sys.exit(130)
+        print_largest(args.path, top_files, top_dirs, total, total_alloc, errors)
+        sys.exit(0)
+
+    if args.cli:
+        if not args.path:
+            print("错误: --cli 需要指定要扫描的目录", file=sys.stderr)
+            sys.exit(1)
+        index = None if args.no_index else DirSizeIndex()
+        try:
+            root = build_size_tree(args.path, index, args.force, workers=args.workers, throttle=throttle)
+        except OSError as e:
+            print(f"错误: 无法扫描 {args.path}: {e}", file=sys.stderr)
+            sys.exit(1)
+        except KeyboardInterrupt:
+            sys.exit(130)
+        if index is not None:
+            index.save()
+        try:
+            # 非 UTF-8 路径按原始字节写出，与 --diff 读取报告的方式一致
+            if args.output:
+                with open(args.output, 'w', encoding='utf-8', errors='surrogateescape', newline='') as out:
+                    write_size_report(root, out, args.format, args.max_depth)
+            else:
+                sys.stdout.reconfigure(errors='surrogateescape')
+                write_size_report(root, sys.stdout, args.format, args.max_depth)
+        except (OSError, ValueError) as e:
+            print(f"错误: 写入报告失败: {e}", file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0)
+
+    # 如果没有指定命令行模式且textual可用，则启动图形界面
+    if HAS_TEXTUAL:
+        app = load_tui_app()(args.path, throttle)
+        app.run()
+    else:
+        print("错误: 未安装textual库且未提供有效的命令行参数。请使用 -h 查看帮助。")
+        sys.exit(1)
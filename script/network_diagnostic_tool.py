@@ -3,9 +3,23 @@ import os
 import subprocess
 import sys
 import argparse
+import asyncio
+import csv
+import errno
+import json
+import math
+import random
 import re
+import select
+import signal
+import socket
+import struct
+import tempfile
+import threading
+import time
 import ipaddress # For IP address manipulation and gateway inference
 import logging
+from array import array
 
 # --- 日志配置 ---
 LOG_FILENAME = 'network_diag_tool.log'
@@ -34,10 +48,9 @@ TEXTUAL_AVAILABLE = False
 try:
     from textual.app import App, ComposeResult
     from textual.containers import Container, VerticalScroll, Horizontal
-    from textual.widgets import Header, Footer, Static, Button, Label, Select, Markdown, Input # 添加 Input
+    from textual.widgets import Header, Footer, Static, Button, Label, Select, Markdown, Input, Sparkline # 添加 Input
     from textual.screen import ModalScreen
     from textual.reactive import reactive
-    import asyncio
     from textual.events import Key # 导入 Key 事件
     TEXTUAL_AVAILABLE = True
 except ImportError:
@@ -58,6 +71,53 @@ WHITE = "\033[37m"
 # --- 推荐的 DNS 服务器 ---
 PRIMARY_DNS = "223.5.5.5"
 SECONDARY_DNS = "223.6.6.6"
+# systemd-resolved 记录其实际上游 DNS 服务器的文件 (/etc/resolv.conf 中通常只有存根 127.0.0.53)
+SYSTEMD_RESOLVED_UPSTREAM_CONF = '/run/systemd/resolve/resolv.conf'
+# DNS 解析延迟基准默认查询的域名 (可用 --dns-domains 覆盖)
+DNS_BENCHMARK_DOMAINS = ("www.baidu.com", "www.qq.com", "www.taobao.com", "www.163.com")
+# --monitor 模式默认探测的上游主机与每个目标保留的采样数 (1 秒间隔时约 1 天)
+MONITOR_UPSTREAM_HOSTS = ("www.baidu.com", PRIMARY_DNS)
+MONITOR_HISTORY = 86400
+# --monitor 启动时等待主机名解析的最长时间 (秒)，以及后台重新解析的间隔 (秒)
+MONITOR_RESOLVE_TIMEOUT = 2.0
+MONITOR_RESOLVE_INTERVAL = 300
+# 吞吐量测试 (--serve / --connect) 的默认端口、缓冲区大小与报文格式
+THROUGHPUT_PORT = 5201
+THROUGHPUT_CHUNK = 1 << 20 # TCP 每次 sendfile / recv_into 的字节数
+THROUGHPUT_SOCKET_BUFFER = 4 << 20
+THROUGHPUT_UDP_PAYLOAD = 1400 # 不超过常见 MTU，避免 IP 分片
+THROUGHPUT_UDP_BATCH = 64 # 每检查一次限速与截止时间发送的数据报数
+THROUGHPUT_IDLE_TIMEOUT = 10.0 # 服务端 TCP 连接无数据多少秒后断开
+THROUGHPUT_UDP_FLOW_TIMEOUT = 5.0 # 服务端 UDP 流多少秒未收到数据报即视为客户端已消失
+THROUGHPUT_TCP_MAGIC = b'NDTP'
+THROUGHPUT_UDP_MAGIC = b'NDTU'
+THROUGHPUT_UDP_FIN = b'NDTF'
+THROUGHPUT_UDP_REPORT = b'NDTR'
+
+# --- 直接读取内核网络状态所用的常量 (linux/netlink.h, linux/rtnetlink.h, linux/if.h 等) ---
+SYS_CLASS_NET = '/sys/class/net'
+NETLINK_ROUTE = 0
+NLMSG_HDRLEN = 16
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+RTM_NEWADDR = 20
+RTM_GETADDR = 22
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFF_UP = 0x1
+ARPHRD_ETHER = 1
+RTF_GATEWAY = 0x2
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+ETH_P_ARP = 0x0806
+ARP_REQUEST = 1
+ARP_REPLY = 2
+DNS_TYPE_A = 1
+DNS_TYPE_AAAA = 28
+DNS_RCODE_NOERROR = 0
+DNS_RCODE_NXDOMAIN = 3
 
 # --- Helper Functions ---
 def run_command(command, shell=False, text=True):
@@ -85,12 +145,205 @@ def run_command(command, shell=False, text=True):
         logging.error(f"命令未找到: {command[0] if isinstance(command, list) else command.split()[0]}")
         return "", f"命令未找到: {command[0] if isinstance(command, list) else command.split()[0]}", 127
 
+async def run_command_async(command):
+    """
+    run_command 的异步版本 (通过 asyncio 子进程执行，command 必须是列表)。
+    返回值与 run_command 相同；如果任务被取消，会先终止子进程再抛出 CancelledError。
+    """
+    logging.debug(f"异步执行命令: {' '.join(command)}")
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *command, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+    except FileNotFoundError:
+        logging.error(f"命令未找到: {command[0]}")
+        return "", f"命令未找到: {command[0]}", 127
+    try:
+        stdout_bytes, stderr_bytes = await process.communicate()
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        logging.debug(f"命令 '{command[0]}' 已取消并终止")
+        raise
+    stdout = stdout_bytes.decode(errors='replace').strip()
+    stderr = stderr_bytes.decode(errors='replace').strip()
+    if process.returncode != 0:
+        logging.error(f"命令 '{command[0]}' 执行失败. Code: {process.returncode}")
+        logging.error(f"  Stderr: {stderr}")
+    else:
+        logging.debug(f"命令 '{command[0]}' stdout: {stdout}")
+    return stdout, stderr, process.returncode
+
+class SessionCache:
+    """
+    诊断会话范围内的缓存，避免在 TUI 中反复点击按钮时重复启动相同的进程:
+    - 命令是否存在: 整个会话有效 (修复命令不会安装或卸载工具)；
+    - NetworkManager 活动连接 (接口 -> 连接名、ipv4.method) 与接口详情:
+      在执行修复命令后通过 invalidate() 清除，下次使用时重新获取。
+    获取失败 (例如 NetworkManager 重启期间 nmcli 调用失败) 的结果不缓存，下次使用时重试。
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.commands = {}
+        self.state = {}
+
+    def command_exists(self, command_name, probe):
+        with self.lock:
+            if command_name in self.commands:
+                return self.commands[command_name]
+        exists = probe(command_name)
+        with self.lock:
+            return self.commands.setdefault(command_name, exists)
+
+    def get(self, key, compute):
+        """返回 key 对应的缓存值，不存在时调用 compute() 计算；compute() 返回 None 表示获取失败，不缓存。"""
+        with self.lock:
+            if key in self.state:
+                return self.state[key]
+        value = compute()
+        if value is None:
+            return None
+        with self.lock:
+            return self.state.setdefault(key, value)
+
+    def invalidate(self):
+        with self.lock:
+            self.state.clear()
+        logging.info("已执行修复命令，清除 NetworkManager 与接口详情缓存")
+
+SESSION_CACHE = SessionCache()
+
 def get_network_interfaces_details():
     """
     获取网络接口的详细信息 (名称, IP/掩码, MAC, 网关, 类型)。
     返回一个字典: {接口名称: {详情}}
+    优先直接读取内核状态 (/sys/class/net、rtnetlink 与 /proc/net/route)，
+    不可用时回退到解析 'ip addr' / 'ip route' 的输出。接口信息与 NetworkManager 活动连接分别在会话内缓存
+    (见 SessionCache)，配置模式每次由两者重新推断，nmcli 暂时失败不会让 '未知' 模式一直留在缓存中。
     """
+    interfaces = SESSION_CACHE.get('interfaces', _discover_interfaces)
+    if interfaces is None:
+        return {}
+    interfaces = {name: dict(details) for name, details in interfaces.items()} # 返回副本，调用方可以随意修改
+    _resolve_config_modes(interfaces)
+    return interfaces
+
+def _discover_interfaces():
+    """读取接口信息并填写网关 (不含配置模式)，'ip addr' 回退也失败时返回 None。"""
     logging.debug("开始获取网络接口详情")
+    try:
+        interfaces, routes = _read_interfaces_native()
+    except OSError as e:
+        logging.info(f"无法直接读取内核网络状态 ({e})，回退到解析 ip 命令输出")
+        interfaces, routes = _parse_ip_command_interfaces()
+        if interfaces is None:
+            return None
+
+    _apply_default_gateways(interfaces, routes)
+
+    valid_interfaces = {k: v for k, v in interfaces.items() if k != 'lo'}
+    logging.debug(f"获取到的接口详情: {valid_interfaces}")
+    logging.debug("完成获取网络接口详情")
+    return valid_interfaces
+
+def _read_interfaces_native():
+    """
+    通过 /sys/class/net、rtnetlink (RTM_GETADDR) 与 /proc/net/route 读取接口信息，
+    不需要启动任何子进程。返回值与 _parse_ip_command_interfaces 相同，读取失败时抛出 OSError。
+    """
+    links = []
+    for name in os.listdir(SYS_CLASS_NET):
+        if name == 'lo':
+            continue
+        base = os.path.join(SYS_CLASS_NET, name)
+        try:
+            with open(os.path.join(base, 'ifindex')) as f:
+                ifindex = int(f.read())
+            with open(os.path.join(base, 'flags')) as f:
+                flags = int(f.read(), 16)
+            with open(os.path.join(base, 'type')) as f:
+                link_type = int(f.read())
+            with open(os.path.join(base, 'address')) as f:
+                mac = f.read().strip()
+        except (OSError, ValueError) as e: # 接口可能在读取过程中消失
+            logging.debug(f"读取 {base} 失败，跳过: {e}")
+            continue
+        links.append((ifindex, name, flags, link_type, mac))
+    links.sort() # 与 'ip addr' 一样按 ifindex 排序
+
+    addresses = _netlink_ipv4_addresses()
+    interfaces = {}
+    for ifindex, name, flags, link_type, mac in links:
+        interfaces[name] = {
+            'name': name,
+            'ips': addresses.get(ifindex, []),
+            # 与 'ip addr' 的 link/ether 一致，只记录以太网类型接口的 MAC
+            'mac': mac if link_type == ARPHRD_ETHER else None,
+            'gateway': None,
+            'state': 'UP' if flags & IFF_UP else 'DOWN',
+        }
+    return interfaces, _read_proc_default_routes()
+
+def _netlink_ipv4_addresses():
+    """通过 rtnetlink 一次性导出全部 IPv4 地址，返回 {ifindex: ['IP/前缀', ...]}。"""
+    addresses = {}
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE) as sock:
+        sock.bind((0, 0))
+        request = struct.pack('=IHHII', NLMSG_HDRLEN + 8, RTM_GETADDR, NLM_F_REQUEST | NLM_F_DUMP, 1, 0)
+        request += struct.pack('=BBBBI', socket.AF_INET, 0, 0, 0, 0) # struct ifaddrmsg
+        sock.send(request)
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                raise OSError("rtnetlink 连接意外关闭")
+            offset = 0
+            while offset + NLMSG_HDRLEN <= len(data):
+                msg_len, msg_type, _, _, _ = struct.unpack_from('=IHHII', data, offset)
+                if msg_len < NLMSG_HDRLEN:
+                    raise OSError("rtnetlink 返回了无效的消息长度")
+                if msg_type == NLMSG_DONE:
+                    return addresses
+                if msg_type == NLMSG_ERROR:
+                    error, = struct.unpack_from('=i', data, offset + NLMSG_HDRLEN)
+                    raise OSError(-error, "rtnetlink RTM_GETADDR 请求失败")
+                if msg_type == RTM_NEWADDR:
+                    _, prefix_len, _, _, ifindex = struct.unpack_from('=BBBBI', data, offset + NLMSG_HDRLEN)
+                    attrs = {}
+                    pos = offset + NLMSG_HDRLEN + 8
+                    end = offset + msg_len
+                    while pos + 4 <= end:
+                        rta_len, rta_type = struct.unpack_from('=HH', data, pos)
+                        if rta_len < 4:
+                            break
+                        attrs[rta_type] = data[pos + 4:pos + rta_len]
+                        pos += (rta_len + 3) & ~3
+                    # 点对点接口的 IFA_ADDRESS 是对端地址，本机地址在 IFA_LOCAL 中
+                    raw = attrs.get(IFA_LOCAL) or attrs.get(IFA_ADDRESS)
+                    if raw and len(raw) == 4:
+                        addresses.setdefault(ifindex, []).append(f"{socket.inet_ntoa(raw)}/{prefix_len}")
+                offset += (msg_len + 3) & ~3
+
+def _read_proc_default_routes():
+    """从 /proc/net/route 读取 IPv4 默认路由，返回 [(网关, 接口名)]。"""
+    routes = []
+    with open('/proc/net/route') as f:
+        next(f, None) # 表头
+        for line in f:
+            fields = line.split()
+            if len(fields) < 8:
+                continue
+            iface, destination, gateway, flags, mask = fields[0], fields[1], fields[2], int(fields[3], 16), fields[7]
+            if destination == '00000000' and mask == '00000000' and flags & RTF_GATEWAY:
+                # /proc/net/route 中的地址是按主机字节序打印的网络序整数
+                routes.append((socket.inet_ntoa(struct.pack('=I', int(gateway, 16))), iface))
+    return routes
+
+def _parse_ip_command_interfaces():
+    """
+    回退方案: 解析 'ip addr' 与 'ip route show default' 的输出。
+    返回 (接口字典, 默认路由列表 [(网关, 接口名)])；'ip addr' 执行失败时接口字典为 None。
+    """
     interfaces = {}
     
     # 使用 'ip addr' 获取 IP 地址、MAC 地址和接口状态
@@ -98,155 +351,138 @@ def get_network_interfaces_details():
     if code != 0:
         logging.error(f"执行 'ip addr' 失败: {stderr}")
         print(f"{RED}获取 IP 地址信息出错: {stderr}{RESET}") # 中文错误信息
-        return interfaces
-    logging.debug(f"'ip addr' 输出:\n{stdout}")
+        return None, []
 
-    current_iface_name = None # 使用一个更清晰的变量名
-    for line_num, line in enumerate(stdout.splitlines()):
+    current_iface_name = None
+    for line in stdout.splitlines():
         stripped_line = line.strip()
-        logging.debug(f"处理行 {line_num + 1} [current_iface: {current_iface_name}]: {stripped_line}")
-
-        # --- BEGIN DEBUG BLOCK ---
-        if line_num == 0: # 只对第一行执行一次硬编码测试，避免日志过多
-            test_string = "1: lo: <LOOPBACK,UP,LOWER_UP> mtu 65536 qdisc noqueue"
-            # 使用与下面相同的正则表达式进行测试
-            regex_to_test = r'^\d+:\s+(\S+):\s+<([^>]*)>.*'
-            test_match = re.match(regex_to_test, test_string)
-            if test_match:
-                logging.debug(f"  硬编码测试字符串匹配成功: groups={test_match.groups()} using regex: {regex_to_test}")
-            else:
-                logging.debug(f"  硬编码测试字符串 '{test_string}' 匹配失败 using regex: {regex_to_test}")
-        
-        logging.debug(f"  尝试匹配实际行 (类型: {type(stripped_line)}, 内容 repr: {repr(stripped_line)}) using regex: r'^\d+:\s+(\S+):\s+<([^>]*)>.*'")
-        # --- END DEBUG BLOCK ---
-
-        # 尝试匹配接口定义行 (e.g., "1: lo: <...>")
-        # 使用更具弹性的空格匹配 (\s+) 代替固定的单个空格
-        match_interface_def = re.match(r'^\d+:\s+(\S+):\s+<([^>]*)>.*', stripped_line)
-
+        # 接口定义行 (e.g., "1: lo: <LOOPBACK,UP,LOWER_UP> ...")
+        match_interface_def = re.match(r'^\d+:\s+(\S+):\s+<([^>]*)>', stripped_line)
         if match_interface_def:
-            iface_name = match_interface_def.group(1)
-            iface_attrs = match_interface_def.group(2)
-            logging.debug(f"  匹配到接口定义: {iface_name}, 属性: {iface_attrs}")
-            
-            current_iface_name = iface_name # 立即设置当前接口上下文
-
+            current_iface_name, iface_attrs = match_interface_def.groups()
             if current_iface_name == 'lo':
-                logging.debug(f"    跳过环回接口 {current_iface_name}, 重置上下文为 None")
-                current_iface_name = None # 对于'lo'后续不处理其IP/MAC
-                continue # 跳过lo接口的 further processing in this loop iteration for other properties
-            
-            # 为新接口（非lo）初始化条目
+                current_iface_name = None # 环回接口的 IP/MAC 不处理
+                continue
             interfaces[current_iface_name] = {
                 'name': current_iface_name,
                 'ips': [],
                 'mac': None,
                 'gateway': None, # 网关稍后从 'ip route' 获取
-                'state': 'DOWN'
+                'state': 'UP' if 'UP' in iface_attrs.split(',') else 'DOWN'
             }
-            if 'UP' in iface_attrs.split(','):
-                interfaces[current_iface_name]['state'] = 'UP'
-                logging.debug(f"    接口 {current_iface_name} 状态设置为 UP")
-            else:
-                logging.debug(f"    接口 {current_iface_name} 状态为 DOWN 或未明确为 UP")
-        
-        elif current_iface_name: # 只有在当前有活动接口上下文时才尝试解析IP/MAC
-            # 尝试匹配 MAC 地址 (link/ether)
-            match_mac = re.search(r'link/ether (([0-9a-fA-F]{2}:){5}[0-9a-fA-F]{2})', stripped_line)
-            if match_mac:
+        elif current_iface_name: # 只有在当前有接口上下文时才解析 IP/MAC
+            if match_mac := re.search(r'link/ether (([0-9a-fA-F]{2}:){5}[0-9a-fA-F]{2})', stripped_line):
                 interfaces[current_iface_name]['mac'] = match_mac.group(1)
-                logging.debug(f"    为接口 {current_iface_name} 设置 MAC: {match_mac.group(1)}")
-            else:
-                # 尝试匹配 IP 地址 (inet)
-                match_ip = re.search(r'inet (\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}/\d{1,2})', stripped_line)
-                if match_ip:
-                    interfaces[current_iface_name]['ips'].append(match_ip.group(1))
-                    logging.debug(f"    为接口 {current_iface_name} 添加 IP: {match_ip.group(1)}")
-                else:
-                    # 既不是接口定义，也不是MAC，也不是IP，但有上下文
-                    logging.debug(f"    接口 {current_iface_name} 的其他信息行: {stripped_line}")
-        else:
-            # 没有当前接口上下文，也不是新的接口定义行
-            logging.debug(f"    当前无活动接口 ({current_iface_name})，也不是新接口定义，跳过行: {stripped_line}")
-
+            elif match_ip := re.search(r'inet (\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}/\d{1,2})', stripped_line):
+                interfaces[current_iface_name]['ips'].append(match_ip.group(1))
 
+    routes = []
     # 使用 'ip route show default' 获取默认网关信息
     stdout_route, stderr_route, code_route = run_command(['ip', 'route', 'show', 'default'])
     if code_route == 0 and stdout_route:
-        logging.debug(f"'ip route show default' 输出:\n{stdout_route}")
         for line in stdout_route.splitlines():
             if match := re.search(r'default via (\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}) dev (\S+)', line):
-                gw_ip = match.group(1)
-                gw_dev = match.group(2)
-                if gw_dev in interfaces:
-                    interfaces[gw_dev]['gateway'] = gw_ip
-                    # 对于同一子网上的其他接口，如果未明确设置，这可能也是它们的网关
-                    # 这是一个简化处理；可能存在复杂的路由。
-                    try:
-                        gw_network = ipaddress.ip_interface(f"{interfaces[gw_dev]['ips'][0]}").network if interfaces[gw_dev]['ips'] else None
-                        for if_name, if_data in interfaces.items():
-                            if if_name != gw_dev and not if_data['gateway'] and if_data['ips']:
-                                if_ip_obj = ipaddress.ip_interface(if_data['ips'][0])
-                                if gw_network and if_ip_obj.network == gw_network:
-                                     interfaces[if_name]['gateway'] = gw_ip # 如果在同一子网则分配
-                    except Exception as e: # 捕获 ipaddress 可能产生的广泛错误
-                        logging.warning(f"在为接口 {if_name} 推断网关时发生错误: {e}")
-                        pass
+                routes.append((match.group(1), match.group(2)))
     elif code_route != 0:
         logging.warning(f"执行 'ip route show default' 失败: {stderr_route}")
-
-
-    # 尝试确定配置模式 (DHCP/静态) - 这是一个基本检查
+    return interfaces, routes
+
+def _apply_default_gateways(interfaces, routes):
+    """根据默认路由 [(网关, 接口名)] 为接口填写网关，并为同一子网的其他接口推断网关。"""
+    for gw_ip, gw_dev in routes:
+        if gw_dev in interfaces:
+            interfaces[gw_dev]['gateway'] = gw_ip
+            # 对于同一子网上的其他接口，如果未明确设置，这可能也是它们的网关
+            # 这是一个简化处理；可能存在复杂的路由。
+            try:
+                gw_network = ipaddress.ip_interface(f"{interfaces[gw_dev]['ips'][0]}").network if interfaces[gw_dev]['ips'] else None
+                for if_name, if_data in interfaces.items():
+                    if if_name != gw_dev and not if_data['gateway'] and if_data['ips']:
+                        if_ip_obj = ipaddress.ip_interface(if_data['ips'][0])
+                        if gw_network and if_ip_obj.network == gw_network:
+                             interfaces[if_name]['gateway'] = gw_ip # 如果在同一子网则分配
+            except Exception as e: # 捕获 ipaddress 可能产生的广泛错误
+                logging.warning(f"在为接口 {if_name} 推断网关时发生错误: {e}")
+                pass
+
+def _nmcli_active_connections():
+    """会话内缓存的 _query_nmcli_active_connections 结果。"""
+    return SESSION_CACHE.get('nm_connections', _query_nmcli_active_connections)
+
+def get_nm_connection_name(interface_name):
+    """返回接口当前的 NetworkManager 活动连接名，没有活动连接或 nmcli 不可用时返回 None。"""
+    connections = _nmcli_active_connections()
+    conn_name = connections.get(interface_name, (None, ''))[0] if connections else None
+    if not conn_name:
+        logging.warning(f"无法确定接口 {interface_name} 的 NetworkManager 连接配置文件名称。活动连接: {connections}")
+    return conn_name or None
+
+def _query_nmcli_active_connections():
+    """
+    获取所有活动连接，返回 {设备: (连接名, ipv4.method)}。
+    无论接口数量多少，都只调用两次 nmcli (活动连接列表 + 一次性批量查询所有连接的 ipv4.method)。
+    nmcli 不可用或调用失败时返回 None。
+    """
+    if not check_command_exists("nmcli"):
+        logging.info("nmcli 命令不存在，跳过 NetworkManager 的配置模式检查。")
+        return None
+    stdout, _, code = run_command(['nmcli', '-t', '-f', 'UUID,DEVICE', 'connection', 'show', '--active'])
+    if code != 0:
+        logging.warning("'nmcli connection show --active' 执行失败。")
+        return None
+    devices_by_uuid = {}
+    for line in stdout.splitlines():
+        uuid, sep, device = line.partition(':')
+        if sep and device:
+            devices_by_uuid[uuid] = device.replace('\\:', ':')
+    if not devices_by_uuid:
+        return {}
+
+    stdout, _, code = run_command([
+        'nmcli', '-t', '-f', 'connection.uuid,connection.id,ipv4.method', 'connection', 'show'
+    ] + list(devices_by_uuid))
+    if code != 0:
+        logging.warning("批量查询 NetworkManager 连接配置失败。")
+        return None
+    connections = {}
+    for profile in _parse_nmcli_profiles(stdout):
+        device = devices_by_uuid.get(profile.get('connection.uuid'))
+        if device:
+            connections[device] = (profile.get('connection.id', ''), profile.get('ipv4.method', '').lower())
+    logging.debug(f"NetworkManager 活动连接: {connections}")
+    return connections
+
+def _parse_nmcli_profiles(stdout):
+    """解析 'nmcli -t connection show <id>...' 的输出，每遇到 connection.uuid 开始一个新的连接。"""
+    profiles = []
+    for line in stdout.splitlines():
+        key, sep, value = line.partition(':')
+        if not sep:
+            continue
+        if key == 'connection.uuid':
+            profiles.append({})
+        if profiles:
+            profiles[-1][key] = value.replace('\\:', ':')
+    return profiles
+
+def _resolve_config_modes(interfaces):
+    """尝试确定每个接口的配置模式 (DHCP/静态) - 这是一个基本检查。"""
+    connections = _nmcli_active_connections()
     for if_name, data in interfaces.items():
         data['config_mode'] = '未知' # 默认
-        logging.debug(f"尝试为接口 {if_name} 获取配置模式")
-
-        if check_command_exists("nmcli"):
-            conn_name_stdout, _, conn_name_code = run_command([
-                'nmcli', '-g', 'GENERAL.CONNECTION', 'device', 'show', if_name
-            ])
-            
-            resolved_method_from_conn = False
-            if conn_name_code == 0 and conn_name_stdout and conn_name_stdout.strip():
-                conn_name = conn_name_stdout.strip()
-                logging.debug(f"接口 {if_name} 的活动连接配置文件为: {conn_name}")
-                conn_show_stdout, _, conn_show_code = run_command([
-                    'nmcli', '-t', 'connection', 'show', conn_name
-                ])
-                if conn_show_code == 0 and conn_show_stdout:
-                    logging.debug(f"'nmcli connection show {conn_name}' 输出:\n{conn_show_stdout}")
-                    method_line = next((line for line in conn_show_stdout.splitlines() if 'ipv4.method:' in line.lower()), None)
-                    if method_line:
-                        method = method_line.split(':')[1].lower()
-                        logging.debug(f"  接口 {if_name} (连接 {conn_name}) 的 ipv4.method 为: {method}")
-                        if 'auto' in method:
-                            data['config_mode'] = 'DHCP'
-                        elif 'manual' in method:
-                            data['config_mode'] = '静态'
-                        elif 'disabled' in method:
-                            data['config_mode'] = '已禁用'
-                        # else: config_mode 保持未知
-                        logging.debug(f"  接口 {if_name} 配置模式根据连接配置文件设置为: {data['config_mode']}")
-                        resolved_method_from_conn = True 
-                    else:
-                        logging.debug(f"  在连接配置文件 {conn_name} 中未找到 ipv4.method")
-                else:
-                    logging.warning(f"'nmcli connection show {conn_name}' 执行失败或无输出。")
-            else:
+        if connections is not None:
+            conn_name, method = connections.get(if_name, (None, ''))
+            if conn_name is None:
                 logging.debug(f"接口 {if_name} 未找到活动的 NetworkManager 连接配置文件。")
-
-            # 如果通过 connection show 未能解析出方法，再尝试旧的 dev show (作为回退，尽管它在当前环境报错)
-            # 或者直接跳过，依赖后续的ip addr判断
-            # 当前，如果 resolved_method_from_conn 为 False，我们会让后续逻辑处理
-            if not resolved_method_from_conn:
-                logging.debug(f"未能从连接配置文件确定 {if_name} 的配置模式，尝试其他方法或回退。")
-                # 旧的 nmcli dev show 逻辑，它在您的系统上会失败，但为了完整性可以保留或注释掉
-                # logging.debug(f"尝试使用 'nmcli dev show {if_name}' 获取 IP4.METHOD (已知在某些环境会失败)")
-                # nm_dev_stdout, nm_dev_stderr, nm_dev_code = run_command(['nmcli', '-t', '-f', 'IP4.METHOD', 'dev', 'show', if_name])
-                # if nm_dev_code == 0 and nm_dev_stdout: ... (旧逻辑)
-                # else: logging.warning(...) 
-        else:
-            logging.info("nmcli 命令不存在，跳过 NetworkManager 的配置模式检查。")
+            else:
+                logging.debug(f"接口 {if_name} (连接 {conn_name}) 的 ipv4.method 为: {method or 'N/A'}")
+                if 'auto' in method:
+                    data['config_mode'] = 'DHCP'
+                elif 'manual' in method:
+                    data['config_mode'] = '静态'
+                elif 'disabled' in method:
+                    data['config_mode'] = '已禁用'
+                # else: config_mode 保持未知
 
         # 基于 IP 地址的回退逻辑 (如果 config_mode 仍然是 '未知')
         if data['config_mode'] == '未知':
@@ -261,11 +497,6 @@ def get_network_interfaces_details():
                 data['config_mode'] = 'DHCP (回退假设)'
         logging.info(f"接口 {if_name} 最终确定的配置模式: {data['config_mode']}")
 
-    valid_interfaces = {k: v for k, v in interfaces.items() if k != 'lo'}
-    logging.debug(f"获取到的接口详情: {valid_interfaces}")
-    logging.debug("完成获取网络接口详情")
-    return valid_interfaces
-
 
 def get_dns_servers():
     """获取当前 DNS 服务器。"""
@@ -302,13 +533,276 @@ def get_dns_servers():
         logging.warning("无法找到 /etc/resolv.conf 文件")
         return []
 
+def is_loopback_dns(server):
+    """本机回环地址上的 DNS (systemd-resolved 的 127.0.0.53、dnsmasq 的 127.0.0.1 等) 只是本地转发存根。"""
+    try:
+        return ipaddress.ip_address(server).is_loopback
+    except ValueError:
+        return False
+
+def get_upstream_dns_servers(servers=None):
+    """
+    返回可以写入连接配置的 DNS 服务器: 去掉本机回环上的存根解析器 (写入连接后会导致解析失败)，
+    当前 DNS 中有存根时，从 systemd-resolved 的上游配置中补充它实际转发到的服务器。
+    servers 默认为 get_dns_servers() 的结果。
+    """
+    if servers is None:
+        servers = get_dns_servers()
+    upstream = [server for server in servers if not is_loopback_dns(server)]
+    if len(upstream) < len(servers):
+        try:
+            with open(SYSTEMD_RESOLVED_UPSTREAM_CONF, 'r') as f:
+                resolved = re.findall(r'^nameserver\s+(\S+)', f.read(), re.MULTILINE)
+            upstream += [server for server in resolved if not is_loopback_dns(server)]
+        except OSError:
+            logging.debug(f"无法读取 {SYSTEMD_RESOLVED_UPSTREAM_CONF}，本地存根 DNS 的上游未知")
+    return list(dict.fromkeys(upstream))
+
+def icmp_ping_many(hosts, count=3, timeout=1.0, interval=0.2):
+    """
+    进程内 ICMP echo 引擎: 用一个 socket 同时向所有目标发送 count 轮 echo 请求，
+    RTT 使用 time.perf_counter_ns 测量。优先使用无特权的 ICMP 数据报 socket
+    (受 net.ipv4.ping_group_range 限制)，其次是 root 下的原始 socket。
+    返回 {主机: {'sent', 'received', 'loss', 'min', 'avg', 'max', 'jitter'}} (时间单位 ms)，
+    如果两种 socket 都无法创建则返回 None，由调用方回退到 ping 命令。
+    """
+    sock = None
+    for sock_type in (socket.SOCK_DGRAM, socket.SOCK_RAW):
+        try:
+            sock = socket.socket(socket.AF_INET, sock_type, socket.IPPROTO_ICMP)
+            break
+        except OSError as e:
+            logging.debug(f"无法创建 ICMP socket (type={sock_type}): {e}")
+    if sock is None:
+        return None
+
+    raw = sock.type == socket.SOCK_RAW
+    # 数据报 socket 的 identifier 由内核改写为本地端口，并只把属于自己的回复交给该 socket
+    ident = os.getpid() & 0xFFFF
+    targets = {} # IP -> [主机名...]
+    rtts = {host: [] for host in hosts}
+    for host in hosts:
+        try:
+            addr = socket.getaddrinfo(host, None, socket.AF_INET)[0][4][0]
+        except (socket.gaierror, UnicodeError) as e:
+            logging.warning(f"无法解析主机 {host}: {e}")
+            continue
+        targets.setdefault(addr, []).append(host)
+
+    sent_at = {} # (IP, seq) -> 发送时间 (ns)
+    with sock:
+        sock.setblocking(False)
+        deadline = time.perf_counter() + timeout
+        next_round = time.perf_counter()
+        seq = 0
+        while targets:
+            now = time.perf_counter()
+            if seq < count and now >= next_round:
+                packet = _icmp_echo_packet(ident, seq)
+                for addr in targets:
+                    try:
+                        sock.sendto(packet, (addr, 0))
+                        sent_at[(addr, seq)] = time.perf_counter_ns()
+                    except OSError as e:
+                        logging.debug(f"向 {addr} 发送 ICMP echo 失败: {e}")
+                seq += 1
+                next_round = now + interval
+                deadline = now + timeout # 最后一轮发出后再等待一个超时窗口
+            if seq >= count and (now >= deadline or len(sent_at) == 0):
+                break
+            wait = (next_round if seq < count else deadline) - now
+            readable, _, _ = select.select([sock], [], [], max(wait, 0))
+            if not readable:
+                continue
+            while True:
+                try:
+                    data, (addr, _) = sock.recvfrom(2048)
+                except (BlockingIOError, InterruptedError):
+                    break
+                received_ns = time.perf_counter_ns()
+                if raw:
+                    data = data[(data[0] & 0x0F) * 4:] # 跳过 IP 头
+                if len(data) < 8:
+                    continue
+                icmp_type, _, _, reply_ident, reply_seq = struct.unpack('!BBHHH', data[:8])
+                if icmp_type != ICMP_ECHO_REPLY or (raw and reply_ident != ident):
+                    continue
+                start_ns = sent_at.pop((addr, reply_seq), None)
+                if start_ns is not None:
+                    for host in targets.get(addr, ()):
+                        rtts[host].append((received_ns - start_ns) / 1e6)
+
+    results = {}
+    for host, samples in rtts.items():
+        received = len(samples)
+        stats = {'sent': count, 'received': received, 'loss': 100.0 * (count - received) / count,
+                 'min': float('inf'), 'avg': float('inf'), 'max': float('inf'), 'jitter': float('inf')}
+        if samples:
+            stats['min'] = min(samples)
+            stats['avg'] = sum(samples) / received
+            stats['max'] = max(samples)
+            # 抖动: 相邻两次 RTT 之差的绝对值的平均值
+            diffs = [abs(b - a) for a, b in zip(samples, samples[1:])]
+            stats['jitter'] = sum(diffs) / len(diffs) if diffs else 0.0
+        logging.debug(f"ICMP 探测 {host}: {stats}")
+        results[host] = stats
+    return results
+
+def _icmp_echo_packet(ident, seq):
+    """构造一个 ICMP echo 请求报文 (带校验和)。"""
+    payload = b'network_diagnostic_tool'
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    checksum = _inet_checksum(header + payload)
+    return struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, checksum, ident, seq) + payload
+
+def _inet_checksum(data):
+    """RFC 1071 互联网校验和。"""
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+def dns_query_benchmark(servers, domains=None, qtypes=(DNS_TYPE_A, DNS_TYPE_AAAA), timeout=1.0):
+    """
+    进程内 UDP DNS 查询基准: 向每个服务器同时发送 domains x qtypes 个查询 (手工构造报文，无外部依赖)，
+    用 time.perf_counter_ns 记录每个查询的解析耗时。
+    返回 {服务器: {'queries', 'answered', 'p50', 'p95', 'avg'}} (时间单位 ms，无应答时为 inf)。
+    NOERROR 与 NXDOMAIN 都算作有效应答，SERVFAIL/REFUSED 等视为失败。
+    """
+    domains = list(domains or DNS_BENCHMARK_DOMAINS)
+    sockets = {}
+    pending = {} # (服务器, 查询 ID) -> 发送时间 (ns)
+    samples = {server: [] for server in servers}
+    queries = {server: 0 for server in servers}
+    try:
+        for server in servers:
+            try:
+                family, _, _, _, sockaddr = socket.getaddrinfo(server, 53, type=socket.SOCK_DGRAM)[0]
+                sock = socket.socket(family, socket.SOCK_DGRAM)
+                sock.setblocking(False)
+                sock.connect(sockaddr) # 已连接的 UDP socket 只会收到该服务器的应答
+            except OSError as e:
+                logging.warning(f"无法创建到 DNS 服务器 {server} 的 socket: {e}")
+                continue
+            sockets[sock] = server
+            query_ids = iter(random.sample(range(0x10000), len(domains) * len(qtypes)))
+            for domain in domains:
+                for qtype in qtypes:
+                    qid = next(query_ids)
+                    queries[server] += 1
+                    try:
+                        sock.send(_build_dns_query(qid, domain, qtype))
+                        pending[(server, qid)] = time.perf_counter_ns()
+                    except OSError as e:
+                        logging.debug(f"向 DNS 服务器 {server} 发送查询失败: {e}")
+
+        deadline = time.perf_counter() + timeout
+        while pending and sockets:
+            wait = deadline - time.perf_counter()
+            if wait <= 0:
+                break
+            readable, _, _ = select.select(list(sockets), [], [], wait)
+            for sock in readable:
+                server = sockets[sock]
+                while True:
+                    try:
+                        data = sock.recv(4096)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    except OSError as e: # 例如 ICMP 端口不可达
+                        logging.debug(f"DNS 服务器 {server} 返回错误: {e}")
+                        break
+                    received_ns = time.perf_counter_ns()
+                    if len(data) < 12:
+                        continue
+                    qid, flags = struct.unpack('!HH', data[:4])
+                    start_ns = pending.pop((server, qid), None)
+                    if start_ns is None or not flags & 0x8000: # 不是对我们查询的应答
+                        continue
+                    if flags & 0x000F in (DNS_RCODE_NOERROR, DNS_RCODE_NXDOMAIN):
+                        samples[server].append((received_ns - start_ns) / 1e6)
+    finally:
+        for sock in sockets:
+            sock.close()
+
+    results = {}
+    for server in servers:
+        values = sorted(samples[server])
+        results[server] = {
+            'queries': queries[server],
+            'answered': len(values),
+            'p50': _percentile(values, 50),
+            'p95': _percentile(values, 95),
+            'avg': sum(values) / len(values) if values else float('inf'),
+        }
+        logging.debug(f"DNS 查询基准 {server}: {results[server]}")
+    return results
+
+def _build_dns_query(qid, domain, qtype):
+    """构造一个设置了 RD 标志的标准 DNS 查询报文。"""
+    header = struct.pack('!HHHHHH', qid, 0x0100, 1, 0, 0, 0)
+    qname = b''.join(
+        bytes([len(label)]) + label for label in domain.strip('.').encode('idna').split(b'.')
+    ) + b'\0'
+    return header + qname + struct.pack('!HH', qtype, 1) # QCLASS IN
+
+def _percentile(sorted_values, pct):
+    """最近秩法百分位数；空列表返回 inf。"""
+    if not sorted_values:
+        return float('inf')
+    rank = max(1, -(-len(sorted_values) * pct // 100)) # 向上取整
+    return sorted_values[int(rank) - 1]
+
+def rank_dns_servers(benchmark):
+    """按 (无应答, 失败率, p50, p95) 对基准结果排序，返回服务器列表。"""
+    def key(server):
+        stats = benchmark[server]
+        failure_rate = 1 - stats['answered'] / stats['queries'] if stats['queries'] else 1
+        return (stats['answered'] == 0, failure_rate, stats['p50'], stats['p95'])
+    return sorted(benchmark, key=key)
+
+def choose_dns_servers(domains=None, timeout=1.0):
+    """
+    对当前上游 DNS (见 get_upstream_dns_servers，不含本机存根) 与推荐 DNS (PRIMARY_DNS / SECONDARY_DNS)
+    做一次查询基准，返回实测最快的两个可用服务器。所有服务器都无应答时返回推荐 DNS。
+    """
+    candidates = list(dict.fromkeys(get_upstream_dns_servers() + [PRIMARY_DNS, SECONDARY_DNS]))
+    benchmark = dns_query_benchmark(candidates, domains, timeout=timeout)
+    chosen = [server for server in rank_dns_servers(benchmark) if benchmark[server]['answered']][:2]
+    logging.info(f"根据实测解析延迟选择的 DNS 服务器: {chosen}")
+    return chosen or [PRIMARY_DNS, SECONDARY_DNS]
+
+async def ping_hosts_async(hosts, count=3, timeout_ms=1000):
+    """
+    并发 ping 多个主机，返回 {主机: (成功, 平均延迟 ms, 丢包率 %)}。
+    优先使用 icmp_ping_many，一个超时窗口内完成所有主机；无法创建 ICMP socket 时回退为并发的 ping 子进程。
+    """
+    hosts = list(dict.fromkeys(hosts))
+    stats = await asyncio.to_thread(icmp_ping_many, hosts, count, timeout_ms / 1000)
+    if stats is not None:
+        return {host: (s['received'] > 0, s['avg'], s['loss']) for host, s in stats.items()}
+    pings = await asyncio.gather(*(_ping_subprocess_async(host, count) for host in hosts))
+    return dict(zip(hosts, pings))
+
 def ping_host(host, count=3, timeout_ms=1000):
     """Pings a host and returns success (bool), average latency (ms), and loss (%)."""
+    return asyncio.run(ping_hosts_async([host], count, timeout_ms))[host]
+
+async def ping_host_async(host, count=3):
+    """ping_host 的异步版本，便于多个 ping 并发执行。"""
+    return (await ping_hosts_async([host], count))[host]
+
+async def _ping_subprocess_async(host, count=3):
+    """回退方案: 通过 ping 命令探测；任务取消时会终止 ping 进程。"""
     # 注意: '-w' 用于设置总超时 (秒), '-W' 用于设置每次 ping 的超时 (秒)。
-    # 对于毫秒级超时，我们可能需要调整或使用更精确的 ping 命令。
     # 标准 ping 超时通常以秒为单位。我们将使用 -W 1 (1 秒)。
-    command = ['ping', '-c', str(count), '-W', '1', host]
-    stdout, stderr, code = run_command(command)
+    stdout, stderr, code = await run_command_async(['ping', '-c', str(count), '-W', '1', host])
+    return _parse_ping_output(host, stdout, stderr, code)
+
+def _parse_ping_output(host, stdout, stderr, code):
+    """解析 ping 的输出，返回 (成功, 平均延迟 ms, 丢包率 %)。"""
     logging.debug(f"Ping stdout for {host}:\n{stdout}") # 记录完整的 ping 输出
     logging.debug(f"Ping stderr for {host}:\n{stderr}")
     logging.debug(f"Ping return code for {host}: {code}")
@@ -352,8 +846,17 @@ def ping_host(host, count=3, timeout_ms=1000):
 def curl_check(url="http://www.baidu.com"):
     """使用 curl 检查互联网连接性。"""
     # -s 静默模式, -S 显示错误, -L 跟随重定向, -I 仅请求头部, -m 超时
-    command = ['curl', '-sSLI', '-m', '5', url] 
+    command = ['curl', '-sSLI', '-m', '5', url]
     stdout, stderr, code = run_command(command)
+    return _parse_curl_output(url, stdout, stderr, code)
+
+async def curl_check_async(url="http://www.baidu.com"):
+    """curl_check 的异步版本；任务取消时会终止 curl 进程。"""
+    stdout, stderr, code = await run_command_async(['curl', '-sSLI', '-m', '5', url])
+    return _parse_curl_output(url, stdout, stderr, code)
+
+def _parse_curl_output(url, stdout, stderr, code):
+    """根据 curl 的输出判断连接是否成功，返回 (成功, 描述信息)。"""
     if code == 0 and "HTTP/" in stdout: # 检查是否有任何 HTTP 响应
         # 进一步检查 2xx 或 3xx 状态码
         if re.search(r"HTTP/\d(\.\d)? (2\d\d|3\d\d)", stdout):
@@ -364,7 +867,10 @@ def curl_check(url="http://www.baidu.com"):
     return False, f"使用 curl 连接到 {url} 失败。代码: {code}, 错误: {stderr if stderr else '无特定错误输出。'}"
 
 def check_command_exists(command_name):
-    """检查指定的命令是否存在于系统中。"""
+    """检查指定的命令是否存在于系统中 (结果在会话内缓存)。"""
+    return SESSION_CACHE.command_exists(command_name, _probe_command_exists)
+
+def _probe_command_exists(command_name):
     logging.debug(f"检查命令 '{command_name}' 是否存在")
     try:
         subprocess.run([command_name, '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
@@ -379,6 +885,43 @@ def check_command_exists(command_name):
             logging.debug(f"命令 '{command_name}' 不存在。")
             return False
 
+class FallbackCommand(list):
+    """
+    带回退命令的命令参数列表。执行失败时由 run_fix_command 改为执行 fallback。
+    本身仍是 list，显示与执行方式与普通命令相同。
+    """
+    def __init__(self, args, fallback):
+        super().__init__(args)
+        self.fallback = fallback
+
+def run_fix_command(command_args):
+    """
+    执行一条修复命令；若失败且带有回退命令 (FallbackCommand)，则改为执行回退命令。
+    返回 (stdout, stderr, returncode, 实际执行的回退命令或 None)。
+    """
+    stdout, stderr, code = run_command(command_args)
+    fallback = getattr(command_args, 'fallback', None)
+    if code != 0 and fallback:
+        logging.info(f"命令 {command_args} 失败 (返回码 {code})，改为执行回退命令 {fallback}")
+        stdout, stderr, code = run_command(fallback)
+        return stdout, stderr, code, fallback
+    return stdout, stderr, code, None
+
+def _nmcli_apply_commands(conn_name, interface_name, properties):
+    """
+    生成修改并应用 NetworkManager 连接配置的命令。
+    所有属性合并为一条 'nmcli con mod' (NetworkManager 在一次 Update 中原子地写入)，
+    再用 'nmcli device reapply' 将新配置应用到正在运行的设备上，避免 con down/up 导致接口中断；
+    reapply 失败时 (例如连接未在该设备上激活) 回退为 'nmcli con up' 重新激活。
+    properties: [(属性名, 值), ...]
+    """
+    modify = ['sudo', 'nmcli', 'con', 'mod', conn_name]
+    for key, value in properties:
+        modify += [key, value]
+    apply = FallbackCommand(['sudo', 'nmcli', 'device', 'reapply', interface_name],
+                            fallback=['sudo', 'nmcli', 'con', 'up', conn_name])
+    return [modify, apply]
+
 def try_set_dns(interface_name, dns_servers_to_set):
     """
     尝试为指定接口设置 DNS 服务器。
@@ -403,27 +946,16 @@ def try_set_dns(interface_name, dns_servers_to_set):
     elif has_nmcli:
         # NetworkManager - 使用 con (connection) 相关命令
         logging.debug(f"尝试获取接口 {interface_name} 的 NetworkManager 连接配置文件名称")
-        # stdout, stderr, code = run_command(['nmcli', '-t', '-f', 'NAME', 'c', 'show', '--active', 'dev', interface_name]) #  旧方法可能不直接
-        # 更直接的方法获取连接名称:
-        stdout_conn_name, stderr_conn_name, code_conn_name = run_command([
-            'nmcli', '-g', 'GENERAL.CONNECTION', 'device', 'show', interface_name
-        ])
-
-        if code_conn_name == 0 and stdout_conn_name and stdout_conn_name.strip():
-            conn_name = stdout_conn_name.strip()
+        conn_name = get_nm_connection_name(interface_name)
+        if conn_name:
             logging.info(f"找到接口 {interface_name} 的活动连接配置文件: {conn_name}")
-            commands.append(['sudo', 'nmcli', 'con', 'mod', conn_name, 'ipv4.dns', dns_str])
-            commands.append(['sudo', 'nmcli', 'con', 'mod', conn_name, 'ipv4.ignore-auto-dns', 'yes'])
-            commands.append(['sudo', 'nmcli', 'con', 'down', conn_name])
-            commands.append(['sudo', 'nmcli', 'con', 'up', conn_name])
+            commands = _nmcli_apply_commands(conn_name, interface_name, [
+                ('ipv4.dns', dns_str),
+                ('ipv4.ignore-auto-dns', 'yes'),
+            ])
             logging.info(f"为 nmcli (connection: {conn_name}) 生成 DNS 设置命令序列: {commands}")
             return True, commands
         else:
-            logging.warning(
-                f"无法确定接口 {interface_name} 的 NetworkManager 连接配置文件名称。 "
-                f"Code: {code_conn_name}, Stdout: '{stdout_conn_name}', Stderr: '{stderr_conn_name}'. "
-                f"将回退到尝试使用 'nmcli dev mod' (如果适用) 或失败。"
-            )
             # 回退逻辑: 如果无法获取 conn_name，可以尝试之前的 dev mod (但可能效果不同或不适用所有情况)
             # 或者直接报告错误。为了更符合用户请求的 con mod 方式，这里我们将报告获取 conn_name 失败。
             error_msg = (
@@ -456,7 +988,9 @@ async def execute_sudo_commands_and_report(commands_to_run: list[list[str]], int
         report_parts.append(f"\n{BOLD}执行命令 {i+1}/{len(commands_to_run)}:{RESET} {CYAN}{cmd_str_display}{RESET}")
         
         # 使用 asyncio.to_thread 运行阻塞的 run_command
-        stdout, stderr, code = await asyncio.to_thread(run_command, command_args)
+        stdout, stderr, code, fallback = await asyncio.to_thread(run_fix_command, command_args)
+        if fallback:
+            report_parts.append(f"  {YELLOW}命令失败，已改为执行回退命令:{RESET} {CYAN}{' '.join(fallback)}{RESET}")
         
         if code == 0:
             report_parts.append(f"  {GREEN}成功。{RESET}")
@@ -482,6 +1016,9 @@ async def execute_sudo_commands_and_report(commands_to_run: list[list[str]], int
         report_parts.append(f"\n{RED}部分或全部修复命令执行失败。{RESET}")
         report_parts.append(f"{YELLOW}请检查上面的输出以了解详细信息。您可能需要手动执行相关命令或检查权限。{RESET}")
 
+    # 修复命令可能改变了连接配置与接口地址，后续诊断需要重新获取
+    SESSION_CACHE.invalidate()
+
     final_report = "\n".join(report_parts)
     logging.info(f"修复命令执行完毕。总体成功: {overall_success}. 报告:\n{final_report}")
     return overall_success, final_report
@@ -497,27 +1034,19 @@ def try_set_dhcp(interface_name):
         logging.warning("nmcli 命令不存在，无法切换到 DHCP 模式。")
         return False, f"{YELLOW}nmcli 命令不存在，无法自动切换到 DHCP 模式。{RESET}"
 
-    # 获取连接配置文件名称
-    stdout_conn_name, stderr_conn_name, code_conn_name = run_command([
-        'nmcli', '-g', 'GENERAL.CONNECTION', 'device', 'show', interface_name
-    ])
-
-    if code_conn_name == 0 and stdout_conn_name and stdout_conn_name.strip():
-        conn_name = stdout_conn_name.strip()
+    # 获取连接配置文件名称 (会话内缓存)
+    conn_name = get_nm_connection_name(interface_name)
+    if conn_name:
         logging.info(f"找到接口 {interface_name} 的活动连接配置文件: {conn_name}，准备设置为 DHCP")
-        commands = []
-        commands.append(['sudo', 'nmcli', 'con', 'mod', conn_name, 'ipv4.method', 'auto'])
-        commands.append(['sudo', 'nmcli', 'con', 'mod', conn_name, 'ipv4.dns', '"'])
-        commands.append(['sudo', 'nmcli', 'con', 'mod', conn_name, 'ipv6.method', 'auto'])
-        commands.append(['sudo', 'nmcli', 'con', 'down', conn_name])
-        commands.append(['sudo', 'nmcli', 'con', 'up', conn_name])
+        # 空字符串清除手动 DNS (参数以列表形式传递，不经过 shell，无需引号)
+        commands = _nmcli_apply_commands(conn_name, interface_name, [
+            ('ipv4.method', 'auto'),
+            ('ipv4.dns', ''),
+            ('ipv6.method', 'auto'),
+        ])
         logging.info(f"为 nmcli (connection: {conn_name}) 生成切换到 DHCP 的命令序列: {commands}")
         return True, commands
     else:
-        logging.warning(
-            f"无法确定接口 {interface_name} 的 NetworkManager 连接配置文件名称。 "
-            f"Code: {code_conn_name}, Stdout: '{stdout_conn_name}', Stderr: '{stderr_conn_name}'."
-        )
         error_msg = (
             f"{YELLOW}无法确定接口 {interface_name} 的 NetworkManager 活动连接配置文件。{RESET}\n"
             f"因此无法自动切换到 DHCP 模式。\n"
@@ -525,17 +1054,113 @@ def try_set_dhcp(interface_name):
         )
         return False, error_msg
 
-def ping_check_ip_conflict(ip_address: str) -> bool:
+def arp_scan(interface_name, targets, source_ip='0.0.0.0', timeout=1.0):
+    """
+    通过 AF_PACKET 原始 socket 在指定接口上批量发送 ARP 请求 (需要 root 或 CAP_NET_RAW)。
+    所有请求一次性发出，超时时间过半时对尚未应答的地址重发一次。
+    source_ip 为 0.0.0.0 时发送的是 RFC 5227 ARP 探测包，不会污染其他主机的 ARP 缓存。
+    返回 {IP: [MAC, ...]} (只包含有应答的地址，多个 MAC 表示地址冲突)；无法创建 socket 时返回 None。
+    """
+    try:
+        with open(os.path.join(SYS_CLASS_NET, interface_name, 'address')) as f:
+            own_mac = bytes.fromhex(f.read().strip().replace(':', ''))
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ARP))
+    except (OSError, ValueError, AttributeError) as e: # AttributeError: 非 Linux 平台没有 AF_PACKET
+        logging.warning(f"无法在接口 {interface_name} 上进行 ARP 扫描: {e}")
+        return None
+
+    targets = [str(ip) for ip in targets]
+    wanted = set(targets)
+    spa = socket.inet_aton(source_ip)
+    replies = {}
+    with sock:
+        try:
+            sock.bind((interface_name, ETH_P_ARP))
+        except OSError as e:
+            logging.warning(f"无法绑定接口 {interface_name} 进行 ARP 扫描: {e}")
+            return None
+        sock.setblocking(False)
+        start = time.perf_counter()
+        rounds = [start, start + timeout / 2]
+        deadline = start + timeout
+        while True:
+            now = time.perf_counter()
+            if rounds and now >= rounds[0]:
+                rounds.pop(0)
+                for ip in targets:
+                    if ip in replies:
+                        continue
+                    frame = (b'\xff' * 6 + own_mac + struct.pack('!H', ETH_P_ARP) +
+                             struct.pack('!HHBBH', 1, 0x0800, 6, 4, ARP_REQUEST) +
+                             own_mac + spa + b'\0' * 6 + socket.inet_aton(ip))
+                    try:
+                        sock.send(frame)
+                    except BlockingIOError: # 发送队列已满，等待可写后重试一次
+                        select.select([], [sock], [], 0.05)
+                        try:
+                            sock.send(frame)
+                        except OSError:
+                            pass
+            if now >= deadline:
+                break
+            wait = min(rounds[0] if rounds else deadline, deadline) - now
+            readable, _, _ = select.select([sock], [], [], max(wait, 0))
+            if not readable:
+                continue
+            while True:
+                try:
+                    frame = sock.recv(128)
+                except (BlockingIOError, InterruptedError):
+                    break
+                if len(frame) < 42 or struct.unpack_from('!H', frame, 12)[0] != ETH_P_ARP:
+                    continue
+                if struct.unpack_from('!H', frame, 20)[0] != ARP_REPLY:
+                    continue
+                sender_mac = ':'.join(f'{byte:02x}' for byte in frame[22:28])
+                sender_ip = socket.inet_ntoa(frame[28:32])
+                if sender_ip in wanted and frame[22:28] != own_mac:
+                    macs = replies.setdefault(sender_ip, [])
+                    if sender_mac not in macs:
+                        macs.append(sender_mac)
+    logging.debug(f"ARP 扫描 {interface_name} ({len(targets)} 个地址) 应答: {replies}")
+    return replies
+
+def scan_subnet(interface_name, interface_cidr, gateway=None, timeout=1.0):
     """
-    通过发送 ping 来检查 IP 地址是否已在网络上使用。
-    如果收到 ping 回复 (冲突)，则返回 True，否则返回 False。
+    对接口所在子网做一次 ARP 扫描 (子网大于 /24 时只扫描本机所在的 /24)。
+    返回字典 {'network', 'neighbors': {IP: [MAC]}, 'conflicts': {IP: [MAC]}, 'free': [IP]}，
+    其中 conflicts 包含多个 MAC 应答的地址以及被其他设备占用的本机地址；
+    无法进行 ARP 扫描时返回 None。
     """
+    own = ipaddress.ip_interface(interface_cidr)
+    network = own.network if own.network.prefixlen >= 24 else ipaddress.ip_network(f"{own.ip}/24", strict=False)
+    hosts = list(network.hosts())
+    # 本机地址也一并探测: 如果有其他设备应答，说明存在地址冲突
+    neighbors = arp_scan(interface_name, hosts, source_ip=str(own.ip), timeout=timeout)
+    if neighbors is None:
+        return None
+    conflicts = {ip: macs for ip, macs in neighbors.items() if len(macs) > 1 or ip == str(own.ip)}
+    reserved = {str(own.ip), gateway}
+    free = [str(ip) for ip in hosts if str(ip) not in neighbors and str(ip) not in reserved]
+    return {'network': network, 'neighbors': neighbors, 'conflicts': conflicts, 'free': free}
+
+def ping_check_ip_conflict(ip_address: str, interface_name: str | None = None) -> bool:
+    """
+    检查 IP 地址是否已在网络上使用，如果已被占用 (冲突)，则返回 True，否则返回 False。
+    指定接口时优先使用 ARP 探测 (不受对方是否丢弃 ICMP 的影响)，否则或 ARP 不可用时使用 ping。
+    """
+    if interface_name:
+        logging.info(f"正在使用 ARP 检查 IP {ip_address} 是否冲突。")
+        replies = arp_scan(interface_name, [ip_address])
+        if replies is not None:
+            if replies:
+                logging.warning(f"检测到 IP {ip_address} 冲突。ARP 应答来自: {replies[ip_address]}")
+                return True
+            logging.info(f"未检测到 IP {ip_address} 冲突。ARP 无应答。")
+            return False
     logging.info(f"正在使用 ping 检查 IP {ip_address} 是否冲突。")
     try:
-        # 使用 ping_host 发送少量 ping 包，并设置较短的超时时间。
-        # 如果 ping_host 返回 True (表示 loss < 100%)，则认为 IP 地址被占用。
-        # count=1, timeout_ms=500 (ping_host 内部会将 timeout_ms 用于 -W 参数，单位秒)
-        # ping_host 的 -W 参数是以秒为单位，当前硬编码为1秒。count=1就足够了。
+        # 如果 ping_host 返回 True (表示 loss < 100%)，则认为 IP 地址被占用。count=1就足够了。
         is_reachable, _, _ = ping_host(ip_address, count=1) 
         
         if is_reachable:
@@ -560,48 +1185,39 @@ def try_set_static_ip(interface_name: str, ip_address: str, prefix: str, gateway
         logging.warning("nmcli 命令不存在，无法设置静态 IP。")
         return False, f"{YELLOW}nmcli 命令不存在，无法自动设置静态 IP。{RESET}"
 
-    # 获取连接配置文件名称
-    stdout_conn_name, stderr_conn_name, code_conn_name = run_command([
-        'nmcli', '-g', 'GENERAL.CONNECTION', 'device', 'show', interface_name
-    ])
-
-    if code_conn_name == 0 and stdout_conn_name and stdout_conn_name.strip():
-        conn_name = stdout_conn_name.strip()
+    # 获取连接配置文件名称 (会话内缓存)
+    conn_name = get_nm_connection_name(interface_name)
+    if conn_name:
         logging.info(f"找到接口 {interface_name} 的活动连接配置文件: {conn_name}，准备设置为静态 IP")
         
-        commands = []
-        commands.append(['sudo', 'nmcli', 'con', 'mod', conn_name, 'ipv4.method', 'manual'])
-        commands.append(['sudo', 'nmcli', 'con', 'mod', conn_name, 'ipv4.addresses', f"{ip_address}/{prefix}"])
+        properties = [
+            ('ipv4.method', 'manual'),
+            ('ipv4.addresses', f"{ip_address}/{prefix}"),
+        ]
 
         if gateway and gateway.strip():
-            commands.append(['sudo', 'nmcli', 'con', 'mod', conn_name, 'ipv4.gateway', gateway.strip()])
+            properties.append(('ipv4.gateway', gateway.strip()))
             logging.debug(f"为连接 {conn_name} 设置网关: {gateway.strip()}")
         else:
-            # 如果未提供网关，显式清除它
-            commands.append(['sudo', 'nmcli', 'con', 'mod', conn_name, 'ipv4.gateway', '""'])
+            # 如果未提供网关，用空值显式清除它
+            properties.append(('ipv4.gateway', ''))
             logging.debug(f"为连接 {conn_name} 清除网关设置")
 
         if dns_servers:
             dns_str = " ".join(dns_servers)
-            commands.append(['sudo', 'nmcli', 'con', 'mod', conn_name, 'ipv4.dns', dns_str])
-            commands.append(['sudo', 'nmcli', 'con', 'mod', conn_name, 'ipv4.ignore-auto-dns', 'yes'])
+            properties.append(('ipv4.dns', dns_str))
             logging.debug(f"为连接 {conn_name} 设置 DNS: {dns_str} 和 ignore-auto-dns=yes")
         else:
-            # 如果未提供 DNS 服务器，显式清除它们并设置 ignore-auto-dns
-            commands.append(['sudo', 'nmcli', 'con', 'mod', conn_name, 'ipv4.dns', '""'])
-            commands.append(['sudo', 'nmcli', 'con', 'mod', conn_name, 'ipv4.ignore-auto-dns', 'yes']) # 仍然是yes，因为是手动配置
+            # 如果未提供 DNS 服务器，显式清除它们
+            properties.append(('ipv4.dns', ''))
             logging.debug(f"为连接 {conn_name} 清除 DNS 设置并设置 ignore-auto-dns=yes")
-            
-        commands.append(['sudo', 'nmcli', 'con', 'down', conn_name])
-        commands.append(['sudo', 'nmcli', 'con', 'up', conn_name])
+        properties.append(('ipv4.ignore-auto-dns', 'yes')) # 手动配置时始终忽略自动获取的 DNS
+
+        commands = _nmcli_apply_commands(conn_name, interface_name, properties)
         
         logging.info(f"为 nmcli (connection: {conn_name}) 生成设置静态 IP 的命令序列: {commands}")
         return True, commands
     else:
-        logging.warning(
-            f"无法确定接口 {interface_name} 的 NetworkManager 连接配置文件名称。 "
-            f"Code: {code_conn_name}, Stdout: '{stdout_conn_name}', Stderr: '{stderr_conn_name}'."
-        )
         error_msg = (
             f"{YELLOW}无法确定接口 {interface_name} 的 NetworkManager 活动连接配置文件。{RESET}\n"
             f"因此无法自动设置静态 IP。\n"
@@ -610,7 +1226,24 @@ def try_set_static_ip(interface_name: str, ip_address: str, prefix: str, gateway
         return False, error_msg
 
 # --- CLI Diagnostic Functions ---
-def cli_diagnose_interface(if_name, if_details):
+def cli_diagnose_interface(if_name, if_details, dns_domains=None):
+    """诊断单个接口，返回 (结果行列表, 建议列表, 总体是否正常)。各项探测并发执行，见 diagnose_interface_async。"""
+    return asyncio.run(diagnose_interface_async(if_name, if_details, dns_domains))
+
+async def _probe_dns_servers(dns_domains=None):
+    """
+    获取 DNS 服务器列表后，对当前 DNS (包括本机存根及其上游) 与推荐 DNS 一起做查询基准。
+    返回 (当前服务器列表, dns_query_benchmark 结果)。
+    """
+    servers = await asyncio.to_thread(get_dns_servers)
+    if not servers:
+        return servers, {}
+    upstream = await asyncio.to_thread(get_upstream_dns_servers, servers)
+    candidates = list(dict.fromkeys(servers + upstream + [PRIMARY_DNS, SECONDARY_DNS]))
+    benchmark = await asyncio.to_thread(dns_query_benchmark, candidates, dns_domains)
+    return servers, benchmark
+
+async def diagnose_interface_async(if_name, if_details, dns_domains=None):
     results = []
     suggestions = []
     has_ip = bool(if_details.get('ips'))
@@ -655,7 +1288,29 @@ def cli_diagnose_interface(if_name, if_details):
         return results, suggestions, False # 网关至关重要
 
     results.append(f"  网关: {gateway_ip}")
-    gw_ping_ok, gw_latency, gw_loss = ping_host(gateway_ip)
+
+    # 依赖关系: DNS 查询基准依赖 DNS 服务器列表，其余探测互不依赖，因此全部同时启动。
+    # curl 仅在 ping www.baidu.com 失败时才需要，但也提前投机执行以免串行等待。
+    # 结果仍按 网关 -> DNS -> 互联网 的顺序判定；某一环节失败提前返回时，
+    # 其余未完成的探测会被取消，并终止对应的 ping/curl 子进程。
+    probes = {
+        'gateway': asyncio.create_task(ping_host_async(gateway_ip)),
+        'dns': asyncio.create_task(_probe_dns_servers(dns_domains)),
+        'internet': asyncio.create_task(ping_host_async("www.baidu.com")),
+        'curl': asyncio.create_task(curl_check_async("http://www.baidu.com")), # 对 curl 测试使用 http
+    }
+    try:
+        return await _collect_probe_results(if_name, if_details, gateway_ip, probes, results, suggestions)
+    finally:
+        pending = [task for task in probes.values() if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+async def _collect_probe_results(if_name, if_details, gateway_ip, probes, results, suggestions):
+    """按顺序等待各探测任务的结果并生成诊断输出。"""
+    gw_ping_ok, gw_latency, gw_loss = await probes['gateway']
     if gw_ping_ok:
         results.append(f"  网关 Ping ({gateway_ip}): {GREEN}成功{RESET} (延迟: {gw_latency:.2f}ms, 丢包: {gw_loss}%)")
     else:
@@ -664,37 +1319,55 @@ def cli_diagnose_interface(if_name, if_details):
         return results, suggestions, False
 
     # 3. DNS 检查
-    current_dns_servers = get_dns_servers()
+    current_dns_servers, dns_benchmark = await probes['dns']
     if not current_dns_servers:
         results.append(f"  DNS 服务器: {RED}未配置 DNS 服务器。{RESET}")
         suggestions.append(f"{YELLOW}提示: 未找到 DNS 服务器。建议将 DNS 设置为 {PRIMARY_DNS} (首选) 和 {SECONDARY_DNS} (备用)。您可能需要在 /etc/resolv.conf、NetworkManager 或您的路由器中进行配置。{RESET}")
         # 提供设置 DNS 的选项 (CLI: y/n, GUI: 按钮)
         return results, suggestions, False 
 
+    # 以实际解析延迟 (而不是 ping) 判断 DNS 是否可用
     results.append(f"  DNS 服务器: {', '.join(current_dns_servers)}")
     dns_all_ok = True
     for i, dns_server in enumerate(current_dns_servers):
-        dns_ping_ok, dns_latency, dns_loss = ping_host(dns_server)
+        stats = dns_benchmark[dns_server]
         status_msg = f"  DNS {i+1} ({dns_server}): "
-        if dns_ping_ok:
-            if dns_latency <= 50: # 阈值调整为50ms
-                status_msg += f"{GREEN}成功{RESET} (延迟: {dns_latency:.2f}ms, 丢包: {dns_loss}%)"
+        timing = f"解析 p50: {stats['p50']:.2f}ms, p95: {stats['p95']:.2f}ms, 应答: {stats['answered']}/{stats['queries']}"
+        if stats['answered']:
+            if stats['p50'] <= 50: # 阈值调整为50ms
+                status_msg += f"{GREEN}成功{RESET} ({timing})"
             else:
-                status_msg += f"{YELLOW}缓慢{RESET} (延迟: {dns_latency:.2f}ms, 丢包: {dns_loss}%) - 考虑更换。"
+                status_msg += f"{YELLOW}缓慢{RESET} ({timing}) - 考虑更换。"
                 # 对于慢速 DNS 不再将 dns_all_ok 设置为 False，仅警告
         else:
-            status_msg += f"{RED}失败{RESET}"
+            status_msg += f"{RED}失败{RESET} ({stats['queries']} 个查询均无有效应答)"
             dns_all_ok = False
         results.append(status_msg)
-    
+
+    ranking = [server for server in rank_dns_servers(dns_benchmark) if dns_benchmark[server]['answered']]
+    if ranking:
+        results.append("  DNS 解析速度排名: " + ", ".join(
+            f"{n}. {server} ({dns_benchmark[server]['p50']:.2f}ms)" for n, server in enumerate(ranking, 1)
+        ))
+    # 本机存根 (127.0.0.53 等) 带缓存，实测常常最快，但不能作为连接的 DNS 服务器推荐
+    applicable = [server for server in ranking if not is_loopback_dns(server)]
+    recommended = applicable[:2] or [PRIMARY_DNS, SECONDARY_DNS]
+
     if not dns_all_ok:
-        suggestions.append(f"{YELLOW}提示: 一个或多个 DNS 服务器无法访问。建议更改/添加 DNS 为 {PRIMARY_DNS} 和 {SECONDARY_DNS}。{RESET}")
+        suggestions.append(f"{YELLOW}提示: 一个或多个 DNS 服务器无法访问。建议更改/添加 DNS 为 {' 和 '.join(recommended)}。{RESET}")
         # 提供设置 DNS 的选项
         return results, suggestions, False # DNS 故障对互联网访问至关重要
 
+    best_current = min(dns_benchmark[server]['p50'] for server in current_dns_servers)
+    if applicable and applicable[0] not in current_dns_servers:
+        best = dns_benchmark[applicable[0]]['p50']
+        # 只有明显更快 (至少快 20% 且 10ms) 时才建议切换，避免因测量抖动而频繁更换
+        if best < best_current * 0.8 and best_current - best >= 10:
+            suggestions.append(f"{YELLOW}提示: 实测 {applicable[0]} 的解析延迟 (p50 {best:.2f}ms) 明显低于当前 DNS (p50 {best_current:.2f}ms)，可考虑切换为 {' 和 '.join(recommended)}。{RESET}")
+
     # 4. 互联网连接性检查
     results.append(f"  互联网 (ping www.baidu.com):")
-    baidu_ping_ok, baidu_latency, baidu_loss = ping_host("www.baidu.com")
+    baidu_ping_ok, baidu_latency, baidu_loss = await probes['internet']
     if baidu_ping_ok:
         results.append(f"    状态: {GREEN}成功{RESET} (延迟: {baidu_latency:.2f}ms, 丢包: {baidu_loss}%)")
         results.append(f"{GREEN}诊断完成。互联网连接似乎工作正常。{RESET}")
@@ -702,7 +1375,7 @@ def cli_diagnose_interface(if_name, if_details):
     else:
         results.append(f"    状态: {RED}失败 (ping){RESET}")
         results.append(f"  互联网 (curl www.baidu.com):")
-        curl_ok, curl_msg = curl_check("http://www.baidu.com") # 对 curl 测试使用 http
+        curl_ok, curl_msg = await probes['curl']
         if curl_ok:
             results.append(f"    状态: {GREEN}成功 (curl){RESET} - {curl_msg}")
             results.append(f"{YELLOW}诊断完成。通过 curl 可以连接互联网，但 ping 可能被阻止 (例如，被防火墙或 ICMP 规则阻止)。{RESET}")
@@ -722,6 +1395,526 @@ def print_cli_results(results, suggestions):
             print(sug)
     print("-"*(40 + len(" 诊断结果 "))) # 调整分隔线长度
 
+# --- 持续监控 (--monitor) ---
+class SampleRing:
+    """定长环形缓冲区: 用 array('d') 保存采样时间与 RTT (丢包记为 NaN)，内存占用固定。"""
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.rtts = array('d', bytes(8 * capacity))
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, timestamp, rtt):
+        if self.size < self.capacity:
+            index = (self.start + self.size) % self.capacity
+            self.size += 1
+        else: # 已满，覆盖最旧的采样
+            index = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.times[index] = timestamp
+        self.rtts[index] = rtt
+
+    def values(self, last=None):
+        """按时间顺序返回最近 last 个 (默认全部) RTT 采样。"""
+        count = self.size if last is None else min(last, self.size)
+        first = self.start + self.size - count
+        return [self.rtts[(first + i) % self.capacity] for i in range(count)]
+
+    def time_range(self):
+        """返回缓冲区中最早与最新采样的时间戳。"""
+        if not self.size:
+            return None, None
+        return self.times[self.start], self.times[(self.start + self.size - 1) % self.capacity]
+
+class LatencyHistogram:
+    """对数刻度的累计 RTT 直方图 (0.01ms ~ 约 60s，每档 +10%)，用于统计整个运行期间的百分位数。"""
+    MIN_MS = 0.01
+    GROWTH = 1.1
+    BUCKETS = 165
+
+    def __init__(self):
+        self.counts = array('Q', bytes(8 * self.BUCKETS))
+        self.total = 0
+        self.max = 0.0
+
+    def add(self, rtt):
+        if rtt <= self.MIN_MS:
+            index = 0
+        else:
+            index = min(int(math.log(rtt / self.MIN_MS, self.GROWTH)) + 1, self.BUCKETS - 1)
+        self.counts[index] += 1
+        self.total += 1
+        self.max = max(self.max, rtt)
+
+    def percentile(self, pct):
+        """返回 pct 百分位所在档位的上界 (ms，不超过实际最大值)；没有数据时返回 inf。"""
+        if not self.total:
+            return float('inf')
+        rank = max(1, -(-self.total * pct // 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.MIN_MS * self.GROWTH ** index, self.max)
+        return self.max
+
+class MonitorSeries:
+    """一个监控目标的采样历史: 环形缓冲区 (最近的采样) + 累计直方图与计数 (整个运行期间)。"""
+    def __init__(self, label, host, kind, capacity):
+        self.label = label
+        self.host = host
+        self.kind = kind # 'ping' 或 'dns'
+        self.ring = SampleRing(capacity)
+        self.histogram = LatencyHistogram()
+        self.sent = 0
+        self.lost = 0
+
+    def add(self, timestamp, rtt):
+        """记录一次采样，rtt 为 None 表示丢包/超时。"""
+        self.sent += 1
+        if rtt is None or math.isinf(rtt):
+            self.lost += 1
+            rtt = math.nan
+        else:
+            self.histogram.add(rtt)
+        self.ring.append(timestamp, rtt)
+
+    def stats(self):
+        """返回窗口 (环形缓冲区) 与累计两部分的统计数据。"""
+        window = self.ring.values()
+        answered = sorted(value for value in window if not math.isnan(value))
+        first, last = self.ring.time_range()
+        return {
+            'label': self.label,
+            'host': self.host,
+            'kind': self.kind,
+            'window_samples': len(window),
+            'window_start': first,
+            'window_end': last,
+            'window_loss': 100.0 * (len(window) - len(answered)) / len(window) if window else 0.0,
+            'window_p50': _percentile(answered, 50),
+            'window_p95': _percentile(answered, 95),
+            'window_p99': _percentile(answered, 99),
+            'window_max': answered[-1] if answered else float('inf'),
+            'total_samples': self.sent,
+            'total_loss': 100.0 * self.lost / self.sent if self.sent else 0.0,
+            'total_p50': self.histogram.percentile(50),
+            'total_p95': self.histogram.percentile(95),
+            'total_p99': self.histogram.percentile(99),
+        }
+
+class HostResolver:
+    """
+    在后台线程中把主机名解析为 IPv4 地址并缓存，探测线程只读取缓存，不会因 DNS 故障而阻塞。
+    每个主机同一时间最多只有一个解析线程；解析失败时保留上一次成功的地址，
+    尚未解析成功的主机 lookup 返回 None (由调用方记为丢包)，并在下一次 lookup 时重试。
+    """
+    def __init__(self, hosts, refresh_interval=MONITOR_RESOLVE_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+        self.addresses = {} # 主机名 -> IP 或 None
+        self.resolved_at = {} # 主机名 -> 上一次解析完成的 time.monotonic()
+        self.pending = {} # 正在解析的主机名 -> 完成事件
+        for host in hosts:
+            try:
+                self.addresses[host] = str(ipaddress.IPv4Address(host)) # IP 字面量无需解析
+            except ValueError:
+                self.addresses[host] = None
+                self._start(host)
+
+    def _start(self, host):
+        with self.lock:
+            if host in self.pending:
+                return
+            done = self.pending[host] = threading.Event()
+        threading.Thread(target=self._resolve, args=(host, done), daemon=True).start()
+
+    def _resolve(self, host, done):
+        try:
+            addr = socket.getaddrinfo(host, None, socket.AF_INET)[0][4][0]
+        except (OSError, UnicodeError) as e:
+            logging.warning(f"无法解析主机 {host}: {e}")
+            addr = None
+        with self.lock:
+            if addr:
+                self.addresses[host] = addr
+            self.resolved_at[host] = time.monotonic()
+            del self.pending[host]
+        done.set()
+
+    def wait(self, timeout):
+        """最多等待 timeout 秒，直到当前所有解析完成。"""
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            events = list(self.pending.values())
+        for done in events:
+            done.wait(max(0.0, deadline - time.monotonic()))
+
+    def lookup(self, host):
+        """返回缓存的地址 (可能为 None)；未解析成功或缓存过期时在后台重新解析，不等待结果。"""
+        with self.lock:
+            addr = self.addresses.get(host)
+            resolved_at = self.resolved_at.get(host)
+        if addr is None or (resolved_at is not None and time.monotonic() - resolved_at >= self.refresh_interval):
+            self._start(host) # IP 字面量没有 resolved_at，不会重新解析
+        return addr
+
+class NetworkMonitor:
+    """
+    按固定间隔持续探测网关、DNS 服务器与上游主机: 网关与上游主机使用 ICMP echo，
+    DNS 服务器使用一次 A 记录查询。每个目标的采样保存在定长的 MonitorSeries 中。
+    """
+    def __init__(self, gateway=None, dns_servers=(), upstream_hosts=MONITOR_UPSTREAM_HOSTS,
+                 interval=1.0, capacity=MONITOR_HISTORY, dns_domain=DNS_BENCHMARK_DOMAINS[0]):
+        self.interval = interval
+        self.dns_domain = dns_domain
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.series = {}
+        if gateway:
+            self._add_series(f"网关 {gateway}", gateway, 'ping', capacity)
+        for server in dns_servers:
+            self._add_series(f"DNS {server}", server, 'dns', capacity)
+        for host in upstream_hosts:
+            self._add_series(f"上游 {host}", host, 'ping', capacity)
+        # 上游主机名在后台解析，每轮只 ping 缓存的地址，DNS 故障时不会拖慢网关等目标的采样
+        self.resolver = HostResolver([s.host for s in self.series.values() if s.kind == 'ping'])
+
+    def _add_series(self, label, host, kind, capacity):
+        self.series[label] = MonitorSeries(label, host, kind, capacity)
+
+    def probe_once(self):
+        """对所有目标并发探测一次并记录结果。"""
+        timeout = min(self.interval, 1.0)
+        ping_targets = {s.host: self.resolver.lookup(s.host) for s in self.series.values() if s.kind == 'ping'}
+        ping_addrs = [addr for addr in ping_targets.values() if addr]
+        dns_servers = [s.host for s in self.series.values() if s.kind == 'dns']
+
+        async def probe():
+            return await asyncio.gather(
+                ping_hosts_async(ping_addrs, count=1, timeout_ms=timeout * 1000),
+                asyncio.to_thread(dns_query_benchmark, dns_servers, [self.dns_domain], (DNS_TYPE_A,), timeout),
+            )
+        pings, dns = asyncio.run(probe())
+        now = time.time()
+        with self.lock:
+            for series in self.series.values():
+                if series.kind == 'ping':
+                    addr = ping_targets[series.host]
+                    if addr is None: # 主机名尚未解析成功，记为丢包
+                        series.add(now, None)
+                        continue
+                    ok, rtt, _ = pings[addr]
+                    series.add(now, rtt if ok else None)
+                else:
+                    series.add(now, dns[series.host]['p50'])
+
+    def run(self, stop_event, on_tick=None):
+        """按固定间隔循环探测，直到 stop_event 被设置；每轮结束后调用 on_tick()。"""
+        self.resolver.wait(MONITOR_RESOLVE_TIMEOUT) # 给启动时的解析一个有界的等待，避免首轮误报丢包
+        next_tick = time.monotonic()
+        while not stop_event.is_set():
+            try:
+                self.probe_once()
+            except Exception as e: # 单轮失败不应终止长期运行的监控
+                logging.error(f"监控探测失败: {e}")
+            if on_tick:
+                on_tick()
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay < 0: # 探测耗时超过间隔，从当前时间重新对齐
+                next_tick = time.monotonic()
+                delay = 0
+            stop_event.wait(delay)
+
+    def snapshot(self):
+        """返回所有目标的统计数据列表。"""
+        with self.lock:
+            return [series.stats() for series in self.series.values()]
+
+    def sparkline_data(self, series_label, points):
+        """返回某个目标最近 points 个采样，丢包用 0 表示 (供 Sparkline 显示)。"""
+        with self.lock:
+            values = self.series[series_label].ring.values(points)
+        return [0.0 if math.isnan(value) else value for value in values]
+
+    def export(self, path):
+        """将百分位统计导出为 JSON (默认) 或 CSV (扩展名为 .csv 时)。"""
+        stats = self.snapshot()
+        if path.lower().endswith('.csv'):
+            with open(path, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=list(stats[0]) if stats else ['label'])
+                writer.writeheader()
+                writer.writerows(stats)
+        else:
+            report = {
+                'started': self.started,
+                'exported': time.time(),
+                'interval': self.interval,
+                # JSON 不支持 inf，无数据的百分位导出为 null
+                'series': [{k: (None if isinstance(v, float) and math.isinf(v) else v) for k, v in s.items()} for s in stats],
+            }
+            with open(path, 'w') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        logging.info(f"监控统计已导出到 {path}")
+
+def format_monitor_line(stats):
+    """将一个目标的统计格式化为一行文本。"""
+    return (f"{stats['label']:<28} 丢包 {stats['window_loss']:5.1f}%  "
+            f"p50 {stats['window_p50']:7.2f}ms  p95 {stats['window_p95']:7.2f}ms  "
+            f"p99 {stats['window_p99']:7.2f}ms  样本 {stats['window_samples']}")
+
+# --- 吞吐量测试 (--serve / --connect) ---
+class ThroughputServer:
+    """
+    吞吐量测试服务端: 在同一端口上同时监听 TCP 与 UDP。
+    TCP: 每个连接一个线程，用 memoryview 缓冲区 recv_into 接收直到对端关闭写端，
+         然后回复 (接收字节数, 耗时 ns)。
+    UDP: 按客户端地址统计收到的数据报，收到结束报文后回复 (数据报数, 字节数, 耗时 ns)。
+    长期运行时，停滞的 TCP 连接在 THROUGHPUT_IDLE_TIMEOUT 后断开，
+    超过 THROUGHPUT_UDP_FLOW_TIMEOUT 未收到数据报的 UDP 流 (客户端异常退出或结束报文丢失) 被清理。
+    """
+    def __init__(self, port=THROUGHPUT_PORT, host=''):
+        self.port = port
+        self.stop_event = threading.Event()
+        self.tcp_sock = socket.create_server((host, port), reuse_port=False)
+        self.udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp_sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, THROUGHPUT_SOCKET_BUFFER)
+        self.udp_sock.bind((host, port))
+        self.threads = []
+
+    def start(self):
+        for target in (self._accept_loop, self._udp_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        logging.info(f"吞吐量测试服务端已在端口 {self.port} 上启动")
+
+    def close(self):
+        self.stop_event.set()
+        self.tcp_sock.close()
+        self.udp_sock.close()
+
+    def _accept_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                conn, addr = self.tcp_sock.accept()
+            except OSError: # socket 已关闭
+                break
+            threading.Thread(target=self._handle_tcp, args=(conn, addr), daemon=True).start()
+
+    def _handle_tcp(self, conn, addr):
+        buf = bytearray(THROUGHPUT_CHUNK)
+        view = memoryview(buf)
+        conn.settimeout(THROUGHPUT_IDLE_TIMEOUT) # 连接后停滞的客户端不会永久占用处理线程
+        with conn:
+            try:
+                header = _recv_exact(conn, len(THROUGHPUT_TCP_MAGIC) + 4)
+                if header[:4] != THROUGHPUT_TCP_MAGIC:
+                    logging.warning(f"来自 {addr} 的连接不是吞吐量测试客户端，已关闭")
+                    return
+                stream_id, = struct.unpack('!I', header[4:])
+                received = 0
+                first_ns = None
+                while True:
+                    n = conn.recv_into(view)
+                    if not n:
+                        break
+                    if first_ns is None:
+                        first_ns = time.perf_counter_ns()
+                    received += n
+                elapsed_ns = time.perf_counter_ns() - first_ns if first_ns else 0
+                conn.sendall(struct.pack('!QQ', received, elapsed_ns))
+                logging.info(f"TCP 流 {stream_id} ({addr[0]}): 收到 {received} 字节，用时 {elapsed_ns / 1e9:.2f}s")
+            except TimeoutError:
+                logging.warning(f"来自 {addr} 的 TCP 流超过 {THROUGHPUT_IDLE_TIMEOUT:.0f}s 没有数据，已断开")
+            except OSError as e:
+                logging.warning(f"处理来自 {addr} 的 TCP 流时出错: {e}")
+
+    def _udp_loop(self):
+        buf = bytearray(65536)
+        view = memoryview(buf)
+        flows = {} # 客户端地址 -> [数据报数, 字节数, 首个数据报时间, 最后数据报时间]
+        finished = {} # 已结束的客户端地址 -> 回复报文 (用于应答重传的结束报文)
+        flow_timeout_ns = int(THROUGHPUT_UDP_FLOW_TIMEOUT * 1e9)
+        last_sweep = time.perf_counter_ns()
+        self.udp_sock.settimeout(1.0) # 没有数据报时也定期醒来清理过期的流
+        while not self.stop_event.is_set():
+            try:
+                n, addr = self.udp_sock.recvfrom_into(view)
+            except TimeoutError:
+                n = 0
+            except OSError:
+                break
+            now = time.perf_counter_ns()
+            if now - last_sweep >= 1_000_000_000:
+                last_sweep = now
+                for expired in [a for a, flow in flows.items() if now - flow[3] > flow_timeout_ns]:
+                    flow = flows.pop(expired)
+                    logging.info(f"UDP 流 {expired} 超过 {THROUGHPUT_UDP_FLOW_TIMEOUT:.0f}s 未收到数据报，已丢弃 "
+                                 f"({flow[0]} 个数据报, {flow[1]} 字节)")
+            if not n:
+                continue
+            magic = bytes(view[:4])
+            if magic == THROUGHPUT_UDP_MAGIC:
+                flow = flows.get(addr)
+                if flow is None:
+                    flow = flows[addr] = [0, 0, now, now]
+                flow[0] += 1
+                flow[1] += n
+                flow[3] = now
+            elif magic == THROUGHPUT_UDP_FIN:
+                flow = flows.pop(addr, None)
+                if flow is not None:
+                    finished[addr] = struct.pack('!4sQQQ', THROUGHPUT_UDP_REPORT, flow[0], flow[1], flow[3] - flow[2])
+                    if len(finished) > 1024:
+                        finished.pop(next(iter(finished)))
+                reply = finished.get(addr, struct.pack('!4sQQQ', THROUGHPUT_UDP_REPORT, 0, 0, 0))
+                try:
+                    self.udp_sock.sendto(reply, addr)
+                except OSError as e:
+                    logging.warning(f"向 {addr} 回复 UDP 统计失败: {e}")
+
+def _recv_exact(sock, size):
+    """从 socket 读取恰好 size 字节，连接提前关闭时抛出 ConnectionError。"""
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("连接已被对端关闭")
+        data += chunk
+    return bytes(data)
+
+def _payload_file(size):
+    """创建一个 size 字节的内存文件 (memfd，不可用时退化为临时文件)，供 socket.sendfile 零拷贝发送。"""
+    if hasattr(os, 'memfd_create'):
+        fd = os.memfd_create('throughput_payload')
+        os.ftruncate(fd, size)
+        return os.fdopen(fd, 'rb')
+    f = tempfile.TemporaryFile()
+    f.truncate(size)
+    return f
+
+def _tcp_client_stream(host, port, stream_id, duration, result):
+    """单个 TCP 发送流: 用 socket.sendfile 反复发送同一块内存文件，直到持续时间结束。"""
+    with _payload_file(THROUGHPUT_CHUNK) as payload, socket.create_connection((host, port), timeout=10) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, THROUGHPUT_SOCKET_BUFFER)
+        sock.settimeout(None)
+        sock.sendall(THROUGHPUT_TCP_MAGIC + struct.pack('!I', stream_id))
+        sent = 0
+        start_ns = time.perf_counter_ns()
+        deadline_ns = start_ns + int(duration * 1e9)
+        while time.perf_counter_ns() < deadline_ns:
+            sent += sock.sendfile(payload, 0, THROUGHPUT_CHUNK)
+        elapsed_ns = time.perf_counter_ns() - start_ns
+        sock.shutdown(socket.SHUT_WR)
+        sock.settimeout(10)
+        received, server_elapsed_ns = struct.unpack('!QQ', _recv_exact(sock, 16))
+    result.update(sent=sent, elapsed_ns=elapsed_ns, received=received, server_elapsed_ns=server_elapsed_ns)
+
+def _udp_client_stream(host, port, stream_id, duration, bitrate, result):
+    """单个 UDP 发送流: 复用同一个 memoryview 缓冲区发送带序号的数据报；bitrate (bit/s) 为 0 时不限速。"""
+    buf = bytearray(THROUGHPUT_UDP_PAYLOAD)
+    view = memoryview(buf)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, THROUGHPUT_SOCKET_BUFFER)
+        sock.connect((host, port))
+        packets = 0
+        start_ns = time.perf_counter_ns()
+        deadline_ns = start_ns + int(duration * 1e9)
+        ns_per_packet = THROUGHPUT_UDP_PAYLOAD * 8 * 1e9 / bitrate if bitrate else 0
+        while True:
+            now_ns = time.perf_counter_ns()
+            if now_ns >= deadline_ns:
+                break
+            if ns_per_packet and packets * ns_per_packet > now_ns - start_ns: # 超前于目标速率，稍作等待
+                time.sleep(min((packets * ns_per_packet - (now_ns - start_ns)) / 1e9, 0.01))
+                continue
+            for _ in range(THROUGHPUT_UDP_BATCH):
+                struct.pack_into('!4sQ', buf, 0, THROUGHPUT_UDP_MAGIC, packets)
+                try:
+                    sock.send(view)
+                except OSError as e:
+                    if e.errno not in (errno.ENOBUFS, errno.EAGAIN):
+                        raise # 对端拒绝 (ECONNREFUSED)、报文过大、网络不可达等: 中止本流并报告错误
+                    select.select([], [sock], [], 0.01) # 发送缓冲区满，等待可写后重发同一序号
+                    continue
+                packets += 1
+        elapsed_ns = time.perf_counter_ns() - start_ns
+
+        # 发送结束报文并等待服务端的统计回复 (丢失时重传)
+        sock.settimeout(0.5)
+        reply = None
+        for _ in range(5):
+            sock.send(THROUGHPUT_UDP_FIN)
+            try:
+                data = sock.recv(64)
+            except (socket.timeout, ConnectionRefusedError):
+                continue
+            if data[:4] == THROUGHPUT_UDP_REPORT:
+                reply = struct.unpack('!4sQQQ', data[:28])[1:]
+                break
+    if reply is None:
+        raise ConnectionError("未收到服务端的 UDP 统计回复")
+    received_packets, received_bytes, server_elapsed_ns = reply
+    result.update(sent=packets * THROUGHPUT_UDP_PAYLOAD, elapsed_ns=elapsed_ns, received=received_bytes,
+                  server_elapsed_ns=server_elapsed_ns, packets=packets, received_packets=received_packets)
+
+def run_throughput_client(host, port=THROUGHPUT_PORT, streams=4, duration=5.0, udp=False, bitrate=0):
+    """
+    并行运行 streams 个发送流，返回每个流的结果列表:
+    {'stream', 'sent', 'elapsed_ns', 'received', 'server_elapsed_ns', ['packets', 'received_packets'], ['error']}。
+    """
+    results = [{'stream': i + 1} for i in range(streams)]
+
+    def run(index):
+        try:
+            if udp:
+                _udp_client_stream(host, port, index + 1, duration, bitrate, results[index])
+            else:
+                _tcp_client_stream(host, port, index + 1, duration, results[index])
+        except OSError as e:
+            logging.error(f"吞吐量测试流 {index + 1} 失败: {e}")
+            results[index]['error'] = str(e)
+
+    threads = [threading.Thread(target=run, args=(i,), daemon=True) for i in range(streams)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def read_link_speed(interface_name):
+    """读取 /sys/class/net/<接口>/speed 中协商的链路速率 (Mbit/s)；虚拟接口或链路断开时返回 None。"""
+    try:
+        with open(os.path.join(SYS_CLASS_NET, interface_name, 'speed')) as f:
+            speed = int(f.read())
+    except (OSError, ValueError): # 虚拟接口读取 speed 会返回 EINVAL
+        return None
+    return speed if speed > 0 else None
+
+def interface_for_destination(host):
+    """返回访问 host 时使用的本地接口名 (通过 UDP connect 确定源地址，再与接口地址匹配)。"""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect((host, THROUGHPUT_PORT)) # UDP connect 不会发送任何数据
+            local_ip = sock.getsockname()[0]
+        addresses = _netlink_ipv4_addresses()
+        for name in os.listdir(SYS_CLASS_NET):
+            with open(os.path.join(SYS_CLASS_NET, name, 'ifindex')) as f:
+                if any(ip.split('/')[0] == local_ip for ip in addresses.get(int(f.read()), [])):
+                    return name
+    except (OSError, ValueError) as e:
+        logging.debug(f"无法确定访问 {host} 使用的接口: {e}")
+    return None
+
+def _gbps(byte_count, elapsed_ns):
+    return byte_count * 8 / elapsed_ns if elapsed_ns else 0.0 # bit/ns 即 Gbit/s
+
 # --- Textual GUI Components (if TEXTUAL_AVAILABLE) ---
 if TEXTUAL_AVAILABLE:
     class OutputDisplay(Markdown):
@@ -753,17 +1946,18 @@ if TEXTUAL_AVAILABLE:
 
     class SetStaticIPModal(ModalScreen):
         """用于输入静态IP配置的模态对话框。"""
-        def __init__(self, prompt: str) -> None:
+        def __init__(self, prompt: str, defaults: dict | None = None) -> None:
             super().__init__()
             self._prompt = prompt
+            self._defaults = defaults or {} # 预填值，例如 ARP 扫描找到的空闲地址
 
         def compose(self) -> ComposeResult:
             yield Container(
                 Label(self._prompt),
-                Input(placeholder="IP 地址 (例如: 192.168.1.100)", id="ip_address"),
-                Input(placeholder="子网前缀 (例如: 24)", id="prefix", type="integer"),
-                Input(placeholder="网关 (可选，例如: 192.168.1.1)", id="gateway"),
-                Input(placeholder="DNS 服务器 (可选, 逗号分隔, 例如: 223.5.5.5,1.1.1.1)", id="dns"),
+                Input(self._defaults.get("ip_address", ""), placeholder="IP 地址 (例如: 192.168.1.100)", id="ip_address"),
+                Input(self._defaults.get("prefix", ""), placeholder="子网前缀 (例如: 24)", id="prefix", type="integer"),
+                Input(self._defaults.get("gateway", ""), placeholder="网关 (可选，例如: 192.168.1.1)", id="gateway"),
+                Input(self._defaults.get("dns", ""), placeholder="DNS 服务器 (可选, 逗号分隔, 例如: 223.5.5.5,1.1.1.1)", id="dns"),
                 Horizontal(
                     Button("应用", variant="success", id="apply_static_ip"),
                     Button("取消", variant="error", id="cancel_static_ip"),
@@ -1010,9 +2204,12 @@ SetStaticIPModal #modal-buttons > Button {
                 # 定义 ANSI escape pattern 以便后续使用
                 ansi_escape_pattern = r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])'
 
+                # 根据实测解析延迟挑选要设置的 DNS 服务器
+                dns_servers = await asyncio.to_thread(choose_dns_servers)
+                fix_result_display.update(f"正在尝试自动修复 DNS (设置为 {', '.join(dns_servers)})...")
                 # try_set_dns 现在返回 (bool, Union[List[List[str]], str])
                 gen_success, commands_or_msg = await asyncio.to_thread(
-                    try_set_dns, self.selected_interface_name, [PRIMARY_DNS, SECONDARY_DNS]
+                    try_set_dns, self.selected_interface_name, dns_servers
                 )
                 
                 if gen_success:
@@ -1022,6 +2219,8 @@ SetStaticIPModal #modal-buttons > Button {
                     exec_success, report_str = await execute_sudo_commands_and_report(
                         commands_or_msg, self.selected_interface_name
                     )
+                    # 缓存已在执行修复命令后失效，重新获取接口详情供下次诊断使用
+                    self.interfaces_details = await asyncio.to_thread(get_network_interfaces_details)
                     cleaned_report = re.sub(ansi_escape_pattern, '', report_str) # 移除ANSI给Markdown
                     fix_result_display.update(cleaned_report)
                     if exec_success:
@@ -1059,6 +2258,8 @@ SetStaticIPModal #modal-buttons > Button {
                     exec_success, report_str = await execute_sudo_commands_and_report(
                         commands_or_msg, self.selected_interface_name
                     )
+                    # 缓存已在执行修复命令后失效，重新获取接口详情供下次诊断使用
+                    self.interfaces_details = await asyncio.to_thread(get_network_interfaces_details)
                     cleaned_report = re.sub(ansi_escape_pattern, '', report_str)
                     dhcp_result_display.update(cleaned_report)
                     if exec_success:
@@ -1092,10 +2293,14 @@ SetStaticIPModal #modal-buttons > Button {
                         dns_servers = [d.strip() for d in dns_input.split(',') if d.strip()] if dns_input else None
 
                         static_ip_result_display.update(f"正在检查IP {ip_address} 是否冲突...")
-                        is_conflict = await asyncio.to_thread(ping_check_ip_conflict, ip_address)
+                        is_conflict = await asyncio.to_thread(
+                            ping_check_ip_conflict, ip_address, self.selected_interface_name
+                        )
 
                         if is_conflict:
                             conflict_msg = f"**警告：IP地址 {ip_address} 可能已被占用！**\n建议选择其他IP地址以避免网络冲突。是否仍要继续设置此IP？"
+                            if free_ips:
+                                conflict_msg += f"\n当前子网中未被占用的地址: {', '.join(free_ips[:5])}"
                             # (这里可以添加一个 ConfirmModal 进一步确认)
                             # 暂时直接中止并提示
                             static_ip_result_display.update(f"{RED}{conflict_msg.replace('**','')}{RESET}") # 简单显示，不带Markdown强调
@@ -1115,6 +2320,8 @@ SetStaticIPModal #modal-buttons > Button {
                             exec_success, report_str = await execute_sudo_commands_and_report(
                                 commands_or_msg, self.selected_interface_name
                             )
+                            # 缓存已在执行修复命令后失效，重新获取接口详情供下次诊断使用
+                            self.interfaces_details = await asyncio.to_thread(get_network_interfaces_details)
                             cleaned_report = re.sub(ansi_escape_pattern, '', report_str)
                             static_ip_result_display.update(cleaned_report)
                             # 可以在此建议用户重新诊断以查看更改
@@ -1127,7 +2334,30 @@ SetStaticIPModal #modal-buttons > Button {
                         logging.debug("SetStaticIPModal被取消或未返回数据")
                         static_ip_result_display.update("设置静态IP操作已取消。")
                 
-                self.push_screen(SetStaticIPModal(prompt="为接口 " + self.selected_interface_name + " 设置静态IP"), static_ip_modal_callback)
+                # 先对接口所在子网做一次 ARP 扫描 (约 1 秒)，用找到的空闲地址预填对话框
+                defaults = {}
+                free_ips = []
+                if_details = self.interfaces_details.get(self.selected_interface_name) or {}
+                if if_details.get('ips'):
+                    self.query_one("#static-ip-result-display", Markdown).update("正在扫描子网以查找空闲的 IP 地址...")
+                    scan = await asyncio.to_thread(
+                        scan_subnet, self.selected_interface_name, if_details['ips'][0], if_details.get('gateway')
+                    )
+                    if scan:
+                        free_ips = scan['free']
+                        defaults = {
+                            "ip_address": free_ips[0] if free_ips else "",
+                            "prefix": str(ipaddress.ip_interface(if_details['ips'][0]).network.prefixlen),
+                            "gateway": if_details.get('gateway') or "",
+                        }
+                        self.query_one("#static-ip-result-display", Markdown).update(
+                            f"子网 {scan['network']} 中发现 {len(scan['neighbors'])} 台设备，{len(free_ips)} 个空闲地址。"
+                        )
+
+                self.push_screen(
+                    SetStaticIPModal(prompt="为接口 " + self.selected_interface_name + " 设置静态IP", defaults=defaults),
+                    static_ip_modal_callback,
+                )
 
         def cli_to_markdown(self, cli_line: str) -> str:
             """将 CLI 带颜色的输出转换为简单的 Markdown。"""
@@ -1163,6 +2393,69 @@ SetStaticIPModal #modal-buttons > Button {
             #   self.diagnostic_output += f"{msg}"
             pass
 
+    class NetworkMonitorApp(App):
+        """--monitor 模式的界面: 每个监控目标显示一行统计和一条 RTT 走势图 (Sparkline)。"""
+        TITLE = "网络持续监控"
+        BINDINGS = [("e", "export", "导出统计"), ("q", "quit", "退出")]
+        SPARK_POINTS = 300 # 走势图显示的最近采样数
+
+        DEFAULT_CSS = """
+#monitor-pane { padding: 1; }
+.monitor-stats { margin-top: 1; }
+.monitor-spark { height: 3; margin-bottom: 1; }
+#monitor-status { color: $text-muted; }
+"""
+
+        def __init__(self, monitor: "NetworkMonitor", export_path: str | None = None) -> None:
+            super().__init__()
+            self.monitor = monitor
+            self.export_path = export_path
+            self.stop_event = threading.Event()
+            self.labels = list(monitor.series)
+
+        def compose(self) -> ComposeResult:
+            yield Header()
+            with VerticalScroll(id="monitor-pane"):
+                yield Static(f"探测间隔 {self.monitor.interval}s，正在采集第一轮数据...", id="monitor-status")
+                for i, label in enumerate(self.labels):
+                    yield Static(label, id=f"monitor-stats-{i}", classes="monitor-stats")
+                    yield Sparkline([], id=f"monitor-spark-{i}", classes="monitor-spark", summary_function=max)
+            yield Footer()
+
+        def on_mount(self) -> None:
+            self.run_worker(self._probe_loop, thread=True, group="monitor", exit_on_error=False)
+
+        def on_unmount(self) -> None:
+            self.stop_event.set()
+
+        def _probe_loop(self) -> None:
+            def on_tick():
+                if not self.stop_event.is_set():
+                    try:
+                        self.call_from_thread(self.refresh_view)
+                    except RuntimeError: # 应用已退出
+                        pass
+            self.monitor.run(self.stop_event, on_tick)
+
+        def refresh_view(self) -> None:
+            for i, stats in enumerate(self.monitor.snapshot()):
+                self.query_one(f"#monitor-stats-{i}", Static).update(format_monitor_line(stats))
+                self.query_one(f"#monitor-spark-{i}", Sparkline).data = self.monitor.sparkline_data(
+                    self.labels[i], self.SPARK_POINTS
+                )
+            self.query_one("#monitor-status", Static).update(
+                f"探测间隔 {self.monitor.interval}s，已运行 {format_duration(time.time() - self.monitor.started)}"
+                f"{'，按 e 导出统计到 ' + self.export_path if self.export_path else ''}"
+            )
+
+        def action_export(self) -> None:
+            path = self.export_path or f"network_monitor_{time.strftime('%Y%m%d_%H%M%S')}.json"
+            try:
+                self.monitor.export(path)
+                self.notify(f"监控统计已导出到 {path}")
+            except OSError as e:
+                self.notify(f"导出失败: {e}", severity="error")
+
 
 # --- Main Execution Logic ---
 def main_cli(args):
@@ -1209,7 +2502,9 @@ def main_cli(args):
         return
 
     print(f"{BLUE}开始诊断接口: {BOLD}{target_interface_name}{RESET}")
-    results, suggestions, overall_ok = cli_diagnose_interface(target_interface_name, interfaces[target_interface_name])
+    results, suggestions, overall_ok = cli_diagnose_interface(
+        target_interface_name, interfaces[target_interface_name], args.dns_domains
+    )
     print_cli_results(results, suggestions)
 
     # CLI 中交互式修复的占位符
@@ -1223,9 +2518,10 @@ def main_cli(args):
             for sug in suggestions
         )
         if dns_issue_detected:
-            if input(f"{CYAN}您想尝试自动修复 DNS (设置为 {PRIMARY_DNS} 和 {SECONDARY_DNS}) 吗? (可能需要 sudo权限) [y/N]: {RESET}").lower() == 'y':
-                print(f"{YELLOW}正在尝试生成并执行 DNS 修复命令...{RESET}")
-                gen_success, commands_or_msg = try_set_dns(target_interface_name, [PRIMARY_DNS, SECONDARY_DNS])
+            if input(f"{CYAN}您想尝试自动修复 DNS (设置为实测解析最快的可用 DNS) 吗? (可能需要 sudo权限) [y/N]: {RESET}").lower() == 'y':
+                dns_servers = choose_dns_servers(args.dns_domains)
+                print(f"{YELLOW}正在尝试生成并执行 DNS 修复命令 (DNS: {', '.join(dns_servers)})...{RESET}")
+                gen_success, commands_or_msg = try_set_dns(target_interface_name, dns_servers)
                 
                 if gen_success:
                     assert isinstance(commands_or_msg, list)
@@ -1240,7 +2536,8 @@ def main_cli(args):
                     for i, command_args in enumerate(commands_or_msg):
                         cmd_str_display = " ".join(command_args)
                         print(f"\n{BOLD}执行命令 {i+1}/{len(commands_or_msg)}:{RESET} {CYAN}{cmd_str_display}{RESET}")
-                        stdout, stderr, code = run_command(command_args)
+                        stdout, stderr, code, fallback = run_fix_command(command_args)
+                        if fallback: print(f"  {YELLOW}命令失败，已改为执行回退命令:{RESET} {CYAN}{' '.join(fallback)}{RESET}")
                         if code == 0:
                             print(f"  {GREEN}成功。{RESET}")
                             if stdout: print(f"  {WHITE}输出:{RESET}\n{stdout}")
@@ -1251,6 +2548,7 @@ def main_cli(args):
                             if stdout: print(f"  {WHITE}标准输出:{RESET}\n{stdout}")
                             if stderr: print(f"  {RED}错误输出:{RESET}\n{stderr}")
                     
+                    SESSION_CACHE.invalidate()
                     if overall_exec_success:
                         print(f"\n{GREEN}所有修复命令均已成功执行或未报告严重错误。{RESET}")
                         print(f"{YELLOW}请重新进行网络诊断以确认问题是否已解决。{RESET}")
@@ -1279,7 +2577,8 @@ def main_cli(args):
                 for i, command_args in enumerate(commands_or_msg_dhcp):
                     cmd_str_display = " ".join(command_args)
                     print(f"\n{BOLD}执行命令 {i+1}/{len(commands_or_msg_dhcp)}:{RESET} {CYAN}{cmd_str_display}{RESET}")
-                    stdout, stderr, code = run_command(command_args)
+                    stdout, stderr, code, fallback = run_fix_command(command_args)
+                    if fallback: print(f"  {YELLOW}命令失败，已改为执行回退命令:{RESET} {CYAN}{' '.join(fallback)}{RESET}")
                     if code == 0:
                         print(f"  {GREEN}成功。{RESET}")
                         if stdout: print(f"  {WHITE}输出:{RESET}\n{stdout}")
@@ -1290,6 +2589,7 @@ def main_cli(args):
                         if stdout: print(f"  {WHITE}标准输出:{RESET}\n{stdout}")
                         if stderr: print(f"  {RED}错误输出:{RESET}\n{stderr}")
                 
+                SESSION_CACHE.invalidate()
                 if overall_exec_success_dhcp:
                     print(f"\n{GREEN}所有切换到 DHCP 的命令均已成功执行或未报告严重错误。{RESET}")
                     print(f"{YELLOW}建议重新进行网络诊断以确认接口是否已获取 IP 地址并工作正常。{RESET}")
@@ -1301,6 +2601,178 @@ def main_cli(args):
                 print(f"{RED}无法自动切换到 DHCP:{RESET}")
                 print(commands_or_msg_dhcp)
 
+def format_duration(seconds):
+    """将秒数格式化为 '1天 02:03:04' 形式。"""
+    days, rest = divmod(int(seconds), 86400)
+    hours, rest = divmod(rest, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{days}天 {hours:02d}:{minutes:02d}:{secs:02d}" if days else f"{hours:02d}:{minutes:02d}:{secs:02d}"
+
+def main_monitor(args):
+    """--monitor: 持续监控网关、DNS 与上游主机。默认使用 TUI，--cli 时以纯文本方式运行 (适合后台长期运行)。"""
+    interfaces = get_network_interfaces_details()
+    if args.interface:
+        details = interfaces.get(args.interface)
+        if not details:
+            print(f"{RED}未找到接口 '{BOLD}{args.interface}{RED}'。可用接口: {', '.join(interfaces.keys())}{RESET}")
+            return
+    else:
+        details = next((d for d in interfaces.values() if d.get('gateway')), None)
+    gateway = details.get('gateway') if details else None
+    if not gateway:
+        print(f"{YELLOW}未检测到网关，将只监控 DNS 与上游主机。{RESET}")
+
+    monitor = NetworkMonitor(
+        gateway=gateway,
+        dns_servers=get_dns_servers(),
+        upstream_hosts=args.targets or MONITOR_UPSTREAM_HOSTS,
+        interval=args.interval,
+        capacity=args.history,
+    )
+
+    if not args.cli and TEXTUAL_AVAILABLE:
+        NetworkMonitorApp(monitor, args.export).run()
+        if args.export:
+            monitor.export(args.export)
+            print(f"监控统计已导出到 {args.export}")
+        return
+
+    # 纯文本模式: 每轮输出一行最新采样；收到 SIGUSR1 时导出统计，Ctrl-C 退出时导出并打印汇总
+    stop_event = threading.Event()
+    export_requested = threading.Event()
+    if args.export and hasattr(signal, 'SIGUSR1'):
+        # 信号处理函数只设置标志，由监控循环在两轮之间导出，避免在持有锁时重入
+        signal.signal(signal.SIGUSR1, lambda signum, frame: export_requested.set())
+
+    def on_tick():
+        parts = []
+        for series in monitor.series.values():
+            last = series.ring.values(1)
+            value = last[0] if last else math.nan
+            parts.append(f"{series.label} {RED + '丢包' + RESET if math.isnan(value) else f'{value:.2f}ms'}")
+        print(f"{time.strftime('%H:%M:%S')}  " + " | ".join(parts), flush=True)
+        if export_requested.is_set():
+            export_requested.clear()
+            monitor.export(args.export)
+
+    print(f"{BLUE}开始持续监控 (间隔 {args.interval}s，每个目标保留 {args.history} 个采样)，按 Ctrl-C 结束。{RESET}")
+    try:
+        monitor.run(stop_event, on_tick)
+    except KeyboardInterrupt:
+        stop_event.set()
+    print(f"\n{BOLD}监控汇总 (运行 {format_duration(time.time() - monitor.started)}):{RESET}")
+    for stats in monitor.snapshot():
+        print(f"  {format_monitor_line(stats)}")
+    if args.export:
+        monitor.export(args.export)
+        print(f"监控统计已导出到 {args.export}")
+
+def main_throughput_server(args):
+    """--serve: 运行吞吐量测试服务端，直到 Ctrl-C。"""
+    try:
+        server = ThroughputServer(args.port)
+    except OSError as e:
+        print(f"{RED}无法在端口 {args.port} 上启动服务端: {e}{RESET}")
+        return
+    server.start()
+    print(f"{BLUE}吞吐量测试服务端已启动，监听 TCP/UDP 端口 {args.port}，按 Ctrl-C 结束。{RESET}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+def main_throughput_client(args):
+    """--connect: 向服务端发起并行吞吐量测试，并与本地接口的协商速率对比。"""
+    protocol = "UDP" if args.udp else "TCP"
+    print(f"{BLUE}{protocol} 吞吐量测试: {args.connect}:{args.port}，{args.streams} 个并行流，持续 {args.duration}s"
+          f"{f'，每流限速 {args.bitrate} Mbit/s' if args.udp and args.bitrate else ''}...{RESET}")
+    results = run_throughput_client(
+        args.connect, args.port, args.streams, args.duration, args.udp, int(args.bitrate * 1e6)
+    )
+
+    total_sent = total_received = 0
+    max_elapsed = max_server_elapsed = 0
+    for r in results:
+        if 'error' in r:
+            print(f"  流 {r['stream']}: {RED}失败{RESET} - {r['error']}")
+            continue
+        total_sent += r['sent']
+        total_received += r['received']
+        max_elapsed = max(max_elapsed, r['elapsed_ns'])
+        max_server_elapsed = max(max_server_elapsed, r['server_elapsed_ns'])
+        line = (f"  流 {r['stream']}: 发送 {r['sent'] / 1e9:.2f} GB  {_gbps(r['sent'], r['elapsed_ns']):6.3f} Gbit/s  "
+                f"(接收端 {_gbps(r['received'], r['server_elapsed_ns']):6.3f} Gbit/s)")
+        if args.udp and r['packets']:
+            line += f"  丢包 {100.0 * (r['packets'] - r['received_packets']) / r['packets']:.2f}%"
+        print(line)
+    if not max_elapsed:
+        return
+    received_gbps = _gbps(total_received, max_server_elapsed)
+    print(f"  {BOLD}合计: 发送 {_gbps(total_sent, max_elapsed):.3f} Gbit/s，接收端 {received_gbps:.3f} Gbit/s{RESET}")
+
+    interface_name = args.interface or interface_for_destination(args.connect)
+    speed = read_link_speed(interface_name) if interface_name else None
+    if speed:
+        utilization = received_gbps * 1000 / speed * 100
+        color = GREEN if utilization >= 80 else YELLOW
+        print(f"  接口 {interface_name} 协商速率: {speed} Mbit/s ({speed / 1000:g} Gbit/s)，"
+              f"实测为链路速率的 {color}{utilization:.0f}%{RESET}")
+    elif interface_name:
+        print(f"  接口 {interface_name} 未报告协商速率 (虚拟接口或链路未连接)。")
+
+def main_dns_benchmark(args):
+    """--dns-bench: 对当前 DNS 与推荐 DNS 做解析延迟基准并排名。"""
+    current = get_dns_servers()
+    candidates = list(dict.fromkeys(current + [PRIMARY_DNS, SECONDARY_DNS]))
+    domains = args.dns_domains or DNS_BENCHMARK_DOMAINS
+    print(f"{BLUE}正在对 {len(candidates)} 个 DNS 服务器进行解析延迟测试 (域名: {', '.join(domains)})...{RESET}")
+    benchmark = dns_query_benchmark(candidates, domains)
+    print(f"\n{'排名':<4} {'服务器':<18} {'p50 (ms)':>10} {'p95 (ms)':>10} {'应答':>8}  备注")
+    for n, server in enumerate(rank_dns_servers(benchmark), 1):
+        stats = benchmark[server]
+        note = "当前" if server in current else "推荐"
+        color = GREEN if stats['answered'] == stats['queries'] else (YELLOW if stats['answered'] else RED)
+        print(f"{n:<6} {server:<21} {stats['p50']:>10.2f} {stats['p95']:>10.2f} "
+              f"{color}{stats['answered']:>4}/{stats['queries']:<3}{RESET}  {note}")
+
+def main_arp_scan(args):
+    """--arp-scan: 对接口所在子网做 ARP 扫描，列出邻居、地址冲突与可用的空闲地址。"""
+    interfaces = get_network_interfaces_details()
+    with_ips = {name: details for name, details in interfaces.items() if details.get('ips')}
+    target_interface_name = args.interface
+    if not target_interface_name:
+        if len(with_ips) != 1:
+            print(f"{YELLOW}请使用 {BOLD}--interface <接口名称>{YELLOW} 指定要扫描的接口。可用接口: {', '.join(with_ips) or '无'}{RESET}")
+            return
+        target_interface_name = next(iter(with_ips))
+    if target_interface_name not in with_ips:
+        print(f"{RED}接口 '{BOLD}{target_interface_name}{RED}' 不存在或没有 IP 地址。{RESET}")
+        return
+
+    details = with_ips[target_interface_name]
+    print(f"{BLUE}正在对接口 {BOLD}{target_interface_name}{RESET}{BLUE} ({details['ips'][0]}) 所在子网进行 ARP 扫描...{RESET}")
+    scan = scan_subnet(target_interface_name, details['ips'][0], details.get('gateway'))
+    if scan is None:
+        print(f"{RED}无法进行 ARP 扫描 (需要 root 权限或 CAP_NET_RAW)。{RESET}")
+        return
+
+    print(f"\n子网 {scan['network']}: 发现 {len(scan['neighbors'])} 台设备")
+    for ip in sorted(scan['neighbors'], key=ipaddress.ip_address):
+        macs = scan['neighbors'][ip]
+        color = RED if ip in scan['conflicts'] else RESET
+        note = " (网关)" if ip == details.get('gateway') else ""
+        print(f"  {color}{ip:<16} {', '.join(macs)}{note}{RESET}")
+    if scan['conflicts']:
+        print(f"\n{RED}检测到 IP 地址冲突:{RESET}")
+        for ip, macs in scan['conflicts'].items():
+            print(f"  {RED}{ip}{RESET} 被以下设备占用: {', '.join(macs)}")
+    else:
+        print(f"\n{GREEN}未检测到 IP 地址冲突。{RESET}")
+    print(f"空闲地址 {len(scan['free'])} 个，例如: {', '.join(scan['free'][:5]) or '无'}")
+
 if __name__ == "__main__":
     # 获取脚本名称，用于帮助信息和错误提示
     script_name = os.path.basename(sys.argv[0])
@@ -1313,6 +2785,11 @@ if __name__ == "__main__":
   {script_name} --gui                # 显式启动图形用户界面
   {script_name} --cli                # 启动命令行界面 (如果未指定接口，会提示选择)
   {script_name} --interface <接口名称> # 在命令行界面诊断指定接口
+  {script_name} --arp-scan -i eth0     # ARP 扫描子网，检查 IP 冲突并列出空闲地址
+  {script_name} --dns-bench            # 测试并排名各 DNS 服务器的实际解析延迟
+  {script_name} --monitor --cli --export stats.json  # 后台持续监控，结束时导出百分位统计
+  {script_name} --serve                # 在对端启动吞吐量测试服务端
+  {script_name} --connect <对端地址> --streams 4  # 测量 TCP 吞吐量 (加 --udp 测 UDP)
 
 要查看详细的调试日志，请检查脚本同目录下的 {LOG_FILENAME} 文件。
 """
@@ -1332,13 +2809,110 @@ if __name__ == "__main__":
         action="store_true",
         help="强制以命令行界面模式运行诊断。"
     )
+    parser.add_argument(
+        "--monitor",
+        action="store_true",
+        help="持续监控网关、DNS 与上游主机的延迟和丢包 (默认使用 TUI，加 --cli 以纯文本方式运行)。"
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        metavar="<秒>",
+        help="--monitor 的探测间隔 (默认: 1 秒)。"
+    )
+    parser.add_argument(
+        "--history",
+        type=int,
+        default=MONITOR_HISTORY,
+        metavar="<采样数>",
+        help=f"--monitor 为每个目标保留的最近采样数，内存占用固定 (默认: {MONITOR_HISTORY})。"
+    )
+    parser.add_argument(
+        "--targets",
+        metavar="<主机,...>",
+        type=lambda value: [h.strip() for h in value.split(',') if h.strip()],
+        help=f"--monitor 探测的上游主机，逗号分隔 (默认: {','.join(MONITOR_UPSTREAM_HOSTS)})。"
+    )
+    parser.add_argument(
+        "--export",
+        metavar="<文件>",
+        help="--monitor 结束时将百分位统计导出到该文件 (.csv 为 CSV，其余为 JSON)。\n纯文本模式下收到 SIGUSR1 时也会导出。"
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="以吞吐量测试服务端模式运行 (同时监听 TCP 与 UDP)。"
+    )
+    parser.add_argument(
+        "--connect",
+        metavar="<主机>",
+        help="连接到吞吐量测试服务端并测量 TCP (默认) 或 UDP 吞吐量。"
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=THROUGHPUT_PORT,
+        help=f"吞吐量测试端口 (默认: {THROUGHPUT_PORT})。"
+    )
+    parser.add_argument(
+        "--streams",
+        type=int,
+        default=4,
+        help="吞吐量测试的并行流数量 (默认: 4)。"
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=5.0,
+        metavar="<秒>",
+        help="吞吐量测试持续时间 (默认: 5 秒)。"
+    )
+    parser.add_argument(
+        "--udp",
+        action="store_true",
+        help="使用 UDP 进行吞吐量测试 (报告丢包率)。"
+    )
+    parser.add_argument(
+        "--bitrate",
+        type=float,
+        default=0,
+        metavar="<Mbit/s>",
+        help="UDP 测试时每个流的目标速率，0 表示不限速 (默认: 0)。"
+    )
+    parser.add_argument(
+        "--dns-bench",
+        action="store_true",
+        help="对当前 DNS 与推荐 DNS 进行 A/AAAA 解析延迟测试，按 p50/p95 排名。"
+    )
+    parser.add_argument(
+        "--dns-domains",
+        metavar="<域名,...>",
+        type=lambda value: [d.strip() for d in value.split(',') if d.strip()],
+        help=f"DNS 解析延迟测试使用的域名，逗号分隔。\n(默认: {','.join(DNS_BENCHMARK_DOMAINS)})"
+    )
+    parser.add_argument(
+        "--arp-scan",
+        action="store_true",
+        help="对接口所在子网进行 ARP 扫描，报告邻居设备、IP 地址冲突和空闲地址。\n(需要 root 权限，可与 --interface 一起使用)"
+    )
     # 根据需要添加更多 CLI 参数，例如 --auto-fix (请谨慎使用)
 
     args = parser.parse_args()
 
     # 如果指定了 --interface 或 --cli，则运行 CLI 模式。
     # 否则，默认尝试运行 TUI 模式 (或者用户明确指定了 --gui)。
-    if args.interface or args.cli:
+    if args.serve:
+        main_throughput_server(args)
+    elif args.connect:
+        main_throughput_client(args)
+    elif args.monitor:
+        main_monitor(args)
+    elif args.dns_bench:
+        main_dns_benchmark(args)
+    elif args.arp_scan:
+        main_arp_scan(args)
+    elif args.interface or args.cli:
         # 即使同时传递了 --gui，--interface 或 --cli 也会优先进入 CLI 模式
         main_cli(args)
     else: